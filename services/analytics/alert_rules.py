@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Alert Rules
+Threshold, rate-of-change and membership rules evaluated incrementally on each
+panel result, per facility, with hysteresis, debouncing, deduplication and batched delivery
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ALERT_RULES_FILE = os.getenv('ALERT_RULES_FILE')  # JSON list of rules replacing the defaults
+ALERT_BATCH_SIZE = int(os.getenv('ALERT_BATCH_SIZE', '50'))  # notifications per delivered batch
+ALERT_BATCH_INTERVAL = float(os.getenv('ALERT_BATCH_INTERVAL', '1.0'))  # seconds a batch may wait to fill
+ALERT_COOLDOWN = float(os.getenv('ALERT_COOLDOWN', '300'))  # seconds RESOLVED is held back in case the alert re-fires
+ALERT_QUEUE_LIMIT = int(os.getenv('ALERT_QUEUE_LIMIT', '1000'))  # undelivered notifications kept
+ALERT_HISTORY_SIZE = int(os.getenv('ALERT_HISTORY_SIZE', '200'))
+
+RULE_KINDS = ('threshold', 'rate', 'contains')
+SEVERITIES = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+INVERSE_OPERATORS = {'>': '<', '<': '>'}
+
+# Rules for the panels the analytics loop publishes every cycle
+DEFAULT_RULES = [
+    {
+        "id": "bed_occupancy_high", "panel": "hospital_overview", "metric": "bed_occupancy",
+        "kind": "threshold", "operator": ">", "threshold": 90, "clear_threshold": 85,
+        "for_count": 2, "clear_count": 2, "severity": "HIGH",
+        "message": "Bed occupancy at {value}% (above {threshold}%)"
+    },
+    {
+        "id": "bed_occupancy_rising", "panel": "hospital_overview", "metric": "bed_occupancy",
+        "kind": "rate", "operator": ">", "threshold": 5, "clear_threshold": 1, "window_seconds": 120,
+        "severity": "MEDIUM",
+        "message": "Bed occupancy rising {value} points/min"
+    },
+    {
+        "id": "patient_census_surge", "panel": "hospital_overview", "metric": "current_patients",
+        "kind": "rate", "operator": ">", "threshold": 20, "clear_threshold": 5, "window_seconds": 300,
+        "for_count": 2, "severity": "MEDIUM",
+        "message": "Patient census growing {value} patients/min"
+    },
+    {
+        "id": "staff_utilization_high", "panel": "staff_metrics", "metric": "doctors_utilization",
+        "kind": "threshold", "operator": ">", "threshold": 95, "clear_threshold": 90,
+        "for_count": 3, "clear_count": 2, "severity": "MEDIUM",
+        "message": "Doctor utilization at {value}%"
+    },
+    {
+        "id": "prediction_confidence_low", "panel": "predictive_insights", "metric": "prediction_confidence",
+        "kind": "threshold", "operator": "<", "threshold": 86, "clear_threshold": 88,
+        "for_count": 3, "clear_count": 2, "severity": "LOW",
+        "message": "Prediction confidence dropped to {value}%"
+    },
+    {
+        "id": "icu_capacity_recommended", "panel": "predictive_insights", "metric": "recommended_actions",
+        "kind": "contains", "value": "Increase ICU capacity",
+        "for_count": 2, "clear_count": 2, "severity": "HIGH",
+        "message": "Predictive model recommends: {value}"
+    }
+]
+
+def extract_metric(result: Dict, path: str) -> Any:
+    """Follow a dotted path ('departments.0.efficiency') into a result, or None if it is absent"""
+    value = result
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+def compare(value: float, operator: str, threshold: float) -> bool:
+    return value > threshold if operator == '>' else value < threshold
+
+class AlertRule:
+    """One rule; `threshold` fires the alert and `clear_threshold` (hysteresis) resolves it"""
+
+    def __init__(self, id: str, panel: str, metric: str, kind: str = 'threshold', operator: str = '>',
+                 threshold: Optional[float] = None, clear_threshold: Optional[float] = None,
+                 value: Optional[str] = None, window_seconds: float = 60, for_count: int = 1,
+                 clear_count: int = 1, severity: str = 'MEDIUM', message: Optional[str] = None):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Rule {id}: unknown kind '{kind}' (expected one of {', '.join(RULE_KINDS)})")
+        if operator not in INVERSE_OPERATORS:
+            raise ValueError(f"Rule {id}: operator must be '>' or '<'")
+        if kind == 'contains':
+            if value is None:
+                raise ValueError(f"Rule {id}: contains rules need a value")
+        elif threshold is None:
+            raise ValueError(f"Rule {id}: {kind} rules need a threshold")
+        severity = severity.upper()
+        if severity not in SEVERITIES:
+            raise ValueError(f"Rule {id}: unknown severity '{severity}'")
+        if for_count < 1 or clear_count < 1:
+            raise ValueError(f"Rule {id}: for_count and clear_count must be at least 1")
+        if kind == 'rate' and window_seconds <= 0:
+            raise ValueError(f"Rule {id}: window_seconds must be positive")
+
+        self.id = id
+        self.panel = panel
+        self.metric = metric
+        self.kind = kind
+        self.operator = operator
+        self.threshold = threshold
+        # Without an explicit clear threshold the rule resolves as soon as it stops breaching
+        self.clear_threshold = threshold if clear_threshold is None else clear_threshold
+        if kind != 'contains' and compare(self.clear_threshold, operator, threshold):
+            raise ValueError(f"Rule {id}: clear_threshold must not be past the firing threshold")
+        self.value = value
+        self.window_seconds = window_seconds
+        self.for_count = for_count
+        self.clear_count = clear_count
+        self.severity = severity
+        self.message = message or (f"{metric} contains {{value}}" if kind == 'contains'
+                                   else f"{metric} {operator} {{threshold}} (now {{value}})")
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> 'AlertRule':
+        try:
+            return cls(**spec)
+        except TypeError as e:
+            raise ValueError(f"Invalid rule {spec.get('id', '?')}: {e}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id, "panel": self.panel, "metric": self.metric, "kind": self.kind,
+            "operator": self.operator, "threshold": self.threshold, "clear_threshold": self.clear_threshold,
+            "value": self.value, "window_seconds": self.window_seconds, "for_count": self.for_count,
+            "clear_count": self.clear_count, "severity": self.severity, "message": self.message
+        }
+
+class RuleState:
+    """Evaluation state of one rule for one facility: debounce counters, the open alert and rate samples"""
+
+    def __init__(self):
+        self.status = 'ok'  # 'ok', 'pending' (breaching, debouncing) or 'firing'
+        self.breaches = 0
+        self.clears = 0
+        self.last_value: Any = None
+        self.alert: Optional[Dict] = None
+        self.resolved_at = 0.0
+        self.resolve_due: Optional[float] = None  # when the held-back RESOLVED is sent
+        self.samples: Deque[Tuple[float, float]] = deque()  # (time, value) within the rate window
+
+class AlertEngine:
+    """Evaluates only the rules indexed under the panel that changed and queues transitions for delivery"""
+
+    def __init__(self, rules: Optional[List[Dict]] = None, cooldown: float = ALERT_COOLDOWN):
+        self.rules: Dict[str, AlertRule] = {}
+        self.states: Dict[Tuple[str, Optional[str]], RuleState] = {}  # (rule id, facility) -> state
+        self.by_panel: Dict[str, Dict[str, List[AlertRule]]] = {}  # panel -> metric -> rules
+        self.cooldown = cooldown
+        self.outbox: Deque[Dict] = deque()
+        self.history: Deque[Dict] = deque(maxlen=ALERT_HISTORY_SIZE)
+        self.wakeup: Optional[asyncio.Event] = None
+        self.alert_seq = 0
+        self.stats = {
+            "evaluations": 0, "rules_evaluated": 0, "rules_skipped": 0, "fired": 0, "resolved": 0,
+            "suppressed": 0, "notifications_sent": 0, "batches_sent": 0, "delivery_failures": 0,
+            "dropped": 0
+        }
+        for spec in (DEFAULT_RULES if rules is None else rules):
+            self.add_rule(AlertRule.from_dict(spec))
+
+    def add_rule(self, rule: AlertRule):
+        """Add or replace a rule; a replaced rule starts from a clean state"""
+        if rule.id in self.rules:
+            self.remove_rule(rule.id)
+        self.rules[rule.id] = rule
+        self.by_panel.setdefault(rule.panel, {}).setdefault(rule.metric, []).append(rule)
+
+    def remove_rule(self, rule_id: str) -> bool:
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return False
+        for key in [key for key in self.states if key[0] == rule_id]:
+            state = self.states.pop(key)
+            if state.status == 'firing':
+                state.resolved_at = time.time()
+                self.resolve(rule, state)
+            elif state.resolve_due is not None:
+                self.resolve(rule, state)
+        metrics = self.by_panel[rule.panel]
+        metrics[rule.metric].remove(rule)
+        if not metrics[rule.metric]:
+            del metrics[rule.metric]
+        if not metrics:
+            del self.by_panel[rule.panel]
+        return True
+
+    def evaluate(self, panel_name: str, result: Dict, now: Optional[float] = None,
+                 facility: Optional[str] = None) -> int:
+        """Run the rules watching this panel against a facility's new result; returns the number evaluated
+
+        Threshold and contains rules whose metric did not change and that are not mid-transition
+        are skipped, so a steady panel costs one lookup per watched metric. Rate rules always run
+        because their value depends on elapsed time as well as on the metric.
+        """
+        metrics = self.by_panel.get(panel_name)
+        if not metrics:
+            return 0
+        now = time.time() if now is None else now
+        self.stats["evaluations"] += 1
+        evaluated = 0
+        for metric, rules in metrics.items():
+            value = extract_metric(result, metric)
+            if value is None:
+                continue
+            for rule in rules:
+                state = self.states.get((rule.id, facility))
+                if state is None:
+                    state = self.states[(rule.id, facility)] = RuleState()
+                if rule.kind != 'rate' and state.status == 'ok' and value == state.last_value:
+                    self.stats["rules_skipped"] += 1
+                    continue
+                self.apply(rule, state, value, now, facility)
+                state.last_value = value
+                evaluated += 1
+        self.stats["rules_evaluated"] += evaluated
+        return evaluated
+
+    def apply(self, rule: AlertRule, state: RuleState, value: Any, now: float, facility: Optional[str] = None):
+        if rule.kind == 'contains':
+            present = isinstance(value, (list, tuple, set, str)) and rule.value in value
+            observed, breaching, recovered = rule.value, present, not present
+        else:
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return
+            observed = float(value)
+            if rule.kind == 'rate':
+                observed = self.rate_per_minute(rule, state, observed, now)
+                if observed is None:
+                    return
+            breaching = compare(observed, rule.operator, rule.threshold)
+            recovered = compare(observed, INVERSE_OPERATORS[rule.operator], rule.clear_threshold)
+
+        if state.status == 'firing':
+            state.clears = state.clears + 1 if recovered else 0
+            if state.clears >= rule.clear_count:
+                state.status, state.clears = 'ok', 0
+                state.resolved_at = now
+                state.alert["value"] = round(observed, 2) if isinstance(observed, float) else observed
+                # Hold RESOLVED back for the cooldown; a re-fire within it carries on with this alert
+                state.resolve_due = now + self.cooldown
+                if self.cooldown <= 0:
+                    self.resolve(rule, state)
+            elif not recovered:
+                state.alert["value"] = round(observed, 2) if isinstance(observed, float) else observed
+            return
+
+        if not breaching:
+            state.status, state.breaches = 'ok', 0
+            return
+        state.breaches += 1
+        if state.breaches < rule.for_count:
+            state.status = 'pending'
+            return
+
+        state.status, state.breaches = 'firing', 0
+        self.stats["fired"] += 1
+        if state.resolve_due is not None and now >= state.resolve_due:
+            self.resolve(rule, state)
+        if state.resolve_due is not None:
+            # Flapping: RESOLVED was never sent, so the sink still has this alert ACTIVE
+            state.resolve_due = None
+            state.alert["occurrences"] += 1
+            state.alert["value"] = round(observed, 2) if isinstance(observed, float) else observed
+            self.stats["suppressed"] += 1
+            return
+        self.alert_seq += 1
+        state.alert = {
+            "alert_id": f"{rule.id}-{self.alert_seq}",
+            "rule_id": rule.id,
+            "facility": facility,
+            "type": rule.panel,
+            "metric": rule.metric,
+            "severity": rule.severity,
+            "status": 'ACTIVE',
+            "occurrences": 1,
+            "started_at": datetime.fromtimestamp(now).isoformat(),
+            "resolved_at": None
+        }
+        self.notify(rule, state.alert, 'ACTIVE', now, observed)
+
+    def resolve(self, rule: AlertRule, state: RuleState):
+        """Send the held-back RESOLVED, stamped with the time the rule recovered"""
+        state.resolve_due = None
+        self.stats["resolved"] += 1
+        self.notify(rule, state.alert, 'RESOLVED', state.resolved_at)
+
+    def release_resolved(self, now: float) -> int:
+        """Resolve the alerts whose cooldown passed without a re-fire; returns how many"""
+        due = [(key, state) for key, state in self.states.items()
+               if state.resolve_due is not None and now >= state.resolve_due]
+        for (rule_id, _), state in due:
+            self.resolve(self.rules[rule_id], state)
+        return len(due)
+
+    def rate_per_minute(self, rule: AlertRule, state: RuleState, value: float, now: float) -> Optional[float]:
+        """Change per minute across the window, or None until the samples span a full window"""
+        samples = state.samples
+        samples.append((now, value))
+        while len(samples) > 2 and samples[1][0] <= now - rule.window_seconds:
+            samples.popleft()
+        first_time, first_value = samples[0]
+        if now - first_time < rule.window_seconds:
+            return None
+        return (value - first_value) / (now - first_time) * 60
+
+    def notify(self, rule: AlertRule, alert: Dict, status: str, now: float, observed: Any = None):
+        """Queue a state transition for the next delivered batch"""
+        if observed is not None:
+            alert["value"] = round(observed, 2) if isinstance(observed, float) else observed
+        alert["status"] = status
+        if status == 'RESOLVED':
+            alert["resolved_at"] = datetime.fromtimestamp(now).isoformat()
+        notification = dict(alert)
+        notification["message"] = rule.message.format(
+            value=alert.get("value"), threshold=rule.threshold, metric=rule.metric)
+        notification["timestamp"] = datetime.fromtimestamp(now).isoformat()
+        if len(self.outbox) >= ALERT_QUEUE_LIMIT:
+            self.outbox.popleft()
+            self.stats["dropped"] += 1
+        self.outbox.append(notification)
+        self.history.append(notification)
+        if self.wakeup is not None and len(self.outbox) >= ALERT_BATCH_SIZE:
+            self.wakeup.set()
+
+    async def run_notifier(self, deliver: Callable[[List[Dict]], Any], batch_size: int = ALERT_BATCH_SIZE,
+                           interval: float = ALERT_BATCH_INTERVAL):
+        """Deliver queued notifications in batches, in a worker thread so a slow sink never blocks the loop"""
+        self.wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self.release_resolved(time.time())
+            while self.outbox:
+                batch = [self.outbox.popleft() for _ in range(min(batch_size, len(self.outbox)))]
+                try:
+                    await asyncio.to_thread(deliver, batch)
+                except Exception as e:
+                    # Put the batch back in order and retry on the next tick
+                    self.outbox.extendleft(reversed(batch))
+                    self.stats["delivery_failures"] += 1
+                    logger.error(f"Error delivering {len(batch)} alert notifications: {e}")
+                    break
+                self.stats["batches_sent"] += 1
+                self.stats["notifications_sent"] += len(batch)
+
+    def active_alerts(self) -> List[Dict]:
+        """Alerts the sink has as ACTIVE, including recovered ones whose RESOLVED is still held back"""
+        alerts = []
+        for state in self.states.values():
+            if state.status == 'firing':
+                alerts.append(dict(state.alert))
+            elif state.resolve_due is not None:
+                alerts.append(dict(state.alert, recovered_at=datetime.fromtimestamp(state.resolved_at).isoformat()))
+        return alerts
+
+    def get_rules(self) -> List[Dict]:
+        """Rules with their evaluation state per facility"""
+        states: Dict[str, Dict] = {}
+        for (rule_id, facility), state in self.states.items():
+            states.setdefault(rule_id, {})[facility or 'default'] = {
+                "state": state.status, "last_value": state.last_value
+            }
+        return [{**rule.to_dict(), "states": states.get(rule_id, {})} for rule_id, rule in self.rules.items()]
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "rules": len(self.rules),
+            "panels": len(self.by_panel),
+            "active": sum(1 for state in self.states.values() if state.status == 'firing'),
+            "resolving": sum(1 for state in self.states.values() if state.resolve_due is not None),
+            "pending": len(self.outbox)
+        }
+
+def load_rules(path: Optional[str] = ALERT_RULES_FILE) -> Optional[List[Dict]]:
+    """Read rule specs from a JSON file; None keeps the built-in defaults"""
+    if not path:
+        return None
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path} must contain a JSON list of rules")
+    return rules
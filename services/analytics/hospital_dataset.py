@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+Hospital Dataset
+Columnar view of the data generator's output (CSV or JSON Lines, plus delta directories)
+that answers KPI queries from typed NumPy arrays and refreshes incrementally as files change
+"""
+
+import copy
+import glob
+import io
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DATA_DIR = os.getenv('DATA_DIR', '/app/data')
+DATA_CHUNK_SIZE = int(os.getenv('DATA_CHUNK_SIZE', '50000'))  # rows parsed per chunk
+DATA_REFRESH_INTERVAL = float(os.getenv('DATA_REFRESH_INTERVAL', '5'))  # seconds between mtime checks
+DOCTOR_HOURS_PER_DAY = float(os.getenv('DOCTOR_HOURS_PER_DAY', '8'))
+FINGERPRINT_BYTES = 65536  # leading bytes hashed to tell an append from a rewrite
+
+# Columns kept per table: column -> (kind, vocabulary). Category columns sharing a
+# vocabulary (e.g. doctor IDs in appointments and lab tests) get the same codes.
+TABLE_COLUMNS = {
+    'departments': {
+        'id': ('category', 'department'),
+        'name': ('str', None),
+        'beds': ('int', None)
+    },
+    'doctors': {
+        'id': ('category', 'doctor'),
+        'department': ('category', 'department')
+    },
+    'patients': {
+        'status': ('category', 'patient_status'),
+        'admission_date': ('date', None),
+        'discharge_date': ('date', None)
+    },
+    'appointments': {
+        'patient_id': ('category', 'patient'),
+        'doctor_id': ('category', 'doctor'),
+        'department_id': ('category', 'department'),
+        'appointment_date': ('date', None),
+        'status': ('category', 'appointment_status'),
+        'duration_minutes': ('int', None)
+    },
+    'lab_tests': {
+        'doctor_id': ('category', 'doctor'),
+        'test_date': ('date', None),
+        'status': ('category', 'lab_status')
+    }
+}
+
+class Vocabulary:
+    """Stable string -> int32 code mapping, extended as new values appear"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(values, return_inverse=True)
+        mapping = np.array([self.add(value) for value in uniques], dtype=np.int32)
+        return mapping[inverse].astype(np.int32) if len(values) else np.empty(0, dtype=np.int32)
+
+    def add(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value: str) -> int:
+        """Code of a value, or -1 if it never occurred"""
+        return self.codes.get(value, -1)
+
+class CategoryIndex:
+    """Row positions grouped by category code (a CSR layout over a stable argsort)"""
+
+    def __init__(self, codes: np.ndarray, size: int):
+        self.order = np.argsort(codes, kind='stable')
+        self.starts = np.searchsorted(codes[self.order], np.arange(size + 1))
+
+    def rows(self, code: int) -> np.ndarray:
+        if code < 0 or code + 1 >= len(self.starts):
+            return self.order[:0]
+        return self.order[self.starts[code]:self.starts[code + 1]]
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.starts)
+
+class DateIndex:
+    """Row positions sorted by date for range lookups (missing dates sort last and never match)"""
+
+    def __init__(self, dates: np.ndarray):
+        self.order = np.argsort(dates, kind='stable')
+        self.sorted = dates[self.order]
+
+    def rows(self, start: np.datetime64, end: np.datetime64) -> np.ndarray:
+        """Rows dated within [start, end]"""
+        low = np.searchsorted(self.sorted, start, side='left')
+        high = np.searchsorted(self.sorted, end, side='right')
+        return self.order[low:high]
+
+class ColumnTable:
+    """Typed columns for one table, grown chunk by chunk, with lazily built indexes"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.schema = TABLE_COLUMNS[name]
+        self.clear()
+
+    def clear(self):
+        self.chunks: Dict[str, List[np.ndarray]] = {column: [] for column in self.schema}
+        self.cached: Optional[Dict[str, np.ndarray]] = None
+        self.indexes: Dict[str, object] = {}
+        self.rows = 0
+
+    def append(self, columns: Dict[str, np.ndarray]):
+        for column, values in columns.items():
+            self.chunks[column].append(values)
+        self.rows += len(next(iter(columns.values())))
+        self.cached = None
+        self.indexes = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if self.cached is None:
+            self.cached = {}
+        if name not in self.cached:
+            chunks = self.chunks[name]
+            # Collapse to one array so later appends concatenate against a single chunk
+            values = np.concatenate(chunks) if chunks else np.empty(0, dtype=self.empty_dtype(name))
+            self.chunks[name] = [values]
+            self.cached[name] = values
+        return self.cached[name]
+
+    def empty_dtype(self, name: str):
+        kind = self.schema[name][0]
+        return {'category': np.int32, 'date': 'datetime64[D]', 'int': np.int64}.get(kind, object)
+
+    def category_index(self, name: str, size: int) -> CategoryIndex:
+        if name not in self.indexes:
+            self.indexes[name] = CategoryIndex(self.column(name), size)
+        return self.indexes[name]
+
+    def date_index(self, name: str) -> DateIndex:
+        if name not in self.indexes:
+            self.indexes[name] = DateIndex(self.column(name))
+        return self.indexes[name]
+
+class FileState:
+    """How much of one source file has been read, and a fingerprint of its start"""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.offset = 0
+        self.size = 0
+        self.mtime_ns = 0
+        self.fingerprint = None
+        self.header: Optional[List[str]] = None
+
+class ByteRange(io.RawIOBase):
+    """Read-only view of a binary file up to an end offset"""
+
+    def __init__(self, f, end: int):
+        self.f = f
+        self.end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.end - self.f.tell())
+        if size <= 0:
+            return 0
+        data = self.f.read(size)
+        buffer[:len(data)] = data
+        return len(data)
+
+def table_files(data_dir: str, table: str) -> List[Tuple[str, str]]:
+    """(path, format) of the table in the base directory and each delta directory, oldest first"""
+    files = []
+    for directory in [data_dir] + sorted(glob.glob(os.path.join(data_dir, 'deltas', '*'))):
+        for fmt in ('csv', 'jsonl'):
+            path = os.path.join(directory, f"{table}.{fmt}")
+            if os.path.exists(path):
+                files.append((path, fmt))
+                break
+    return files
+
+def file_fingerprint(path: str, length: int) -> int:
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(length))
+
+def complete_end(f, size: int) -> int:
+    """Offset just past the last newline, so a row still being written is left for the next refresh"""
+    position = size
+    while position > 0:
+        start = max(0, position - 65536)
+        f.seek(start)
+        block = f.read(position - start)
+        newline = block.rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        position = start
+    return 0
+
+class HospitalDataset:
+    """Typed columns and indexes over the generated tables, kept current from file mtimes
+
+    Each source file is tracked by size, mtime and a fingerprint of its first bytes.
+    Rows appended to a file and new delta directories are read incrementally, from the
+    last consumed offset; a file that was rewritten or removed reloads its table.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self.vocabularies: Dict[str, Vocabulary] = {}
+        self.vocabulary_sizes: Dict[str, int] = {}  # codes the swapped-in tables can hold
+        self.tables = {name: ColumnTable(name) for name in TABLE_COLUMNS}
+        self.files: Dict[str, Dict[str, FileState]] = {name: {} for name in TABLE_COLUMNS}
+        self.lock = threading.RLock()  # held while tables change or are queried
+        self.refresh_lock = threading.Lock()
+        self.version = 0
+        self.stats = {"refreshes": 0, "incremental_reads": 0, "full_reloads": 0,
+                      "rows_read": 0, "last_refresh_seconds": None, "last_refresh": None}
+
+    def vocabulary(self, name: str) -> Vocabulary:
+        return self.vocabularies.setdefault(name, Vocabulary())
+
+    def vocabulary_size(self, name: str) -> int:
+        """Vocabulary size as of the current table version
+
+        Refresh encodes new chunks, growing the vocabularies, before it takes the lock;
+        queries size their arrays from this snapshot so they see one consistent version.
+        """
+        return self.vocabulary_sizes.get(name, 0)
+
+    # Loading
+
+    def refresh(self) -> bool:
+        """Read whatever changed in the source files; returns True if any table changed
+
+        Files are parsed without holding the query lock; the new chunks are then
+        swapped in under it, so queries only wait for the (cheap) append.
+        """
+        with self.refresh_lock:
+            started = time.perf_counter()
+            updates = {}
+            for table in self.tables:
+                try:
+                    update = self.read_changes(table)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error refreshing {table} from {self.data_dir}: {e}")
+                    continue
+                if update is not None:
+                    updates[table] = update
+            if not updates:
+                return False
+            with self.lock:
+                for table, (reload, chunks, states) in updates.items():
+                    if reload:
+                        self.tables[table].clear()
+                    for chunk in chunks:
+                        self.tables[table].append(chunk)
+                    self.files[table] = states
+                self.vocabulary_sizes = {name: len(vocabulary) for name, vocabulary in self.vocabularies.items()}
+                self.version += 1
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_seconds"] = round(time.perf_counter() - started, 3)
+            self.stats["last_refresh"] = datetime.now().isoformat()
+            logger.info(f"Dataset refreshed to version {self.version} in {self.stats['last_refresh_seconds']}s",
+                        extra={'rows': {name: table.rows for name, table in self.tables.items()}})
+            return True
+
+    def read_changes(self, table: str) -> Optional[Tuple[bool, List[Dict[str, np.ndarray]], Dict[str, FileState]]]:
+        """(reload, new chunks, new file states) for a table, or None if none of its files changed"""
+        files = table_files(self.data_dir, table)
+        states = {path: copy.copy(state) for path, state in self.files[table].items()}
+        reload = bool(set(states) - {path for path, _ in files})
+        pending = []
+        for path, fmt in files:
+            stat = os.stat(path)
+            state = states.get(path)
+            if state is None or state.fmt != fmt:
+                pending.append((path, FileState(fmt), stat))
+                reload |= state is not None
+            elif (stat.st_size, stat.st_mtime_ns) != (state.size, state.mtime_ns):
+                # Appended to if the bytes read so far are unchanged, rewritten otherwise
+                if stat.st_size >= state.offset and file_fingerprint(
+                        path, min(state.offset, FINGERPRINT_BYTES)) == state.fingerprint:
+                    pending.append((path, state, stat))
+                else:
+                    reload = True
+        if reload:
+            # Something was rewritten or removed: start the table over from every file
+            self.stats["full_reloads"] += 1
+            states = {}
+            pending = [(path, FileState(fmt), os.stat(path)) for path, fmt in files]
+        elif not pending:
+            return None
+        else:
+            self.stats["incremental_reads"] += 1
+        chunks = []
+        for path, state, stat in pending:
+            chunks += self.read_file(table, path, state, stat)
+            states[path] = state
+        return reload, chunks, states
+
+    def read_file(self, table: str, path: str, state: FileState, stat: os.stat_result) -> List[Dict[str, np.ndarray]]:
+        """Parse a file from the state's offset to its last complete line into typed chunks"""
+        columns = list(TABLE_COLUMNS[table])
+        chunks = []
+        with open(path, 'rb') as f:
+            end = complete_end(f, stat.st_size)
+            if state.fmt == 'csv' and state.header is None:
+                f.seek(0)
+                state.header = f.readline().decode('utf-8-sig').strip().split(',')
+                state.offset = f.tell()
+            if end > state.offset:
+                f.seek(state.offset)
+                text = io.TextIOWrapper(io.BufferedReader(ByteRange(f, end)), encoding='utf-8', newline='')
+                for frame in self.iter_frames(text, state, columns):
+                    chunks.append(self.convert(table, frame))
+                    self.stats["rows_read"] += len(frame)
+                state.offset = end
+        state.size = stat.st_size
+        state.mtime_ns = stat.st_mtime_ns
+        state.fingerprint = file_fingerprint(path, min(state.offset, FINGERPRINT_BYTES))
+        return chunks
+
+    def iter_frames(self, text, state: FileState, columns: List[str]):
+        if state.fmt == 'csv':
+            usecols = [column for column in columns if column in state.header]
+            frames = pd.read_csv(text, header=None, names=state.header, usecols=usecols,
+                                 dtype=str, chunksize=DATA_CHUNK_SIZE)
+        else:
+            frames = pd.read_json(text, lines=True, dtype=False, chunksize=DATA_CHUNK_SIZE)
+        for frame in frames:
+            yield frame.reindex(columns=columns)
+
+    def convert(self, table: str, frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Typed arrays for one parsed chunk"""
+        columns = {}
+        for column, (kind, vocabulary) in TABLE_COLUMNS[table].items():
+            values = frame[column]
+            if kind == 'category':
+                columns[column] = self.vocabulary(vocabulary).encode(values.fillna('').astype(str).to_numpy())
+            elif kind == 'date':
+                columns[column] = pd.to_datetime(values, errors='coerce').to_numpy().astype('datetime64[D]')
+            elif kind == 'int':
+                columns[column] = pd.to_numeric(values, errors='coerce').fillna(0).astype(np.int64).to_numpy()
+            else:
+                columns[column] = values.fillna('').astype(str).to_numpy(dtype=object)
+        return columns
+
+    # Helpers
+
+    def code(self, vocabulary: str, value: str) -> int:
+        """Code of a value in the current table version, or -1"""
+        code = self.vocabulary(vocabulary).get(value)
+        return code if code < self.vocabulary_size(vocabulary) else -1
+
+    def department_names(self) -> Dict[int, str]:
+        departments = self.tables['departments']
+        return dict(zip(departments.column('id').tolist(), departments.column('name').tolist()))
+
+    def get_stats(self) -> Dict:
+        return {
+            "data_dir": self.data_dir,
+            "version": self.version,
+            "rows": {name: table.rows for name, table in self.tables.items()},
+            "files": sum(len(states) for states in self.files.values()),
+            **self.stats
+        }
+
+    # Queries
+
+    QUERIES = ('hospital_kpis', 'department_performance', 'staff_utilization')
+
+    def query(self, query_type: str, parameters: Dict) -> Dict:
+        """Run one of the data-backed queries against a consistent version of the tables"""
+        with self.lock:
+            result = getattr(self, query_type)(parameters)
+            result["data_version"] = self.version
+            return result
+
+    def hospital_kpis(self, parameters: Dict) -> Dict:
+        """Census, length of stay and activity KPIs as of a date (default today) over a trailing window"""
+        as_of, days = query_window(parameters, 30)
+        start = as_of - np.timedelta64(days - 1, 'D')
+        patients = self.tables['patients']
+        appointments = self.tables['appointments']
+        lab_tests = self.tables['lab_tests']
+
+        status_counts = patients.category_index('status', self.vocabulary_size('patient_status')).counts()
+        current_patients = int(status_counts[self.code('patient_status', 'Active')]) \
+            if self.code('patient_status', 'Active') >= 0 else 0
+        admissions, discharges = patients.column('admission_date'), patients.column('discharge_date')
+        stays = (discharges - admissions).astype('timedelta64[D]').astype(float)[~np.isnat(discharges)]
+
+        window = appointments.date_index('appointment_date').rows(start, as_of)
+        window_status = appointments.column('status')[window]
+        outcomes = [self.code('appointment_status', status) for status in ('Completed', 'Cancelled', 'No-show')]
+        settled = np.isin(window_status, outcomes).sum()
+        completed = (window_status == outcomes[0]).sum()
+        total_beds = int(self.tables['departments'].column('beds').sum())
+
+        return {
+            "current_patients": current_patients,
+            "total_patients": patients.rows,
+            "average_los": round(float(stays.mean()), 1) if len(stays) else None,
+            "admissions": int(len(patients.date_index('admission_date').rows(start, as_of))),
+            "discharges": int(len(patients.date_index('discharge_date').rows(start, as_of))),
+            "active_doctors": int(len(np.unique(appointments.column('doctor_id')[window]))),
+            "bed_occupancy": round(current_patients / total_beds * 100, 1) if total_beds else None,
+            "appointments": int(len(window)),
+            "appointments_today": int(len(appointments.date_index('appointment_date').rows(as_of, as_of))),
+            "appointment_completion_rate": round(float(completed / settled * 100), 1) if settled else None,
+            "lab_tests": int(len(lab_tests.date_index('test_date').rows(start, as_of))),
+            "pending_lab_tests": int((lab_tests.column('status') == self.code('lab_status', 'Pending')).sum()),
+            "as_of": str(as_of),
+            "window_days": days
+        }
+
+    def department_performance(self, parameters: Dict) -> Dict:
+        """Appointment volume, outcomes and distinct patients per department (all history unless `days` is given)"""
+        appointments = self.tables['appointments']
+        departments = self.tables['departments']
+        if parameters.get('days'):
+            as_of, days = query_window(parameters, 30)
+            rows = appointments.date_index('appointment_date').rows(as_of - np.timedelta64(days - 1, 'D'), as_of)
+        else:
+            rows = np.arange(appointments.rows)
+        size = self.vocabulary_size('department')
+        patient_codes = max(1, self.vocabulary_size('patient'))
+        department = appointments.column('department_id')[rows]
+        status = appointments.column('status')[rows]
+
+        def count_where(mask: np.ndarray) -> np.ndarray:
+            return np.bincount(department[mask], minlength=size)
+
+        totals = np.bincount(department, minlength=size)
+        completed = count_where(status == self.code('appointment_status', 'Completed'))
+        cancelled = count_where(status == self.code('appointment_status', 'Cancelled'))
+        no_shows = count_where(status == self.code('appointment_status', 'No-show'))
+        minutes = np.bincount(department, weights=appointments.column('duration_minutes')[rows], minlength=size)
+        # Distinct patients per department from unique (department, patient) pairs
+        pairs = np.unique(department.astype(np.int64) * patient_codes + appointments.column('patient_id')[rows])
+        patients = np.bincount(pairs // patient_codes, minlength=size)
+        doctors = np.bincount(self.tables['doctors'].column('department'), minlength=size)
+
+        names = self.department_names()
+        results = []
+        for code in departments.column('id').tolist():
+            settled = completed[code] + cancelled[code] + no_shows[code]
+            results.append({
+                "id": self.vocabulary('department').values[code],
+                "name": names.get(code),
+                "patients": int(patients[code]),
+                "appointments": int(totals[code]),
+                "completed": int(completed[code]),
+                "cancelled": int(cancelled[code]),
+                "no_shows": int(no_shows[code]),
+                "avg_duration_minutes": round(float(minutes[code] / totals[code]), 1) if totals[code] else None,
+                "doctors": int(doctors[code]),
+                "efficiency": round(float(completed[code] / settled * 100), 1) if settled else None
+            })
+        efficiencies = [dept["efficiency"] for dept in results if dept["efficiency"] is not None]
+        return {
+            "departments": results,
+            "total_patients": int(len(np.unique(appointments.column('patient_id')[rows]))),
+            "total_appointments": int(len(rows)),
+            "average_efficiency": round(sum(efficiencies) / len(efficiencies), 1) if efficiencies else None
+        }
+
+    def staff_utilization(self, parameters: Dict) -> Dict:
+        """Booked appointment time per doctor against working hours over a trailing window"""
+        as_of, days = query_window(parameters, 30)
+        hours_per_day = float(parameters.get('hours_per_day', DOCTOR_HOURS_PER_DAY))
+        appointments = self.tables['appointments']
+        doctors = self.tables['doctors']
+        rows = appointments.date_index('appointment_date').rows(as_of - np.timedelta64(days - 1, 'D'), as_of)
+        # Cancelled appointments free the slot; no-shows still block it
+        booked = rows[appointments.column('status')[rows] != self.code('appointment_status', 'Cancelled')]
+
+        size = self.vocabulary_size('doctor')
+        minutes = np.bincount(appointments.column('doctor_id')[booked],
+                              weights=appointments.column('duration_minutes')[booked], minlength=size)
+        lab_rows = self.tables['lab_tests'].date_index('test_date').rows(as_of - np.timedelta64(days - 1, 'D'), as_of)
+        lab_orders = np.bincount(self.tables['lab_tests'].column('doctor_id')[lab_rows], minlength=size)
+        available = days * 5 / 7 * hours_per_day * 60  # weekday working minutes in the window
+
+        doctor_codes = doctors.column('id')
+        utilization = minutes[doctor_codes] / available * 100 if available else np.zeros(len(doctor_codes))
+        by_department = {}
+        names = self.department_names()
+        department_codes = doctors.column('department')
+        for code in np.unique(department_codes).tolist():
+            by_department[names.get(code) or self.vocabulary('department').values[code]] = \
+                round(float(utilization[department_codes == code].mean()), 1)
+        top = np.argsort(-utilization, kind='stable')[:5]
+        doctor_ids = self.vocabulary('doctor').values
+        return {
+            "doctors_utilization": round(float(utilization.mean()), 1) if len(utilization) else None,
+            "max_doctor_utilization": round(float(utilization.max()), 1) if len(utilization) else None,
+            "overbooked_doctors": int((utilization > 100).sum()),
+            "booked_hours": round(float(minutes.sum()) / 60, 1),
+            "lab_orders_per_doctor": round(float(lab_orders[doctor_codes].mean()), 1) if len(doctor_codes) else None,
+            "utilization_by_department": by_department,
+            "top_doctors": [
+                {"doctor_id": doctor_ids[doctor_codes[i]], "utilization": round(float(utilization[i]), 1),
+                 "booked_hours": round(float(minutes[doctor_codes[i]]) / 60, 1)}
+                for i in top.tolist()
+            ],
+            "as_of": str(as_of),
+            "window_days": days
+        }
+
+def query_window(parameters: Dict, default_days: int) -> Tuple[np.datetime64, int]:
+    """The `as_of` date (ISO, default today) and `days` window length from query parameters"""
+    as_of = parameters.get('as_of')
+    as_of = date.fromisoformat(as_of) if as_of else date.today()
+    days = max(1, int(parameters.get('days') or default_days))
+    return np.datetime64(as_of, 'D'), days
@@ -5,45 +5,67 @@ Processes complex analytics queries and provides real-time insights
 """
 
 import asyncio
+import atexit
 import json
 import logging
 import os
+import sys
 import time
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
-import pandas as pd
-import redis
-import requests
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/analytics.log'),
-        logging.StreamHandler()
-    ]
-)
+# Shared modules live next to the service directories (services/shared, /app/shared in the images)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.logging_setup import configure_logging, stop_logging
+from shared.redis_layer import ResilientRedis
+from shared.profiling import PROFILING_ENABLED, create_profiling_router, memory_tracker
+from shared.tracing import TraceStats
+from shared.tenancy import DEFAULT_FACILITY, FACILITY_IDS, QUEUE_PARTITIONS, queue_keys, tenant_key
+from hospital_dataset import DATA_REFRESH_INTERVAL, HospitalDataset
+from alert_rules import AlertEngine, AlertRule, load_rules
+
+configure_logging('analytics.log')
+atexit.register(stop_logging)
 logger = logging.getLogger(__name__)
 
 # Configuration
 IRIS_HOST = os.getenv('IRIS_HOST', 'iris')
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 GRAFANA_HOST = os.getenv('GRAFANA_HOST', 'grafana')
+# Queue partitions this replica consumes, comma-separated (default all of QUEUE_PARTITIONS)
+CONSUMER_PARTITIONS = [int(p) for p in os.getenv('CONSUMER_PARTITIONS', '').split(',') if p.strip()] or None
+CONSUME_HL7_QUEUE = os.getenv('CONSUME_HL7_QUEUE', 'false').lower() == 'true'  # BRPOP drains the queue, so opt in
+CONSUMER_BATCH_SIZE = int(os.getenv('CONSUMER_BATCH_SIZE', '100'))
+ANALYTICS_SOURCE = os.getenv('ANALYTICS_SOURCE', 'simulated')  # 'simulated' or 'data' (generated CSV/JSON files)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '256'))  # per facility, least recently used evicted first
+ALERT_SINK = os.getenv('ALERT_SINK', 'redis')  # 'redis' (pub/sub channel), 'webhook' or 'log'
+ALERT_CHANNEL = os.getenv('ALERT_CHANNEL', 'hospital:alerts')
+ALERT_WEBHOOK_URL = os.getenv('ALERT_WEBHOOK_URL', 'http://localhost:8080/alerts/webhook')
+MAX_COALESCE_MS = 10000  # upper bound for a streaming client's coalescing window
 
 # Initialize FastAPI
 app = FastAPI(title="Analytics Engine", version="1.0.0")
 
-# Initialize Redis
-redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=0, decode_responses=True)
+# Redis client is created on first use so the app accepts requests immediately
+_redis_client = None
+
+def get_redis_client() -> ResilientRedis:
+    """Get the shared pooled, retrying Redis client, creating it on first use"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = ResilientRedis(host=REDIS_HOST)
+    return _redis_client
 
 # Pydantic models
 class AnalyticsQuery(BaseModel):
     query_type: str
     parameters: Dict = {}
+    facility: Optional[str] = None  # DEFAULT_FACILITY when not given
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
@@ -53,44 +75,205 @@ class AnalyticsResult(BaseModel):
     execution_time: float
     timestamp: str
 
+class AlertRuleSpec(BaseModel):
+    id: str
+    panel: str
+    metric: str
+    kind: str = 'threshold'
+    operator: str = '>'
+    threshold: Optional[float] = None
+    clear_threshold: Optional[float] = None
+    value: Optional[str] = None
+    window_seconds: float = 60
+    for_count: int = 1
+    clear_count: int = 1
+    severity: str = 'MEDIUM'
+    message: Optional[str] = None
+
+def compute_merge_patch(old: Optional[Dict], new: Dict) -> Dict:
+    """Compute a JSON merge patch (RFC 7386) turning old into new"""
+    if old is None:
+        return new
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = compute_merge_patch(old[key], value)
+            if nested:
+                patch[key] = nested
+        elif old[key] != value:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+def panel_matches(panel_name: str, panels: Optional[set]) -> bool:
+    """Match 'FACILITY:panel', a bare panel name (every facility) or a bare facility (all its panels)"""
+    if panels is None or panel_name in panels:
+        return True
+    facility, _, panel = panel_name.rpartition(':')
+    return panel in panels or facility in panels
+
+class PanelSubscriber:
+    """A single streaming client with its own panel filter and view of panel state"""
+
+    def __init__(self, panels: Optional[List[str]] = None, coalesce_ms: int = 250):
+        self.panels = set(panels) if panels else None
+        self.coalesce_seconds = max(0, coalesce_ms) / 1000.0
+        self.last_sent: Dict[str, Dict] = {}
+        self.dirty = set()
+        self.event = asyncio.Event()
+        self.updates_sent = 0
+        self.updates_coalesced = 0
+
+    def wants(self, panel_name: str) -> bool:
+        return panel_matches(panel_name, self.panels)
+
+    def set_panels(self, panels: Optional[List[str]]):
+        """Replace the subscription filter, dropping state for panels no longer watched"""
+        self.panels = set(panels) if panels else None
+        for panel_name in list(self.last_sent):
+            if not self.wants(panel_name):
+                del self.last_sent[panel_name]
+        self.dirty = {panel_name for panel_name in self.dirty if self.wants(panel_name)}
+
+    def mark_dirty(self, panel_name: str):
+        if panel_name in self.dirty:
+            self.updates_coalesced += 1
+        self.dirty.add(panel_name)
+        self.event.set()
+
+class PanelBroadcaster:
+    """Pushes panel result diffs to streaming subscribers as soon as they are recomputed"""
+
+    def __init__(self):
+        self.snapshots: Dict[str, Dict] = {}
+        self.versions: Dict[str, int] = {}
+        self.subscribers: List[PanelSubscriber] = []
+
+    def subscribe(self, panels: Optional[List[str]] = None, coalesce_ms: int = 250) -> PanelSubscriber:
+        subscriber = PanelSubscriber(panels, coalesce_ms)
+        self.subscribers.append(subscriber)
+        # New subscribers start with the current snapshot of every panel they watch
+        for panel_name in self.snapshots:
+            if subscriber.wants(panel_name):
+                subscriber.mark_dirty(panel_name)
+        return subscriber
+
+    def unsubscribe(self, subscriber: PanelSubscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def publish(self, panel_name: str, data: Dict) -> bool:
+        """Record a recomputed panel result and wake subscribers watching it; False if it is unchanged"""
+        if self.snapshots.get(panel_name) == data:
+            return False
+        self.snapshots[panel_name] = data
+        self.versions[panel_name] = self.versions.get(panel_name, 0) + 1
+        for subscriber in self.subscribers:
+            if subscriber.wants(panel_name):
+                subscriber.mark_dirty(panel_name)
+        return True
+
+    async def next_updates(self, subscriber: PanelSubscriber) -> List[Dict]:
+        """Wait for dirty panels, coalesce rapid updates, and return one diff per panel"""
+        await subscriber.event.wait()
+        if subscriber.coalesce_seconds:
+            await asyncio.sleep(subscriber.coalesce_seconds)
+        subscriber.event.clear()
+
+        updates = []
+        dirty, subscriber.dirty = subscriber.dirty, set()
+        for panel_name in sorted(dirty):
+            current = self.snapshots.get(panel_name)
+            if current is None:
+                continue
+            previous = subscriber.last_sent.get(panel_name)
+            updates.append({
+                "panel": panel_name,
+                "type": "snapshot" if previous is None else "patch",
+                "version": self.versions[panel_name],
+                "data": compute_merge_patch(previous, current),
+                "timestamp": datetime.now().isoformat()
+            })
+            subscriber.last_sent[panel_name] = current
+        subscriber.updates_sent += len(updates)
+        return updates
+
+    def get_stats(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "panels": {name: self.versions[name] for name in self.snapshots},
+            "updates_sent": sum(s.updates_sent for s in self.subscribers),
+            "updates_coalesced": sum(s.updates_coalesced for s in self.subscribers)
+        }
+
 class AnalyticsEngine:
     def __init__(self):
-        self.cache = {}
+        # One LRU namespace per facility, so a busy facility only evicts its own results
+        self.caches: Dict[str, OrderedDict] = {}
         self.cache_ttl = 300  # 5 minutes
+        self.cache_max_entries = max(1, CACHE_MAX_ENTRIES)
+        self.cache_evictions: Dict[str, int] = {}
         self.is_running = False
         self.query_count = 0
         self.avg_response_time = 0
+        # Data-backed mode answers the KPI queries from the data generator's files
+        self.dataset = HospitalDataset() if ANALYTICS_SOURCE == 'data' else None
         
-    def get_cached_result(self, query_key: str) -> Optional[Dict]:
+    def get_cached_result(self, query_key: str, facility: str = DEFAULT_FACILITY) -> Optional[Dict]:
         """Get cached query result"""
-        if query_key in self.cache:
-            cached_data, timestamp = self.cache[query_key]
+        cache = self.caches.get(facility)
+        if cache is not None and query_key in cache:
+            cached_data, timestamp = cache[query_key]
             if time.time() - timestamp < self.cache_ttl:
+                cache.move_to_end(query_key)
                 return cached_data
             else:
-                del self.cache[query_key]
+                del cache[query_key]
         return None
     
-    def cache_result(self, query_key: str, result: Dict):
-        """Cache query result"""
-        self.cache[query_key] = (result, time.time())
+    def cache_result(self, query_key: str, result: Dict, facility: str = DEFAULT_FACILITY):
+        """Cache query result in the facility's namespace, evicting its least recently used entries"""
+        cache = self.caches.setdefault(facility, OrderedDict())
+        cache[query_key] = (result, time.time())
+        cache.move_to_end(query_key)
+        while len(cache) > self.cache_max_entries:
+            cache.popitem(last=False)
+            self.cache_evictions[facility] = self.cache_evictions.get(facility, 0) + 1
     
-    def execute_query(self, query_type: str, parameters: Dict = None) -> Dict:
-        """Execute analytics query"""
+    def cache_size(self) -> int:
+        return sum(len(cache) for cache in self.caches.values())
+    
+    def execute_query(self, query_type: str, parameters: Dict = None, facility: Optional[str] = None) -> Dict:
+        """Execute analytics query for one facility"""
         start_time = time.time()
         
         if parameters is None:
             parameters = {}
+        facility = facility or DEFAULT_FACILITY
+        if facility not in FACILITY_IDS:
+            raise KeyError(f"Unknown facility: {facility}")
         
         # Check cache first
         query_key = f"{query_type}:{json.dumps(parameters, sort_keys=True)}"
-        cached_result = self.get_cached_result(query_key)
+        # The generated data files describe a single hospital, served as the default facility
+        data_backed = (self.dataset is not None and query_type in HospitalDataset.QUERIES
+                       and facility == DEFAULT_FACILITY)
+        if data_backed:
+            # A refreshed dataset gets new cache entries instead of serving stale ones
+            query_key += f":v{self.dataset.version}"
+        cached_result = self.get_cached_result(query_key, facility)
         if cached_result:
-            logger.info(f"Cache hit for query: {query_type}")
+            logger.info(f"Cache hit for query: {query_type}", extra={'facility': facility})
             return cached_result
         
         # Execute query based on type
-        if query_type == "hospital_kpis":
+        if data_backed:
+            result = self.dataset.query(query_type, parameters)
+        elif query_type == "hospital_kpis":
             result = self.get_hospital_kpis()
         elif query_type == "department_performance":
             result = self.get_department_performance(parameters)
@@ -106,14 +289,14 @@ class AnalyticsEngine:
             raise ValueError(f"Unknown query type: {query_type}")
         
         # Cache result
-        self.cache_result(query_key, result)
+        self.cache_result(query_key, result, facility)
         
         # Update metrics
         execution_time = time.time() - start_time
         self.query_count += 1
         self.avg_response_time = (self.avg_response_time * (self.query_count - 1) + execution_time) / self.query_count
         
-        logger.info(f"Executed query {query_type} in {execution_time:.3f}s")
+        logger.info(f"Executed query {query_type} in {execution_time:.3f}s", extra={'facility': facility})
         return result
     
     def get_hospital_kpis(self) -> Dict:
@@ -228,14 +411,24 @@ class AnalyticsEngine:
             ]
         }
     
-    async def send_to_grafana(self, data: Dict, panel_name: str):
+    async def send_to_grafana(self, data: Dict, panel_name: str, facility: str = DEFAULT_FACILITY):
         """Send analytics data to Grafana"""
         try:
             # In real implementation, this would send to Grafana API
-            logger.info(f"Sending {panel_name} data to Grafana")
+            logger.info(f"Sending {panel_name} data to Grafana", extra={'facility': facility})
+            
+            # Push to streaming subscribers before touching Redis
+            changed = panel_broadcaster.publish(tenant_key(facility, panel_name), data)
+            
+            # Only a new result is an observation: a cached result republished unchanged must not
+            # count towards for_count/clear_count again
+            if changed:
+                alert_engine.evaluate(panel_name, data, facility=facility)
             
-            # Store in Redis for Grafana to consume
-            redis_client.set(f"grafana:{panel_name}", json.dumps(data), ex=300)
+            # Store in Redis for Grafana to consume; retries and backoff block, so off the event loop
+            await asyncio.to_thread(
+                get_redis_client().set, f"grafana:{tenant_key(facility, panel_name)}", json.dumps(data), ex=300
+            )
             
         except Exception as e:
             logger.error(f"Error sending to Grafana: {e}")
@@ -257,9 +450,10 @@ class AnalyticsEngine:
                     ("predictive_analytics", "predictive_insights")
                 ]
                 
-                for query_type, panel_name in queries:
-                    result = self.execute_query(query_type)
-                    await self.send_to_grafana(result, panel_name)
+                for facility in FACILITY_IDS:
+                    for query_type, panel_name in queries:
+                        result = self.execute_query(query_type, facility=facility)
+                        await self.send_to_grafana(result, panel_name, facility)
                 
                 # Wait 10 seconds before next iteration
                 await asyncio.sleep(10)
@@ -270,9 +464,194 @@ class AnalyticsEngine:
         
         logger.info("Analytics processing loop stopped")
 
+# Census-relevant message types counted per facility by the queue consumer
+FACILITY_EVENTS = {'ADT^A01': 'admissions', 'ADT^A03': 'discharges', 'ADT^A02': 'transfers',
+                   'ORM^O01': 'lab_orders', 'ORU^R01': 'lab_results'}
+
+class HL7QueueConsumer:
+    """Consumes HL7 message envelopes from the partitioned Redis queue and tracks per-stage latency"""
+
+    def __init__(self, keys: Optional[List[str]] = None, batch_size: int = CONSUMER_BATCH_SIZE):
+        self.queue_keys = keys or queue_keys(owned=CONSUMER_PARTITIONS)
+        self.next_key = 0
+        self.batch_size = max(1, batch_size)
+        self.is_running = False
+        self.processed_count = 0
+        self.receipt_count = 0
+        self.error_count = 0
+        self.message_counts: Dict[str, int] = {}
+        self.facility_counts: Dict[str, Dict[str, int]] = {}  # facility -> message type -> count
+        self.partition_counts: Dict[str, int] = {}
+        self.trace_stats = TraceStats()
+
+    def fetch_batch(self) -> tuple:
+        """Block up to a second for one envelope, then take whatever else is already queued
+
+        BRPOP serves the first non-empty key it is given, so the key order rotates past the
+        partition just read; a backlog on one partition cannot starve the others.
+        """
+        client = get_redis_client()
+        keys = self.queue_keys[self.next_key:] + self.queue_keys[:self.next_key]
+        item = client.brpop(keys, timeout=1)
+        if item is None:
+            return [], None
+        key = item[0]
+        self.next_key = (self.queue_keys.index(key) + 1) % len(self.queue_keys)
+        batch = [item[1]]
+        if self.batch_size > 1:
+            batch.extend(client.rpop(key, self.batch_size - 1) or [])
+        self.partition_counts[key] = self.partition_counts.get(key, 0) + len(batch)
+        return batch, time.monotonic()
+
+    def process(self, raw: str, dequeued: float):
+        """Count one envelope by message type and facility and record its trace"""
+        envelope = json.loads(raw)
+        if envelope.get('status') == 'PROCESSED':
+            # IRIS delivery receipts share the queue; they are not messages of their own
+            self.receipt_count += 1
+            return
+        message_type = envelope.get('message_type', 'UNKNOWN')
+        self.message_counts[message_type] = self.message_counts.get(message_type, 0) + 1
+        counts = self.facility_counts.setdefault(envelope.get('facility') or DEFAULT_FACILITY, {})
+        counts[message_type] = counts.get(message_type, 0) + 1
+        self.processed_count += 1
+        trace = envelope.get('trace')
+        if trace:
+            trace['dequeued'] = dequeued
+            trace['processed'] = time.monotonic()
+            self.trace_stats.record(trace)
+
+    async def run(self):
+        """Consume the queue until stopped, fetching in a worker thread"""
+        self.is_running = True
+        logger.info(f"Consuming HL7 messages from {', '.join(self.queue_keys)}")
+        while self.is_running:
+            try:
+                batch, dequeued = await asyncio.to_thread(self.fetch_batch)
+            except Exception as e:
+                logger.error(f"Error reading HL7 queue: {e}")
+                await asyncio.sleep(5)
+                continue
+            for raw in batch:
+                try:
+                    self.process(raw, dequeued)
+                except (ValueError, TypeError, AttributeError) as e:
+                    self.error_count += 1
+                    logger.error(f"Invalid HL7 queue envelope: {e}")
+        logger.info("HL7 queue consumer stopped")
+
+    def get_stats(self) -> Dict:
+        return {
+            "is_running": self.is_running,
+            "queues": self.queue_keys,
+            "processed_count": self.processed_count,
+            "receipt_count": self.receipt_count,
+            "error_count": self.error_count,
+            "message_counts": self.message_counts,
+            "partition_counts": self.partition_counts
+        }
+
+    def facility_activity(self, facility: str) -> Dict:
+        """Per-facility aggregate of the consumed traffic"""
+        counts = self.facility_counts.get(facility, {})
+        activity = {name: counts.get(message_type, 0) for message_type, name in FACILITY_EVENTS.items()}
+        activity["net_census_change"] = activity["admissions"] - activity["discharges"]
+        activity["messages"] = sum(counts.values())
+        activity["message_counts"] = dict(counts)
+        return activity
+
 # Initialize analytics engine
 analytics_engine = AnalyticsEngine()
 
+# Initialize HL7 queue consumer
+hl7_consumer = HL7QueueConsumer()
+
+# Initialize panel broadcaster for streaming clients
+panel_broadcaster = PanelBroadcaster()
+
+# Initialize alert rule engine (ALERT_RULES_FILE replaces the built-in rules)
+alert_engine = AlertEngine(load_rules())
+
+# Notifications received by the local webhook stand-in (POST /alerts/webhook)
+webhook_batches = deque(maxlen=100)
+
+def deliver_alerts(batch: List[Dict]):
+    """Send one batch of alert notifications to the configured sink (runs in a worker thread)"""
+    payload = json.dumps({"alerts": batch, "count": len(batch), "sent_at": datetime.now().isoformat()})
+    if ALERT_SINK == 'redis':
+        # Buffered by the Redis layer during outages and replayed once it recovers
+        get_redis_client().write('publish', ALERT_CHANNEL, payload)
+    elif ALERT_SINK == 'webhook':
+        # Imported on first use, like the other heavy clients, so startup stays fast
+        import requests
+        response = requests.post(ALERT_WEBHOOK_URL, data=payload,
+                                 headers={"Content-Type": "application/json"}, timeout=5)
+        response.raise_for_status()
+    else:
+        for alert in batch:
+            logger.warning(f"Alert {alert['status']}: {alert['message']}", extra={"alert_id": alert["alert_id"]})
+
+def parse_panel_filter(panels: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated panel filter into a list (None means all panels)"""
+    if not panels:
+        return None
+    return [name.strip() for name in panels.split(",") if name.strip()]
+
+def filter_request_error(request) -> Optional[str]:
+    """Why a WebSocket filter update is invalid, or None if it can be applied"""
+    if not isinstance(request, dict):
+        return "expected a JSON object"
+    panels = request.get("panels")
+    if panels is not None and not (isinstance(panels, list) and all(isinstance(name, str) for name in panels)):
+        return "panels must be a list of strings"
+    coalesce_ms = request.get("coalesce_ms")
+    if "coalesce_ms" in request and (isinstance(coalesce_ms, bool) or not isinstance(coalesce_ms, (int, float))):
+        return "coalesce_ms must be a number"
+    return None
+
+@app.on_event("startup")
+async def start_consumer():
+    """Start consuming the HL7 queue in the background"""
+    if CONSUME_HL7_QUEUE:
+        asyncio.create_task(hl7_consumer.run())
+
+@app.on_event("startup")
+async def start_alert_notifier():
+    """Deliver alert notifications in batches in the background"""
+    asyncio.create_task(alert_engine.run_notifier(deliver_alerts))
+
+@app.on_event("startup")
+async def start_dataset_refresh():
+    """Load the generated data files and keep watching them in data-backed mode"""
+    if analytics_engine.dataset is not None:
+        asyncio.create_task(refresh_dataset())
+
+async def refresh_dataset():
+    """Check the data files for changes in a worker thread so the event loop stays responsive"""
+    while True:
+        try:
+            await asyncio.to_thread(analytics_engine.dataset.refresh)
+        except Exception as e:
+            logger.error(f"Error refreshing dataset: {e}")
+        await asyncio.sleep(DATA_REFRESH_INTERVAL)
+
+@app.on_event("shutdown")
+async def stop_consumer():
+    hl7_consumer.is_running = False
+
+# Opt-in profiling surface (sampling profiler, tracemalloc, event-loop lag) under /debug
+if PROFILING_ENABLED:
+    app.include_router(create_profiling_router())
+    memory_tracker.register_probe("analytics", lambda: {
+        "cache_entries": analytics_engine.cache_size(),
+        "panel_snapshots": len(panel_broadcaster.snapshots),
+        "stream_subscribers": len(panel_broadcaster.subscribers),
+        "consumer_message_types": len(hl7_consumer.message_counts),
+        "dataset_rows": analytics_engine.dataset.get_stats()["rows"] if analytics_engine.dataset is not None else None,
+        "alert_rules": len(alert_engine.rules),
+        "alert_outbox": len(alert_engine.outbox)
+    })
+
 # API Endpoints
 @app.get("/health")
 async def health_check():
@@ -291,14 +670,26 @@ async def get_status():
         "is_running": analytics_engine.is_running,
         "query_count": analytics_engine.query_count,
         "avg_response_time": round(analytics_engine.avg_response_time, 3),
-        "cache_size": len(analytics_engine.cache)
+        "cache_size": analytics_engine.cache_size(),
+        "facilities": FACILITY_IDS,
+        "queue_partitions": QUEUE_PARTITIONS,
+        "source": ANALYTICS_SOURCE,
+        "dataset": analytics_engine.dataset.get_stats() if analytics_engine.dataset is not None else None,
+        "streaming": panel_broadcaster.get_stats(),
+        "alerts": alert_engine.get_stats(),
+        "consumer": hl7_consumer.get_stats(),
+        "latency": hl7_consumer.trace_stats.to_dict(),
+        "redis": get_redis_client().get_stats()
     }
 
 @app.post("/query")
 async def execute_analytics_query(query: AnalyticsQuery):
     """Execute analytics query"""
+    facility = query.facility or DEFAULT_FACILITY
+    if facility not in FACILITY_IDS:
+        raise HTTPException(status_code=404, detail=f"Unknown facility: {facility}")
     try:
-        result = analytics_engine.execute_query(query.query_type, query.parameters)
+        result = analytics_engine.execute_query(query.query_type, query.parameters, facility)
         return AnalyticsResult(
             query_type=query.query_type,
             result=result,
@@ -349,16 +740,162 @@ async def stop_analytics():
 async def get_cache_info():
     """Get cache information"""
     return {
-        "cache_size": len(analytics_engine.cache),
+        "cache_size": analytics_engine.cache_size(),
         "cache_ttl": analytics_engine.cache_ttl,
-        "cached_queries": list(analytics_engine.cache.keys())
+        "max_entries_per_facility": analytics_engine.cache_max_entries,
+        "namespaces": {
+            facility: {
+                "size": len(cache),
+                "evictions": analytics_engine.cache_evictions.get(facility, 0),
+                "cached_queries": list(cache.keys())
+            }
+            for facility, cache in analytics_engine.caches.items()
+        }
     }
 
 @app.delete("/cache")
-async def clear_cache():
-    """Clear analytics cache"""
-    analytics_engine.cache.clear()
-    return {"message": "Cache cleared"}
+async def clear_cache(facility: Optional[str] = None):
+    """Clear analytics cache, for one facility or all of them"""
+    if facility is None:
+        analytics_engine.caches.clear()
+        return {"message": "Cache cleared"}
+    analytics_engine.caches.pop(facility, None)
+    return {"message": f"Cache cleared for {facility}"}
+
+@app.get("/facilities")
+async def get_facilities():
+    """Per-facility aggregates: consumed traffic, cache namespace, panels and active alerts"""
+    active = alert_engine.active_alerts()
+    return {
+        facility: {
+            "activity": hl7_consumer.facility_activity(facility),
+            "cache_entries": len(analytics_engine.caches.get(facility, {})),
+            "panels": sorted(name for name in panel_broadcaster.snapshots if name.startswith(f"{facility}:")),
+            "active_alerts": sum(1 for alert in active if alert["facility"] == facility)
+        }
+        for facility in FACILITY_IDS
+    }
+
+@app.get("/panels")
+async def get_panels(panels: Optional[str] = None):
+    """Get the latest snapshot of each panel, filtered the same way as /stream"""
+    panel_filter = parse_panel_filter(panels)
+    wanted = set(panel_filter) if panel_filter else None
+    return {
+        name: {"version": panel_broadcaster.versions[name], "data": data}
+        for name, data in panel_broadcaster.snapshots.items()
+        if panel_matches(name, wanted)
+    }
+
+@app.get("/stream")
+async def stream_panels(panels: Optional[str] = None, coalesce_ms: int = Query(250, ge=0, le=MAX_COALESCE_MS)):
+    """Stream panel updates as Server-Sent Events (snapshot first, then merge patches)"""
+    subscriber = panel_broadcaster.subscribe(parse_panel_filter(panels), coalesce_ms)
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    updates = await asyncio.wait_for(panel_broadcaster.next_updates(subscriber), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so proxies don't close idle streams
+                    yield ": keep-alive\n\n"
+                    continue
+                for update in updates:
+                    yield f"id: {update['panel']}:{update['version']}\nevent: {update['type']}\ndata: {json.dumps(update)}\n\n"
+        finally:
+            panel_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws")
+async def websocket_panels(websocket: WebSocket, panels: Optional[str] = None,
+                           coalesce_ms: int = Query(250, ge=0, le=MAX_COALESCE_MS)):
+    """Stream panel updates over WebSocket; clients may send {"panels": [...]} to change their filter"""
+    await websocket.accept()
+    subscriber = panel_broadcaster.subscribe(parse_panel_filter(panels), coalesce_ms)
+
+    async def receive_filters():
+        while True:
+            request = await websocket.receive_json()
+            error = filter_request_error(request)
+            if error:
+                await websocket.send_json({"error": error, "request": request})
+                continue
+            if "panels" in request:
+                subscriber.set_panels(request["panels"])
+                for panel_name in panel_broadcaster.snapshots:
+                    if subscriber.wants(panel_name) and panel_name not in subscriber.last_sent:
+                        subscriber.mark_dirty(panel_name)
+            if "coalesce_ms" in request:
+                subscriber.coalesce_seconds = min(MAX_COALESCE_MS, max(0, int(request["coalesce_ms"]))) / 1000.0
+
+    receiver = asyncio.create_task(receive_filters())
+    try:
+        while not receiver.done():
+            sender = asyncio.create_task(panel_broadcaster.next_updates(subscriber))
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not sender.done():
+                sender.cancel()
+                break
+            for update in sender.result():
+                await websocket.send_json(update)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        panel_broadcaster.unsubscribe(subscriber)
+    if receiver.done() and not receiver.cancelled():
+        error = receiver.exception()
+        if error is not None and not isinstance(error, WebSocketDisconnect):
+            logger.error(f"WebSocket filter receiver failed: {error!r}")
+
+@app.get("/alerts")
+async def get_alerts():
+    """Get active alerts and the most recent notifications"""
+    return {
+        "active": alert_engine.active_alerts(),
+        "recent": list(alert_engine.history)[-50:],
+        "sink": ALERT_SINK,
+        "stats": alert_engine.get_stats()
+    }
+
+@app.get("/alerts/rules")
+async def get_alert_rules():
+    """List alert rules with their current evaluation state"""
+    return {"rules": alert_engine.get_rules()}
+
+@app.post("/alerts/rules")
+async def put_alert_rule(spec: AlertRuleSpec):
+    """Add an alert rule, replacing any rule with the same id"""
+    try:
+        rule = AlertRule.from_dict(spec.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    alert_engine.add_rule(rule)
+    return {"message": f"Rule {rule.id} saved", "rule": rule.to_dict()}
+
+@app.delete("/alerts/rules/{rule_id}")
+async def delete_alert_rule(rule_id: str):
+    """Remove an alert rule, resolving its alert if it is firing"""
+    if not alert_engine.remove_rule(rule_id):
+        raise HTTPException(status_code=404, detail=f"Unknown rule: {rule_id}")
+    return {"message": f"Rule {rule_id} removed"}
+
+@app.post("/alerts/webhook")
+async def receive_alert_webhook(payload: Dict):
+    """Local webhook stand-in: keeps delivered batches for inspection (ALERT_SINK=webhook)"""
+    webhook_batches.append({"received_at": datetime.now().isoformat(), **payload})
+    return {"received": payload.get("count", 0)}
+
+@app.get("/alerts/webhook")
+async def get_alert_webhook():
+    """Batches received by the webhook stand-in, newest last"""
+    return {"batches": list(webhook_batches)}
 
 if __name__ == "__main__":
     import uvicorn
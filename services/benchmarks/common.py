@@ -0,0 +1,188 @@
+"""
+Shared helpers for the benchmark scripts
+Loads service modules side by side and provides a Redis stand-in so no server is needed
+"""
+
+import bisect
+import importlib.util
+import os
+import sys
+import threading
+from collections import deque
+from itertools import islice
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class InMemoryPipeline:
+    """Queues stand-in calls and runs them on execute(), like a non-transactional pipeline"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue_call(*args, **kwargs):
+            self.calls.append((getattr(self.client, name), args, kwargs))
+            return self
+        return queue_call
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [fn(*args, **kwargs) for fn, args, kwargs in calls]
+
+class SortedSet:
+    """Members kept in score order, so range trims and reads bisect instead of scanning"""
+
+    def __init__(self):
+        self.scores = {}
+        self.ordered_scores = []
+        self.ordered_members = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, member, score: float):
+        if member in self.scores:
+            self.discard(member)
+        # Scores mostly arrive in increasing order, so this is usually an append
+        index = bisect.bisect_right(self.ordered_scores, score)
+        self.ordered_scores.insert(index, score)
+        self.ordered_members.insert(index, member)
+        self.scores[member] = score
+
+    def discard(self, member):
+        score = self.scores.pop(member)
+        index = bisect.bisect_left(self.ordered_scores, score)
+        while self.ordered_members[index] != member:
+            index += 1
+        del self.ordered_scores[index]
+        del self.ordered_members[index]
+
+    def span(self, low: float, high: float, low_open: bool = False, high_open: bool = False):
+        """(start, end) slice of the members with low <= score <= high (or < with the open flags)"""
+        start = (bisect.bisect_right if low_open else bisect.bisect_left)(self.ordered_scores, low)
+        end = (bisect.bisect_left if high_open else bisect.bisect_right)(self.ordered_scores, high)
+        return start, max(start, end)
+
+    def remove_span(self, start: int, end: int) -> int:
+        for member in self.ordered_members[start:end]:
+            del self.scores[member]
+        del self.ordered_scores[start:end]
+        del self.ordered_members[start:end]
+        return end - start
+
+class InMemoryRedis:
+    """Minimal thread-safe Redis stand-in (lists, strings, sorted sets) so the benchmarks need no server"""
+
+    def __init__(self):
+        self.lists = {}
+        self.zsets = {}
+        self.lock = threading.RLock()
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def ping(self):
+        return True
+
+    def expire(self, key, seconds):
+        return True
+
+    def get(self, key):
+        with self.lock:
+            return self.lists.get(key)
+
+    def mget(self, keys):
+        with self.lock:
+            return [self.lists.get(key) for key in keys]
+
+    def zadd(self, key, mapping):
+        with self.lock:
+            members = self.zsets.setdefault(key, SortedSet())
+            for member, score in mapping.items():
+                members.add(member, float(score))
+            return len(mapping)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        with self.lock:
+            members = self.zsets.get(key)
+            if members is None:
+                return 0
+            return members.remove_span(*members.span(float(min_score), float(max_score)))
+
+    def zrevrangebyscore(self, key, max_score, min_score, start=None, num=None, withscores=False):
+        def bound(value):
+            value = str(value)
+            return (float(value[1:]), True) if value.startswith('(') else (float(value), False)
+        (high, high_open), (low, low_open) = bound(max_score), bound(min_score)
+        with self.lock:
+            members = self.zsets.get(key)
+            if members is None:
+                return []
+            first, last = members.span(low, high, low_open, high_open)
+            # Highest score first
+            indices = range(last - 1, first - 1, -1)
+            if start is not None:
+                indices = indices[start:start + num]
+            entries = [(members.ordered_members[index], members.ordered_scores[index]) for index in indices]
+        return entries if withscores else [member for member, _ in entries]
+
+    def lpush(self, key, *values):
+        with self.lock:
+            items = self.lists.setdefault(key, deque())
+            items.extendleft(values)
+            return len(items)
+
+    def lrange(self, key, start, end):
+        with self.lock:
+            items = self.lists.get(key, ())
+            return list(islice(items, start, None if end == -1 else end + 1))
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.lists[key] = value
+            return True
+
+class CountingRedis:
+    """Thread-safe Redis stub that counts calls and stores nothing, so every call costs the same
+
+    For throughput benchmarks where the Redis stand-in's own cost must not grow with the run.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def call(*args, **kwargs):
+            with self.lock:
+                self.calls[name] = self.calls.get(name, 0) + 1
+            return True
+        return call
+
+def redis_stand_in():
+    """fakeredis when it is installed, the in-memory stand-in otherwise; returns (client, name)"""
+    try:
+        import fakeredis
+    except ImportError:
+        return InMemoryRedis(), "in-memory"
+    return fakeredis.FakeRedis(), "fakeredis"
+
+def load_service(directory: str, module_name: str):
+    """Import a service's main.py under its own module name, so several services can be loaded at once"""
+    service_dir = os.path.join(SERVICES_DIR, directory)
+    if service_dir not in sys.path:
+        # Services import their sibling modules (e.g. the data generator's loader)
+        sys.path.insert(0, service_dir)
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(service_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Data generation benchmark for the hospital data generator
+Measures patient generation records/second for several worker counts
+(checking the output is identical whatever the worker count) and
+column-wise lab test synthesis rows/second
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_generator():
+    sys.path.insert(0, os.path.join(SERVICES_DIR, "data-generator"))
+    import main
+    return main
+
+def run(main, patients: int, workers: int, chunk_size: int, seed: int) -> tuple:
+    main.PATIENT_COUNT = patients
+    generator = main.HospitalDataGenerator(seed=seed, workers=workers, chunk_size=chunk_size)
+    started = time.perf_counter()
+    records = generator.generate_patients()
+    elapsed = time.perf_counter() - started
+    return records, {
+        "workers": workers,
+        "records": len(records),
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(len(records) / elapsed, 1)
+    }
+
+def run_lab_tests(main, lab_tests: int, chunk_size: int, seed: int) -> dict:
+    main.PATIENT_COUNT = 1000
+    main.LAB_TEST_COUNT = lab_tests
+    generator = main.HospitalDataGenerator(seed=seed, workers=1, chunk_size=chunk_size)
+    generator.generate_departments()
+    generator.generate_doctors()
+    generator.generate_patients()
+    started = time.perf_counter()
+    rows = sum(len(chunk['id']) for chunk in generator.iter_lab_test_chunks())
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1)
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark parallel patient generation")
+    parser.add_argument("--patients", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, action="append", help="Worker counts to try")
+    parser.add_argument("--lab-tests", type=int, default=1000000, help="Lab test rows to synthesize")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    main = load_generator()
+    logging.getLogger(main.__name__).setLevel(logging.WARNING)
+
+    worker_counts = args.workers or sorted({1, 2, os.cpu_count() or 1})
+    results = []
+    reference = None
+    for workers in worker_counts:
+        records, result = run(main, args.patients, workers, args.chunk_size, args.seed)
+        if reference is None:
+            reference = records
+        result["identical_output"] = records == reference
+        results.append(result)
+        print(f"workers={workers}: {result['records_per_second']:,.0f} records/s "
+              f"({result['seconds']}s, identical={result['identical_output']})")
+
+    lab_result = run_lab_tests(main, args.lab_tests, max(args.chunk_size, 100000), args.seed)
+    print(f"lab_tests: {lab_result['rows_per_second']:,.0f} rows/s ({lab_result['seconds']}s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"patients": results, "lab_tests": lab_result}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load test for the HL7 simulator's delivery path
+Ramps the offered message rate step by step against the real send path
+(the simulator's emit_message_async: MLLP to a local ACK server standing in
+for IRIS, plus a constant-cost Redis stub so only the delivery path saturates),
+records achieved throughput, backlog, errors and latency percentiles per step,
+and reports the knee and maximum sustainable rate
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from common import CountingRedis, load_service
+
+class AckHandler(socketserver.BaseRequestHandler):
+    """Reads MLLP frames and answers each with an HL7 ACK after the configured service time"""
+
+    def handle(self):
+        server = self.server
+        buffer = b''
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b'\x1c\r' in buffer:
+                frame, buffer = buffer.split(b'\x1c\r', 1)
+                message = frame.lstrip(b'\x0b').decode('utf-8', errors='replace')
+                self.request.sendall(server.process(message))
+
+class AckServer(socketserver.ThreadingTCPServer):
+    """Local MLLP endpoint that behaves like an IRIS HL7 service with fixed capacity
+
+    At most `workers` messages are processed at once, each taking `latency`
+    seconds, so capacity is roughly workers / latency messages per second.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float, workers: int, error_every: int = 0):
+        super().__init__(('127.0.0.1', 0), AckHandler)
+        self.latency = latency
+        self.slots = threading.BoundedSemaphore(max(1, workers))
+        self.error_every = error_every
+        self.received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def process(self, message: str) -> bytes:
+        with self.slots:
+            if self.latency:
+                time.sleep(self.latency)
+        with self.lock:
+            self.received += 1
+            reject = self.error_every and self.received % self.error_every == 0
+        fields = message.split('\r', 1)[0].split('|')
+        control_id = fields[9] if len(fields) > 9 else ''
+        code = 'AE' if reject else 'AA'
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        ack = (f"MSH|^~\\&|IRIS|INTEGRATION|HIS|HOSPITAL_ABC|{timestamp}||ACK|{control_id}|P|2.5\r"
+               f"MSA|{code}|{control_id}\r")
+        return b'\x0b' + ack.encode('utf-8') + b'\x1c\r'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def load_simulator(port: int):
+    """Import the simulator pointed at the ACK server, with a thread-safe constant-cost Redis stub"""
+    os.environ["IRIS_HL7_HOST"] = "127.0.0.1"
+    os.environ["IRIS_HL7_PORT"] = str(port)
+    os.environ["IRIS_LATENCY"] = "0"
+    os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="load-test-"))
+    module = load_service("hl7-simulator", "hl7_simulator_main")
+    module._redis_client = module.ResilientRedis(client=CountingRedis())
+    module.simulator.initialize_data()
+    return module
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def run_step(simulator, rate: float, duration: float, senders: int) -> dict:
+    """Offer `rate` msg/s for `duration` seconds to a fixed pool of sender tasks
+
+    Each sender awaits emit_message_async, the coroutine the simulator's run_facility
+    loop uses: generation and bookkeeping run on the event loop and the MLLP round
+    trip in a worker thread, as in the service. Latency is measured from each
+    message's scheduled send time, so time spent waiting in the backlog counts
+    (no coordinated omission).
+    """
+    backlog = asyncio.Queue()
+    latencies, completions = [], []
+    errors = 0
+    message_types = simulator.choose_message_types(int(rate * duration))
+
+    async def sender():
+        nonlocal errors
+        while True:
+            item = await backlog.get()
+            if item is None:
+                return
+            scheduled, msg_type = item
+            ok = await simulator.emit_message_async(msg_type)
+            finished = time.perf_counter()
+            completions.append(finished)
+            if ok:
+                latencies.append(finished - scheduled)
+            else:
+                errors += 1
+
+    tasks = [asyncio.create_task(sender()) for _ in range(senders)]
+
+    started = time.perf_counter()
+    end = started + duration
+    offered = int(rate * duration)
+    depths = []
+    for i in range(offered):
+        due = started + i / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        backlog.put_nowait((due, message_types[i]))
+        depths.append(backlog.qsize())
+    remaining = end - time.perf_counter()
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    final_depth = backlog.qsize()
+
+    # Discard what is still queued so the next step starts clean; in-flight sends finish
+    while not backlog.empty():
+        backlog.get_nowait()
+    for _ in tasks:
+        backlog.put_nowait(None)
+    await asyncio.gather(*tasks)
+
+    completed = sum(1 for finished in completions if finished <= end)
+    achieved = completed / duration
+    return {
+        "offered_rate": rate,
+        "offered": offered,
+        "completed": completed,
+        "achieved_rate": round(achieved, 1),
+        "errors": errors,
+        "max_queue_depth": max(depths, default=0),
+        "final_queue_depth": final_depth,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else None
+        }
+    }
+
+def is_sustainable(step: dict, args) -> bool:
+    """A step is sustained when throughput keeps up, errors stay low and p99 meets the SLO"""
+    p99 = step["latency_ms"]["p99"]
+    return (
+        step["achieved_rate"] >= step["offered_rate"] * args.min_efficiency
+        and step["errors"] <= step["offered"] * args.max_error_rate
+        and p99 is not None and p99 <= args.latency_slo_ms
+        and step["final_queue_depth"] <= max(1, step["offered_rate"] * 0.1)
+    )
+
+def find_knee(steps: list, factor: float):
+    """Last offered rate before p95 latency exceeds factor x the lightest step's p95"""
+    baseline = next((step["latency_ms"]["p95"] for step in steps if step["latency_ms"]["p95"]), None)
+    if baseline is None:
+        return None
+    knee = None
+    for step in steps:
+        p95 = step["latency_ms"]["p95"]
+        if p95 is None or p95 > baseline * factor:
+            break
+        knee = step["offered_rate"]
+    return knee
+
+async def ramp(simulator, args) -> list:
+    """Run steps of increasing offered rate until too many in a row are unsustainable"""
+    # One worker thread, and so one MLLP connection, per sender
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.senders))
+    steps = []
+    failures = 0
+    rate = args.start_rate
+    print(f"{'offered':>8} {'achieved':>9} {'errors':>6} {'depth':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  sustained")
+    while rate <= args.max_rate:
+        step = await run_step(simulator, rate, args.step_seconds, args.senders)
+        step["sustainable"] = is_sustainable(step, args)
+        steps.append(step)
+        latency = step["latency_ms"]
+        print(f"{rate:8.0f} {step['achieved_rate']:9.1f} {step['errors']:6d} {step['max_queue_depth']:6d} "
+              f"{latency['p50'] or 0:8.2f} {latency['p95'] or 0:8.2f} {latency['p99'] or 0:8.2f}  {step['sustainable']}")
+        failures = 0 if step["sustainable"] else failures + 1
+        if failures >= args.stop_after:
+            break
+        rate += args.step
+    return steps
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Ramp offered HL7 load until the delivery path saturates")
+    parser.add_argument("--start-rate", type=float, default=50, help="First offered rate (msg/s)")
+    parser.add_argument("--step", type=float, default=50, help="Rate increase per step (msg/s)")
+    parser.add_argument("--max-rate", type=float, default=2000, help="Stop ramping at this rate (msg/s)")
+    parser.add_argument("--step-seconds", type=float, default=5, help="Duration of each step")
+    parser.add_argument("--senders", type=int, default=8, help="Concurrent sender tasks (worker threads and connections)")
+    parser.add_argument("--ack-latency", type=float, default=0.005, help="ACK server service time per message (s)")
+    parser.add_argument("--ack-workers", type=int, default=4, help="Messages the ACK server processes at once")
+    parser.add_argument("--ack-error-every", type=int, default=0, help="Reject every Nth message with AE (0 = never)")
+    parser.add_argument("--latency-slo-ms", type=float, default=250, help="p99 latency a sustainable step must meet")
+    parser.add_argument("--min-efficiency", type=float, default=0.95, help="Achieved/offered ratio a sustainable step must meet")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error fraction a sustainable step may have")
+    parser.add_argument("--knee-factor", type=float, default=3.0, help="p95 growth over the first step that marks the knee")
+    parser.add_argument("--stop-after", type=int, default=2, help="Stop after this many consecutive unsustainable steps")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    server = AckServer(args.ack_latency, args.ack_workers, args.ack_error_every).start()
+    main = load_simulator(server.port)
+    print(f"ACK server on port {server.port}: ~{args.ack_workers / args.ack_latency if args.ack_latency else float('inf'):,.0f} msg/s capacity")
+
+    steps = asyncio.run(ramp(main.simulator, args))
+    server.shutdown()
+
+    sustainable = [step["offered_rate"] for step in steps if step["sustainable"]]
+    report = {
+        "parameters": vars(args),
+        "steps": steps,
+        "knee_rate": find_knee(steps, args.knee_factor),
+        "max_sustainable_rate": max(sustainable) if sustainable else None,
+        "peak_achieved_rate": max((step["achieved_rate"] for step in steps), default=None)
+    }
+    print(f"Knee: {report['knee_rate']} msg/s, max sustainable: {report['max_sustainable_rate']} msg/s, "
+          f"peak achieved: {report['peak_achieved_rate']} msg/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Logging throughput benchmark for the HL7 simulator
+Compares the message path with the original synchronous logging setup,
+the queue-based JSON pipeline and logging disabled; each mode runs in its own
+process against a fresh constant-cost Redis stub, so results do not depend on run order
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import SERVICES_DIR, CountingRedis
+
+def load_simulator(log_dir: str):
+    """Import the simulator module with simulated IRIS latency disabled and a Redis stub"""
+    os.environ["LOG_DIR"] = log_dir
+    os.environ["IRIS_LATENCY"] = "0"
+    sys.path.insert(0, os.path.join(SERVICES_DIR, "hl7-simulator"))
+    import main
+    main._redis_client = main.ResilientRedis(client=CountingRedis())
+    main.simulator.initialize_data()
+    return main
+
+def configure_mode(main, mode: str, log_dir: str):
+    """Install the logging setup for a benchmark mode"""
+    if mode == "sync":
+        # The original setup: synchronous file + console handlers, two INFO lines per message
+        main.stop_logging()
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=[logging.FileHandler(os.path.join(log_dir, 'sync.log')), logging.StreamHandler()],
+            force=True
+        )
+        main.LOG_SAMPLE_RATE = 1
+    elif mode == "queue":
+        main.configure_logging('queue.log')
+        main.LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '100'))
+    elif mode == "disabled":
+        main.stop_logging()
+        logging.basicConfig(level=logging.CRITICAL, handlers=[logging.NullHandler()], force=True)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+def run_mode(main, mode: str, messages: int, log_dir: str) -> dict:
+    configure_mode(main, mode, log_dir)
+    message_types = list(main.simulator.message_generators)
+    started = time.perf_counter()
+    for i in range(messages):
+        main.simulator.emit_message(message_types[i % len(message_types)])
+    elapsed = time.perf_counter() - started
+    # Time to flush anything still queued for the listener thread
+    drain_started = time.perf_counter()
+    main.stop_logging()
+    drain = time.perf_counter() - drain_started
+    return {
+        "messages": messages,
+        "seconds": round(elapsed, 4),
+        "messages_per_second": round(messages / elapsed, 1),
+        "drain_seconds": round(drain, 4)
+    }
+
+def run_isolated(mode: str, messages: int, log_dir: str) -> dict:
+    """Time one mode with a freshly imported simulator; runs in its own process"""
+    # Console handlers write to stderr; keep them from flooding the terminal
+    sys.stderr = open(os.devnull, "w")
+    return run_mode(load_simulator(log_dir), mode, messages, log_dir)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark simulator throughput with logging enabled")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--mode", choices=["sync", "queue", "disabled"], action="append")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as log_dir:
+        for mode in args.mode or ["sync", "queue", "disabled"]:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[mode] = pool.submit(run_isolated, mode, args.messages, log_dir).result()
+            print(f"{mode}: {results[mode]['messages_per_second']} msg/s "
+                  f"(drain {results[mode]['drain_seconds']}s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
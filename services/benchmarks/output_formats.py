@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Output format benchmark for the hospital data generator
+Compares write time, file size and reload time for CSV, JSON Lines and Parquet
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Typed reload for text formats, so every format is reloaded into the same dtypes
+DATE_COLUMNS = {
+    'patients': ['dob', 'admission_date', 'discharge_date'],
+    'lab_tests': ['test_date']
+}
+
+def load_generator():
+    sys.path.insert(0, os.path.join(SERVICES_DIR, "data-generator"))
+    import main
+    return main
+
+def generate_tables(main, patients: int, seed: int) -> dict:
+    """Generate the benchmark tables once, in memory, so only serialization is timed"""
+    main.PATIENT_COUNT = patients
+    generator = main.HospitalDataGenerator(seed=seed, workers=1)
+    generator.generate_departments()
+    generator.generate_doctors()
+    return {
+        'patients': list(generator.iter_patient_chunks()),
+        'lab_tests': list(generator.iter_lab_test_chunks())
+    }
+
+def reload_table(path: str, fmt: str, table: str) -> pd.DataFrame:
+    dates = DATE_COLUMNS.get(table, [])
+    if fmt == 'csv':
+        return pd.read_csv(path, parse_dates=dates)
+    if fmt == 'jsonl':
+        frame = pd.read_json(path, lines=True, convert_dates=False)
+        for column in dates:
+            frame[column] = pd.to_datetime(frame[column])
+        return frame
+    return pd.read_parquet(path)
+
+def benchmark_format(main, tables: dict, fmt: str, output_dir: str) -> dict:
+    results = {}
+    for table, chunks in tables.items():
+        started = time.perf_counter()
+        with main.ChunkedTableWriter(table, output_dir=output_dir, formats=[fmt]) as writer:
+            for chunk in chunks:
+                writer.write_chunk(chunk)
+        write_seconds = time.perf_counter() - started
+        path = writer.paths[fmt]
+
+        started = time.perf_counter()
+        frame = reload_table(path, fmt, table)
+        reload_seconds = time.perf_counter() - started
+
+        results[table] = {
+            "records": writer.count,
+            "write_seconds": round(write_seconds, 4),
+            "size_mb": round(os.path.getsize(path) / (1024 * 1024), 3),
+            "reload_seconds": round(reload_seconds, 4),
+            "reloaded_rows": len(frame)
+        }
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compare generator output formats")
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], action="append")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    main = load_generator()
+    logging.getLogger(main.__name__).setLevel(logging.WARNING)
+    tables = generate_tables(main, args.patients, args.seed)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for fmt in args.format or ["csv", "jsonl", "parquet"]:
+            results[fmt] = benchmark_format(main, tables, fmt, output_dir)
+            for table, result in results[fmt].items():
+                print(f"{fmt:8s} {table:10s} write {result['write_seconds']:.3f}s  "
+                      f"size {result['size_mb']:.2f} MB  reload {result['reload_seconds']:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
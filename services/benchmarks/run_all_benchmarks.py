@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the HL7 simulator, analytics engine and data generator
+Runs every benchmark in-process against local stand-ins (no Redis, IRIS or
+network needed), writes the results as JSON and optionally compares them
+with a previous run to flag performance regressions
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import SERVICES_DIR, load_service, redis_stand_in
+
+# Benchmark name -> (function, description); functions take the parsed args
+# and return {case: [(seconds, operations) per round]}
+BENCHMARKS = {}
+
+def benchmark(name: str, description: str):
+    def register(fn):
+        BENCHMARKS[name] = (fn, description)
+        return fn
+    return register
+
+def time_rounds(fn, operations: int, repeat: int, setup=None) -> list:
+    """Time repeat rounds of fn(), each performing the given number of operations"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started, operations))
+    return samples
+
+def summarize(samples: list) -> dict:
+    """Per-operation latency statistics and throughput over all rounds"""
+    per_op = [seconds / operations for seconds, operations in samples]
+    median = statistics.median(per_op)
+    return {
+        "rounds": len(samples),
+        "operations_per_round": samples[0][1],
+        "min_seconds": min(per_op),
+        "median_seconds": median,
+        "mean_seconds": statistics.fmean(per_op),
+        "stdev_seconds": statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+        "ops_per_second": round(1 / median, 1) if median > 0 else None
+    }
+
+# Service modules, loaded once with benchmark-friendly settings
+
+def load_simulator():
+    module = load_service("hl7-simulator", "hl7_simulator_main")
+    if not module.simulator.is_ready:
+        module.simulator.initialize_data()
+    return module
+
+def load_analytics():
+    return load_service("analytics", "analytics_main")
+
+def load_generator():
+    return load_service("data-generator", "data_generator_main")
+
+# HL7 simulator
+
+@benchmark("hl7_generation", "HL7 message generation per message type (msgs/s)")
+def bench_hl7_generation(args) -> dict:
+    simulator = load_simulator().simulator
+    results = {}
+    for msg_type, generate in simulator.message_generators.items():
+        def run():
+            for _ in range(args.messages):
+                generate()
+        results[msg_type] = time_rounds(run, args.messages, args.repeat)
+
+    # The configured traffic mix, so payload sizes follow the weighted type distribution
+    message_types = simulator.choose_message_types(args.messages)
+    def run_mix():
+        for msg_type in message_types:
+            simulator.message_generators[msg_type]()
+    results["mix"] = time_rounds(run_mix, args.messages, args.repeat)
+    return results
+
+@benchmark("queue_write", "Serialize and push mixed-type messages to the Redis queue stand-in (msgs/s)")
+def bench_queue_write(args) -> dict:
+    module = load_simulator()
+    simulator = module.simulator
+    messages = [(simulator.message_generators[msg_type](), msg_type)
+                for msg_type in simulator.choose_message_types(100)]
+
+    def setup():
+        module._redis_client = module.ResilientRedis(client=redis_stand_in()[0])
+
+    def run():
+        for i in range(args.messages):
+            simulator.send_to_redis(*messages[i % len(messages)])
+
+    return {"send_to_redis": time_rounds(run, args.messages, args.repeat, setup)}
+
+# Analytics engine
+
+@benchmark("analytics_query", "AnalyticsEngine.execute_query latency, uncached and cached")
+def bench_analytics_query(args) -> dict:
+    engine = load_analytics().analytics_engine
+    query_types = ["hospital_kpis", "department_performance", "patient_flow",
+                   "revenue_analysis", "staff_utilization", "predictive_analytics"]
+    results = {}
+    for query_type in query_types:
+        def uncached():
+            for _ in range(args.queries):
+                engine.caches.clear()
+                engine.execute_query(query_type)
+
+        def cached():
+            for _ in range(args.queries):
+                engine.execute_query(query_type)
+
+        results[f"{query_type}:uncached"] = time_rounds(uncached, args.queries, args.repeat)
+        engine.caches.clear()
+        engine.execute_query(query_type)
+        results[f"{query_type}:cached"] = time_rounds(cached, args.queries, args.repeat)
+    return results
+
+@benchmark("analytics_dataset", "Data-backed analytics: generated files loaded (rows/s) and KPI query latency")
+def bench_analytics_dataset(args) -> dict:
+    analytics = load_analytics()
+    main = load_generator()
+    generator = main.HospitalDataGenerator(seed=42, workers=1)
+    generator.generate_departments()
+    generator.generate_doctors()
+    data_dir = tempfile.mkdtemp(prefix="benchmark-data-")
+    rows = sum([
+        generator.write_table('departments', [generator.departments], data_dir),
+        generator.write_table('doctors', [generator.doctors], data_dir),
+        generator.write_table('patients', generator.iter_patient_chunks(count=args.patients), data_dir),
+        generator.write_table('appointments', generator.iter_appointment_chunks(count=args.rows), data_dir),
+        generator.write_table('lab_tests', generator.iter_lab_test_chunks(count=args.rows), data_dir)
+    ])
+
+    results = {"load": time_rounds(lambda: analytics.HospitalDataset(data_dir).refresh(), rows, args.repeat)}
+    dataset = analytics.HospitalDataset(data_dir)
+    dataset.refresh()
+    for query_type in dataset.QUERIES:
+        def run():
+            for _ in range(args.queries):
+                dataset.query(query_type, {})
+        results[query_type] = time_rounds(run, args.queries, args.repeat)
+    return results
+
+# Data generator
+
+@benchmark("data_generation", "Data generator rows/s per table (single worker)")
+def bench_data_generation(args) -> dict:
+    main = load_generator()
+    main.PATIENT_COUNT = args.patients
+    generator = main.HospitalDataGenerator(seed=42, workers=1)
+    generator.generate_departments()
+    generator.generate_doctors()
+
+    results = {"patients": time_rounds(generator.generate_patients, args.patients, args.repeat)}
+    for table, rows, iter_chunks in (
+        ("appointments", args.rows, generator.iter_appointment_chunks),
+        ("lab_tests", args.rows, generator.iter_lab_test_chunks),
+    ):
+        def run():
+            for _ in iter_chunks(count=rows):
+                pass
+        results[table] = time_rounds(run, rows, args.repeat)
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICES_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Cases whose median latency grew by more than threshold relative to the baseline"""
+    regressions = []
+    for name, cases in results["benchmarks"].items():
+        for case, stats in cases.items():
+            previous = baseline.get("benchmarks", {}).get(name, {}).get(case)
+            if not previous or not previous.get("median_seconds"):
+                continue
+            ratio = stats["median_seconds"] / previous["median_seconds"]
+            stats["baseline_ratio"] = round(ratio, 3)
+            if ratio > 1 + threshold:
+                regressions.append({"benchmark": name, "case": case, "ratio": round(ratio, 3)})
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run the service benchmark suite")
+    parser.add_argument("--benchmark", choices=sorted(BENCHMARKS), action="append", help="Benchmark(s) to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case")
+    parser.add_argument("--messages", type=int, default=2000, help="HL7 messages per round")
+    parser.add_argument("--queries", type=int, default=200, help="Analytics queries per round")
+    parser.add_argument("--patients", type=int, default=2000, help="Patients per round")
+    parser.add_argument("--rows", type=int, default=100000, help="Appointment/lab test rows per round")
+    parser.add_argument("--output", default="benchmark_results.json", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed median slowdown before flagging")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero when a regression is found")
+    args = parser.parse_args()
+
+    # Keep the services' own logs and simulated IRIS latency out of the measurements
+    log_dir = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ.setdefault("LOG_DIR", log_dir)
+    os.environ["IRIS_LATENCY"] = "0"
+    logging.disable(logging.INFO)
+
+    results = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "redis": redis_stand_in()[1],
+            "parameters": {key: value for key, value in vars(args).items()
+                           if key in ("repeat", "messages", "queries", "patients", "rows")}
+        },
+        "benchmarks": {}
+    }
+
+    for name in args.benchmark or list(BENCHMARKS):
+        fn, description = BENCHMARKS[name]
+        print(f"== {name}: {description}")
+        samples = fn(args)
+        results["benchmarks"][name] = {case: summarize(case_samples) for case, case_samples in samples.items()}
+        for case, stats in results["benchmarks"][name].items():
+            print(f"  {case:40s} median {stats['median_seconds'] * 1e6:10.1f} us  {stats['ops_per_second']:>12,.1f} ops/s")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['benchmark']}/{regression['case']}: {regression['ratio']}x baseline median")
+        if not regressions:
+            print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the analytics and HL7 simulator services
+Measures module import time, time until /health answers and time until /ready
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Service name -> (directory, readiness path or None)
+SERVICES = {
+    "analytics": ("analytics", None),
+    "hl7-simulator": ("hl7-simulator", "/ready"),
+}
+
+def free_port() -> int:
+    """Find a free local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def service_env(log_dir: str) -> dict:
+    env = dict(os.environ)
+    env["LOG_DIR"] = log_dir
+    return env
+
+def measure_import(service_dir: str, log_dir: str) -> float:
+    """Measure the time to import main.py in a fresh interpreter"""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], cwd=service_dir, env=service_env(log_dir), stderr=subprocess.DEVNULL
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+def wait_for(url: str, deadline: float) -> bool:
+    """Poll a URL until it returns HTTP 200 or the deadline passes"""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return False
+
+def measure_server(service_dir: str, ready_path, log_dir: str, timeout: float) -> dict:
+    """Start uvicorn and measure time to first healthy and ready response"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=service_dir, env=service_env(log_dir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + timeout
+        base_url = f"http://127.0.0.1:{port}"
+        result = {"health_seconds": None, "ready_seconds": None}
+        if wait_for(f"{base_url}/health", deadline):
+            result["health_seconds"] = time.perf_counter() - started
+            if ready_path is None:
+                result["ready_seconds"] = result["health_seconds"]
+            elif wait_for(f"{base_url}{ready_path}", deadline):
+                result["ready_seconds"] = time.perf_counter() - started
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def summarize(values: list) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"min": None, "median": None, "max": None}
+    return {
+        "min": round(min(values), 4),
+        "median": round(statistics.median(values), 4),
+        "max": round(max(values), 4)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per service")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for a server")
+    parser.add_argument("--service", choices=sorted(SERVICES), action="append", help="Service(s) to benchmark")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for name in args.service or sorted(SERVICES):
+            directory, ready_path = SERVICES[name]
+            service_dir = os.path.join(SERVICES_DIR, directory)
+            imports, healths, readies = [], [], []
+            for _ in range(args.runs):
+                imports.append(measure_import(service_dir, log_dir))
+                server = measure_server(service_dir, ready_path, log_dir, args.timeout)
+                healths.append(server["health_seconds"])
+                readies.append(server["ready_seconds"])
+            results[name] = {
+                "runs": args.runs,
+                "import_seconds": summarize(imports),
+                "health_seconds": summarize(healths),
+                "ready_seconds": summarize(readies)
+            }
+            print(f"{name}: import {results[name]['import_seconds']['median']}s, "
+                  f"healthy {results[name]['health_seconds']['median']}s, "
+                  f"ready {results[name]['ready_seconds']['median']}s (median of {args.runs})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Hospital Data Bulk Loader
+Streams generated tables into IRIS (or a local SQLite stand-in) with batched inserts
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', '/app/data')
+LOAD_BACKEND = os.getenv('LOAD_BACKEND', 'none')  # 'none', 'sqlite' or 'iris'
+LOAD_BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE', '1000'))
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '4'))
+LOAD_SCHEMA = os.getenv('LOAD_SCHEMA', 'HospitalDemo')
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(OUTPUT_DIR, 'hospital.db'))
+IRIS_HOST = os.getenv('IRIS_HOST', 'iris')
+IRIS_PORT = int(os.getenv('IRIS_PORT', '1972'))
+IRIS_NAMESPACE = os.getenv('IRIS_NAMESPACE', 'USER')
+IRIS_USERNAME = os.getenv('IRIS_USERNAME', 'SuperUser')
+IRIS_PASSWORD = os.getenv('IRIS_PASSWORD', 'SYS')
+
+TABLES = ['departments', 'doctors', 'patients', 'appointments', 'lab_tests', 'medications']
+PROGRESS_TABLE = 'load_progress'
+SOURCE_FORMATS = ('csv', 'jsonl', 'parquet')  # in order of preference when a table has several
+
+# Column types for CREATE TABLE; anything not listed is VARCHAR
+COLUMN_TYPES = {
+    'beds': 'INTEGER',
+    'experience_years': 'INTEGER',
+    'duration_minutes': 'INTEGER',
+    'license': 'BIGINT',
+    'insurance_number': 'BIGINT',
+    'result_value': 'DOUBLE',
+    'dob': 'DATE',
+    'admission_date': 'DATE',
+    'discharge_date': 'DATE',
+    'appointment_date': 'DATE',
+    'test_date': 'DATE'
+}
+
+class SQLiteBackend:
+    """Local SQLite stand-in for IRIS, for offline testing"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def table_name(self, table: str) -> str:
+        return table
+
+    def column_type(self, column: str) -> str:
+        sqlite_types = {'INTEGER': 'INTEGER', 'BIGINT': 'INTEGER', 'DOUBLE': 'REAL'}
+        return sqlite_types.get(COLUMN_TYPES.get(column), 'TEXT')
+
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+class IrisBackend:
+    """InterSystems IRIS through its DB-API driver"""
+
+    name = 'iris'
+
+    def connect(self):
+        try:
+            import iris
+        except ImportError as e:
+            raise RuntimeError("IRIS loading requires intersystems-irispython (pip install intersystems-irispython)") from e
+        return iris.connect(IRIS_HOST, IRIS_PORT, IRIS_NAMESPACE, IRIS_USERNAME, IRIS_PASSWORD)
+
+    def table_name(self, table: str) -> str:
+        return f"{LOAD_SCHEMA}.{table}"
+
+    def column_type(self, column: str) -> str:
+        return COLUMN_TYPES.get(column, 'VARCHAR(1000)')
+
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute(
+            "SELECT 1 FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?",
+            (LOAD_SCHEMA, table)
+        )
+        return cursor.fetchone() is not None
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'iris': IrisBackend
+}
+
+def iter_source_rows(data_dir: str, table: str) -> Iterator[Dict]:
+    """Stream rows from the table's CSV file, or its JSON Lines or Parquet file if there is no CSV"""
+    csv_path = os.path.join(data_dir, f"{table}.csv")
+    jsonl_path = os.path.join(data_dir, f"{table}.jsonl")
+    parquet_path = os.path.join(data_dir, f"{table}.parquet")
+    if os.path.exists(csv_path):
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                yield {key: (value if value != '' else None) for key, value in row.items()}
+    elif os.path.exists(jsonl_path):
+        with open(jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif os.path.exists(parquet_path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(f"Reading {parquet_path} requires pyarrow (pip install pyarrow)") from e
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=LOAD_BATCH_SIZE):
+            yield from batch.to_pylist()
+    else:
+        raise FileNotFoundError(f"No CSV, JSON Lines or Parquet file for {table} in {data_dir}")
+
+def source_path(data_dir: str, table: str) -> Optional[str]:
+    """The file iter_source_rows reads for a table, or None if the table was not generated"""
+    for extension in SOURCE_FORMATS:
+        path = os.path.join(data_dir, f"{table}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def source_fingerprint(path: str) -> str:
+    """Identify the source file version so a regenerated file invalidates its progress"""
+    stat = os.stat(path)
+    return f"{os.path.splitext(path)[1][1:]}:{stat.st_size}:{int(stat.st_mtime)}"
+
+class LoadCheckpoint:
+    """Rows committed per source file, kept in a progress table of the target database
+
+    Each batch updates its progress row in the same transaction as the batch insert,
+    so a crash can never leave rows committed but uncounted and a resumed load never
+    inserts a batch twice.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.table = backend.table_name(PROGRESS_TABLE)
+
+    def ensure_table(self, cursor):
+        if not self.backend.table_exists(cursor, PROGRESS_TABLE):
+            cursor.execute(
+                f"CREATE TABLE {self.table} (source VARCHAR(500) PRIMARY KEY, fingerprint VARCHAR(100), "
+                f"rows_done BIGINT, complete INTEGER)"
+            )
+
+    def read(self, cursor, source: str, fingerprint: str) -> tuple:
+        """(rows committed, complete) for the source, (0, False) if it changed since"""
+        cursor.execute(f"SELECT fingerprint, rows_done, complete FROM {self.table} WHERE source = ?", (source,))
+        entry = cursor.fetchone()
+        if entry and entry[0] == fingerprint:
+            return int(entry[1]), bool(entry[2])
+        return 0, False
+
+    def update(self, cursor, source: str, fingerprint: str, rows: int, complete: bool = False):
+        """Record progress; the caller commits it together with the rows it counts"""
+        cursor.execute(f"DELETE FROM {self.table} WHERE source = ?", (source,))
+        cursor.execute(
+            f"INSERT INTO {self.table} (source, fingerprint, rows_done, complete) VALUES (?, ?, ?, ?)",
+            (source, fingerprint, rows, int(complete))
+        )
+
+    def clear(self):
+        connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            if self.backend.table_exists(cursor, PROGRESS_TABLE):
+                cursor.execute(f"DELETE FROM {self.table}")
+                connection.commit()
+        finally:
+            connection.close()
+
+class BulkLoader:
+    """Loads generated tables in parallel, one connection and one thread per table"""
+
+    def __init__(self, backend, data_dir: str = OUTPUT_DIR, batch_size: int = LOAD_BATCH_SIZE,
+                 workers: int = LOAD_WORKERS, resume: bool = True, append: bool = False):
+        self.backend = backend
+        self.data_dir = data_dir
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.append = append
+        self.progress_lock = threading.Lock()  # table workers race to create the progress table
+        self.checkpoint = LoadCheckpoint(backend)
+        if not resume:
+            self.checkpoint.clear()
+
+    def create_table(self, cursor, table: str, columns: List[str], fresh: bool):
+        """Create the target table; a fresh load drops and recreates an existing one unless appending"""
+        if self.backend.table_exists(cursor, table):
+            if not fresh or self.append:
+                return
+            cursor.execute(f"DROP TABLE {self.backend.table_name(table)}")
+        column_defs = ', '.join(f'"{column}" {self.backend.column_type(column)}' for column in columns)
+        cursor.execute(f"CREATE TABLE {self.backend.table_name(table)} ({column_defs})")
+
+    def load_table(self, table: str) -> Dict:
+        """Load one table in batches, committing each batch together with its progress"""
+        path = source_path(self.data_dir, table)
+        if path is None:
+            logger.warning(f"No generated data for {table}, skipping")
+            return {'table': table, 'rows': 0, 'skipped_rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+        source, fingerprint = os.path.abspath(path), source_fingerprint(path)
+
+        rows_loaded = 0
+        started = time.perf_counter()
+        connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            with self.progress_lock:
+                self.checkpoint.ensure_table(cursor)
+                connection.commit()
+            skip, complete = self.checkpoint.read(cursor, source, fingerprint)
+            if complete:
+                logger.info(f"{table} already loaded ({skip:,} rows), skipping")
+                return {'table': table, 'rows': 0, 'skipped_rows': skip, 'seconds': 0.0, 'rows_per_second': 0.0}
+
+            rows = iter_source_rows(self.data_dir, table)
+            batch, columns, insert_sql = [], None, None
+            for position, row in enumerate(rows):
+                if columns is None:
+                    columns = list(row.keys())
+                    self.create_table(cursor, table, columns, fresh=skip == 0)
+                    connection.commit()
+                    column_list = ', '.join(f'"{column}"' for column in columns)
+                    placeholders = ', '.join('?' for _ in columns)
+                    insert_sql = f"INSERT INTO {self.backend.table_name(table)} ({column_list}) VALUES ({placeholders})"
+                if position < skip:
+                    continue
+                batch.append(tuple(row.get(column) for column in columns))
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(insert_sql, batch)
+                    rows_loaded += len(batch)
+                    self.checkpoint.update(cursor, source, fingerprint, skip + rows_loaded)
+                    connection.commit()
+                    batch = []
+            if batch:
+                cursor.executemany(insert_sql, batch)
+                rows_loaded += len(batch)
+            self.checkpoint.update(cursor, source, fingerprint, skip + rows_loaded, complete=True)
+            connection.commit()
+        finally:
+            connection.close()
+
+        elapsed = time.perf_counter() - started
+        result = {
+            'table': table,
+            'rows': rows_loaded,
+            'skipped_rows': skip,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows_loaded / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Loaded {rows_loaded:,} rows into {self.backend.table_name(table)} "
+                    f"({result['rows_per_second']:,.0f} rows/s, {skip:,} already loaded)")
+        return result
+
+    def load_all(self, tables: List[str] = None) -> Dict:
+        """Load all tables in parallel and return a rows/second report"""
+        tables = tables or TABLES
+        logger.info(f"Loading {len(tables)} tables into {self.backend.name} "
+                    f"(batch size {self.batch_size}, {self.workers} workers)")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tables))) as executor:
+            results = list(executor.map(self.load_table, tables))
+        elapsed = time.perf_counter() - started
+        total_rows = sum(result['rows'] for result in results)
+        return {
+            'backend': self.backend.name,
+            'batch_size': self.batch_size,
+            'workers': self.workers,
+            'tables': results,
+            'total_rows': total_rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+def print_report(report: Dict):
+    print("\n" + "=" * 50)
+    print(f"LOAD REPORT ({report['backend']})")
+    print("=" * 50)
+    for result in report['tables']:
+        print(f"  {result['table']}: {result['rows']:,} rows in {result['seconds']}s "
+              f"({result['rows_per_second']:,.0f} rows/s)")
+    print(f"Total: {report['total_rows']:,} rows in {report['seconds']}s ({report['rows_per_second']:,.0f} rows/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load generated hospital data")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=LOAD_BACKEND if LOAD_BACKEND in BACKENDS else 'sqlite')
+    parser.add_argument('--data-dir', default=OUTPUT_DIR)
+    parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=LOAD_WORKERS)
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and load from the start")
+    parser.add_argument('--table', choices=TABLES, action='append')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    backend = BACKENDS[args.backend]()
+    loader = BulkLoader(backend, args.data_dir, args.batch_size, args.workers, resume=not args.restart)
+    print_report(loader.load_all(args.table))
+
+if __name__ == "__main__":
+    main()
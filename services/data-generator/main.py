@@ -9,12 +9,19 @@ import json
 import logging
 import os
 import random
-from datetime import datetime, timedelta
-from typing import Dict, List
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
 from faker import Faker
 
+from loader import BACKENDS, LOAD_BACKEND, BulkLoader, iter_source_rows, print_report
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,17 +33,432 @@ logger = logging.getLogger(__name__)
 PATIENT_COUNT = int(os.getenv('PATIENT_COUNT', '1000'))
 DOCTOR_COUNT = int(os.getenv('DOCTOR_COUNT', '20'))
 DEPARTMENT_COUNT = int(os.getenv('DEPARTMENT_COUNT', '10'))
+APPOINTMENT_COUNT = int(os.getenv('APPOINTMENT_COUNT', '500'))
+LAB_TEST_COUNT = int(os.getenv('LAB_TEST_COUNT', '2000'))
+NOTE_POOL_SIZE = int(os.getenv('NOTE_POOL_SIZE', '1000'))
+ZIPF_EXPONENT = float(os.getenv('ZIPF_EXPONENT', '1.0'))  # 0 samples foreign keys uniformly
+GENERATION_MODE = os.getenv('GENERATION_MODE', 'full')  # 'full' or 'incremental'
+DELTA_DAYS = int(os.getenv('DELTA_DAYS', '1'))
+DELTA_ADMISSIONS = int(os.getenv('DELTA_ADMISSIONS', '20'))
+DELTA_APPOINTMENTS = int(os.getenv('DELTA_APPOINTMENTS', '100'))
+DELTA_LAB_TESTS = int(os.getenv('DELTA_LAB_TESTS', '500'))
+SUMMARY_FILE = 'generation_summary.json'
+GENERATOR_SEED = int(os.getenv('GENERATOR_SEED')) if os.getenv('GENERATOR_SEED') else None
+GENERATOR_WORKERS = int(os.getenv('GENERATOR_WORKERS', str(os.cpu_count() or 1)))
+GENERATOR_CHUNK_SIZE = int(os.getenv('GENERATOR_CHUNK_SIZE', '10000'))
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', '/app/data')
+SUPPORTED_FORMATS = ('csv', 'jsonl', 'parquet')
+OUTPUT_FORMATS = [fmt.strip() for fmt in os.getenv('OUTPUT_FORMATS', 'csv,jsonl').split(',') if fmt.strip()]
+
+# Parquet column types: dictionary-encoded categoricals and typed dates, per table
+PARQUET_CATEGORICAL_COLUMNS = {
+    'departments': ['location'],
+    'doctors': ['specialty', 'department', 'education', 'certification'],
+    'patients': ['gender', 'insurance_type', 'status', 'primary_diagnosis'],
+    'appointments': ['doctor_id', 'department_id', 'appointment_type', 'status'],
+    'lab_tests': ['doctor_id', 'test_code', 'test_name', 'normal_range', 'units', 'status'],
+    'medications': ['category', 'dosage']
+}
+PARQUET_DATE_COLUMNS = {
+    'patients': ['dob', 'admission_date', 'discharge_date'],
+    'appointments': ['appointment_date'],
+    'lab_tests': ['test_date']
+}
 
 # Initialize Faker with Vietnamese locale
 fake = Faker('vi_VN')
 
+def chunk_seed(seed: int, chunk_index: int, watermark: int = 0) -> int:
+    """Derive an independent seed for one chunk, so output doesn't depend on worker count
+
+    Deltas pass the ID watermark they start from, so under a fixed GENERATOR_SEED their
+    chunks don't replay the base run's streams.
+    """
+    if watermark:
+        return int(np.random.SeedSequence([seed, watermark, chunk_index]).generate_state(1)[0])
+    return (seed * 1000003 + chunk_index) & 0xFFFFFFFF
+
+def build_patient(index: int, chunk_fake: Faker, rng: random.Random, admission_days: Optional[int] = None) -> Dict:
+    """Build one patient record from the given Faker and random generator
+    
+    With admission_days the patient is a new, still active admission within that many days.
+    """
+    # Generate realistic Vietnamese names and addresses
+    name = chunk_fake.name()
+    dob = chunk_fake.date_of_birth(minimum_age=0, maximum_age=100)
+    gender = rng.choice(['M', 'F'])
+    
+    # Generate Vietnamese address
+    address_parts = [
+        chunk_fake.street_address(),
+        chunk_fake.city(),
+        chunk_fake.state(),
+        'Vietnam'
+    ]
+    address = ', '.join(address_parts)
+    
+    if admission_days is None:
+        admission = chunk_fake.date_between(start_date='-2y', end_date='today')
+        status = rng.choice(['Active', 'Discharged', 'Transferred'])
+    else:
+        admission = chunk_fake.date_between(start_date=f'-{admission_days}d', end_date='today')
+        status = 'Active'
+    
+    # Only patients who have left have a discharge date, never before their admission
+    discharge = chunk_fake.date_between(start_date=admission, end_date='today') if status != 'Active' else None
+    
+    return {
+        'id': f'P{index:06d}',
+        'name': name,
+        'dob': dob.strftime('%Y-%m-%d'),
+        'gender': gender,
+        'address': address,
+        'phone': chunk_fake.phone_number(),
+        'email': chunk_fake.email(),
+        'insurance_type': rng.choice(['A', 'B', 'C', 'D']),
+        'insurance_number': chunk_fake.random_number(digits=10),
+        'emergency_contact': chunk_fake.name(),
+        'emergency_phone': chunk_fake.phone_number(),
+        'admission_date': admission.strftime('%Y-%m-%d'),
+        'discharge_date': discharge.strftime('%Y-%m-%d') if discharge else None,
+        'status': status,
+        'primary_diagnosis': rng.choice([
+            'Hypertension', 'Diabetes', 'Pneumonia', 'Fracture', 'Heart Disease',
+            'Stroke', 'Cancer', 'Infection', 'Trauma', 'Respiratory Disease'
+        ])
+    }
+
+# Faker used for chunked generation, kept apart from the shared instance
+_chunk_fake = None
+
+def get_chunk_fake(seed) -> Faker:
+    """Get the process-local Faker for chunked generation, reseeded for this chunk"""
+    global _chunk_fake
+    if _chunk_fake is None:
+        _chunk_fake = Faker('vi_VN')
+    _chunk_fake.seed_instance(seed)
+    return _chunk_fake
+
+def generate_patient_chunk(seed: int, chunk_index: int, start: int, stop: int,
+                           admission_days: Optional[int] = None, watermark: int = 0) -> List[Dict]:
+    """Generate patients [start, stop) from the chunk's own seed (runs in a worker process)"""
+    seed_value = chunk_seed(seed, chunk_index, watermark)
+    chunk_fake = get_chunk_fake(seed_value)
+    rng = random.Random(seed_value)
+    return [build_patient(i, chunk_fake, rng, admission_days) for i in range(start, stop)]
+
+# Lab test catalogue with result distributions: (low, high, decimals)
+LAB_TEST_TYPES = [
+    {'code': 'CBC', 'name': 'Complete Blood Count', 'normal_range': '4.5-11.0', 'units': 'K/uL', 'result': (4.0, 12.0, 1)},
+    {'code': 'CHEM7', 'name': 'Basic Metabolic Panel', 'normal_range': '70-100', 'units': 'mg/dL', 'result': (0.1, 10.0, 2)},
+    {'code': 'LIPID', 'name': 'Lipid Panel', 'normal_range': '<200', 'units': 'mg/dL', 'result': (120, 300, 1)},
+    {'code': 'GLUCOSE', 'name': 'Blood Glucose', 'normal_range': '70-100', 'units': 'mg/dL', 'result': (60, 150, 1)},
+    {'code': 'BUN', 'name': 'Blood Urea Nitrogen', 'normal_range': '7-20', 'units': 'mg/dL', 'result': (0.1, 10.0, 2)},
+    {'code': 'CREATININE', 'name': 'Creatinine', 'normal_range': '0.6-1.2', 'units': 'mg/dL', 'result': (0.1, 10.0, 2)},
+    {'code': 'TSH', 'name': 'Thyroid Stimulating Hormone', 'normal_range': '0.4-4.0', 'units': 'mIU/L', 'result': (0.1, 10.0, 2)},
+    {'code': 'HBA1C', 'name': 'Hemoglobin A1C', 'normal_range': '<5.7', 'units': '%', 'result': (0.1, 10.0, 2)}
+]
+
+def table_rng(seed: int, table_id: int, chunk_index: int, watermark: int = 0) -> np.random.Generator:
+    """NumPy generator for one chunk of a column-wise table, independent of other chunks
+
+    A nonzero watermark (the first ID of a delta) starts a stream separate from the base run's.
+    """
+    return np.random.default_rng([seed, table_id, chunk_index] + ([watermark] if watermark else []))
+
+def format_ids(prefix: str, numbers: np.ndarray) -> np.ndarray:
+    """Format integer IDs as zero-padded strings (e.g. P000042)"""
+    return np.array([f'{prefix}{n:06d}' for n in numbers.tolist()])
+
+def note_pool(seed: int, max_nb_chars: int, size: int = NOTE_POOL_SIZE) -> np.ndarray:
+    """Pre-generate a corpus of free-text notes that rows sample from"""
+    pool_fake = get_chunk_fake(seed)
+    return np.array([pool_fake.text(max_nb_chars=max_nb_chars) for _ in range(size)])
+
+def hash_uniform(ids: np.ndarray, seed: int) -> np.ndarray:
+    """A fixed value in [0, 1) per integer ID, from a SplitMix64 hash of (seed, id)"""
+    x = ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(float) / float(1 << 53)
+
+def zipf_weights(ids: np.ndarray, exponent: float, seed: int) -> np.ndarray:
+    """Zipf popularity weights for integer IDs, with the popular items spread randomly over the IDs
+
+    Each ID's rank comes from a hash of the seed and the ID, not from a shuffle of the
+    whole population, so adding items (e.g. a delta run's patients) keeps the
+    popularity order of the existing ones.
+    """
+    ranks = hash_uniform(ids, seed) * len(ids)
+    return 1.0 / (ranks + 1.0) ** exponent
+
+class WeightedSampler:
+    """Vectorized sampling of positions from fixed weights by lookup in a precomputed cumulative table"""
+
+    def __init__(self, weights: np.ndarray):
+        cumulative = np.cumsum(weights, dtype=float)
+        self.cdf = cumulative / cumulative[-1]
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        positions = np.searchsorted(self.cdf, rng.random(size), side='right')
+        return np.minimum(positions, len(self.cdf) - 1)
+
+class ReferenceIndex:
+    """Foreign-key indexes for the column-wise tables
+    
+    Keeps doctors by department, patients by status and each patient's admission window
+    (admission date to discharge date, or today while still admitted), so appointments and
+    lab tests reference consistent rows with Zipf-skewed popularity.
+    """
+
+    def __init__(self, seed: int, exponent: float = ZIPF_EXPONENT):
+        self.seed = seed
+        self.exponent = exponent
+        self.today = np.datetime64(datetime.now().date(), 'D')
+        self.department_ids = np.array([], dtype=str)
+        self.doctor_ids = np.array([], dtype=str)
+        self.doctors_by_department: Dict[str, np.ndarray] = {}
+        self.patient_chunks = []
+        self.patients = None
+        self.samplers = {}
+
+    def weights(self, ids: np.ndarray) -> np.ndarray:
+        if self.exponent <= 0:
+            return np.ones(len(ids))
+        return zipf_weights(ids, self.exponent, self.seed)
+
+    def set_doctors(self, departments: List[Dict], doctors: List[Dict]):
+        """Index doctors by the department they belong to"""
+        self.doctor_ids = np.array([doctor['id'] for doctor in doctors])
+        doctor_departments = np.array([doctor['department'] for doctor in doctors])
+        self.doctors_by_department = {
+            department['id']: np.flatnonzero(doctor_departments == department['id'])
+            for department in departments
+        }
+        # Only departments that have doctors can take appointments
+        self.department_ids = np.array([dept for dept, members in self.doctors_by_department.items() if len(members)])
+        self.department_offsets = np.cumsum([0] + [len(self.doctors_by_department[dept]) for dept in self.department_ids])
+        self.doctors_in_department_order = np.concatenate(
+            [self.doctors_by_department[dept] for dept in self.department_ids]
+        ) if len(self.department_ids) else np.array([], dtype=int)
+        self.department_sampler = WeightedSampler(self.weights(np.arange(len(self.department_ids))))
+        self.doctor_sampler = WeightedSampler(self.weights(np.arange(len(self.doctor_ids))))
+
+    def add_patients(self, records: List[Dict]):
+        """Index a chunk of patient records as they are generated or read back"""
+        if not records:
+            return
+        self.patient_chunks.append((
+            np.array([int(record['id'][1:]) for record in records]),
+            np.array([record['admission_date'] for record in records], dtype='datetime64[D]'),
+            np.array([record['discharge_date'] or None for record in records], dtype='datetime64[D]'),
+            np.array([record['status'] for record in records])
+        ))
+        self.patients = None
+        self.samplers = {}
+
+    def patient_columns(self) -> tuple:
+        """Patient numbers, window starts, window ends and statuses as aligned arrays"""
+        if self.patients is None:
+            if not self.patient_chunks:
+                raise ValueError("No patients indexed; generate or load patients first")
+            numbers, admissions, discharges, statuses = (np.concatenate(column) for column in zip(*self.patient_chunks))
+            self.patient_chunks = [(numbers, admissions, discharges, statuses)]
+            ends = np.where(np.isnat(discharges), self.today, discharges)
+            self.patients = (numbers, admissions, ends, statuses)
+        return self.patients
+
+    @property
+    def patients_by_status(self) -> Dict[str, np.ndarray]:
+        statuses = self.patient_columns()[3]
+        return {status: np.flatnonzero(statuses == status) for status in np.unique(statuses)}
+
+    def patient_sampler(self, days_back: int, status: Optional[str] = None) -> tuple:
+        """Patients whose admission window overlaps the last days_back days (optionally with one status)"""
+        key = (days_back, status)
+        if key not in self.samplers:
+            numbers, _, ends, statuses = self.patient_columns()
+            eligible = ends >= self.today - days_back
+            if status is not None and (eligible & (statuses == status)).any():
+                eligible &= statuses == status
+            positions = np.flatnonzero(eligible) if eligible.any() else np.arange(len(numbers))
+            # Popularity is fixed per patient, so a patient is equally "hot" in every table
+            weights = self.weights(numbers)[positions]
+            self.samplers[key] = (positions, WeightedSampler(weights))
+        return self.samplers[key]
+
+    def sample_patients(self, rng: np.random.Generator, size: int, days_back: int,
+                        active: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sample patient positions; rows flagged in active reference currently admitted patients"""
+        positions, sampler = self.patient_sampler(days_back)
+        sampled = positions[sampler.sample(rng, size)]
+        if active is not None and active.any():
+            positions, sampler = self.patient_sampler(days_back, 'Active')
+            sampled[active] = positions[sampler.sample(rng, int(active.sum()))]
+        return sampled
+
+    def sample_dates(self, rng: np.random.Generator, patients: np.ndarray, days_back: int) -> np.ndarray:
+        """A date inside each patient's admission window, limited to the last days_back days"""
+        _, admissions, ends, _ = self.patient_columns()
+        starts = np.maximum(admissions[patients], self.today - days_back)
+        stops = np.maximum(ends[patients], starts)
+        offsets = (rng.random(len(patients)) * ((stops - starts).astype(int) + 1)).astype(int)
+        return np.datetime_as_string(starts + offsets, unit='D')
+
+    def patient_ids(self, patients: np.ndarray) -> np.ndarray:
+        return format_ids('P', self.patient_columns()[0][patients])
+
+    def sample_department_doctors(self, rng: np.random.Generator, size: int) -> tuple:
+        """Sample (doctor_id, department_id) pairs where the doctor belongs to the department"""
+        departments = self.department_sampler.sample(rng, size)
+        counts = np.diff(self.department_offsets)[departments]
+        members = self.department_offsets[departments] + (rng.random(size) * counts).astype(int)
+        doctors = self.doctors_in_department_order[members]
+        return self.doctor_ids[doctors], self.department_ids[departments]
+
+    def sample_doctors(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return self.doctor_ids[self.doctor_sampler.sample(rng, size)]
+
+def import_pyarrow():
+    """Import pyarrow on demand; it is only needed for Parquet output"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.parquet
+
+def build_parquet_schema(table: str, sample):
+    """Build a Parquet schema from a sample Arrow table, applying the table's column types"""
+    pa, _ = import_pyarrow()
+    categorical = set(PARQUET_CATEGORICAL_COLUMNS.get(table, []))
+    dates = set(PARQUET_DATE_COLUMNS.get(table, []))
+    fields = []
+    for field in sample.schema:
+        if field.name in dates:
+            field_type = pa.date32()
+        elif field.name in categorical:
+            field_type = pa.dictionary(pa.int32(), field.type if not pa.types.is_null(field.type) else pa.string())
+        elif pa.types.is_null(field.type):
+            field_type = pa.string()
+        else:
+            field_type = field.type
+        fields.append(pa.field(field.name, field_type))
+    return pa.schema(fields)
+
+class ChunkedTableWriter:
+    """Streams record chunks to CSV, JSON Lines and/or Parquet files without holding the table in memory"""
+
+    def __init__(self, table: str, output_dir: str = OUTPUT_DIR, formats: List[str] = None):
+        formats = formats or OUTPUT_FORMATS
+        unsupported = set(formats) - set(SUPPORTED_FORMATS)
+        if unsupported:
+            raise ValueError(f"Unsupported output formats: {sorted(unsupported)}")
+        
+        self.table = table
+        self.formats = list(formats)
+        self.paths = {fmt: os.path.join(output_dir, f"{table}.{fmt}") for fmt in self.formats}
+        self.csv_file = open(self.paths['csv'], 'w', encoding='utf-8', newline='') if 'csv' in self.paths else None
+        self.jsonl_file = open(self.paths['jsonl'], 'w', encoding='utf-8') if 'jsonl' in self.paths else None
+        self.csv_writer = None
+        self.csv_header_written = False
+        self.parquet_writer = None
+        self.parquet_schema = None
+        self.count = 0
+
+    def write_chunk(self, records):
+        """Write one chunk: a list of record dicts, or a dict of equal-length column arrays"""
+        if isinstance(records, dict):
+            self.write_columns(records)
+            return
+        if not records:
+            return
+        if self.csv_file is not None:
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=list(records[0].keys()))
+                self.csv_writer.writeheader()
+                self.csv_header_written = True
+            self.csv_writer.writerows(records)
+        if self.jsonl_file is not None:
+            self.jsonl_file.write(''.join(
+                json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records
+            ))
+        if 'parquet' in self.paths:
+            pa, _ = import_pyarrow()
+            self.write_parquet_chunk(pa.Table.from_pylist(records))
+        self.count += len(records)
+
+    def write_columns(self, columns: Dict[str, np.ndarray]):
+        """Write a column-wise chunk without building per-row dicts"""
+        size = len(next(iter(columns.values())))
+        if not size:
+            return
+        if self.csv_file is not None or self.jsonl_file is not None:
+            frame = pd.DataFrame(columns)
+            if self.csv_file is not None:
+                frame.to_csv(self.csv_file, header=not self.csv_header_written, index=False)
+                self.csv_header_written = True
+            if self.jsonl_file is not None:
+                lines = frame.to_json(orient='records', lines=True, force_ascii=False)
+                self.jsonl_file.write(lines if lines.endswith('\n') else lines + '\n')
+        if 'parquet' in self.paths:
+            pa, _ = import_pyarrow()
+            self.write_parquet_chunk(pa.table(columns))
+        self.count += size
+
+    def write_parquet_chunk(self, chunk):
+        """Append one Arrow table as a Parquet row group, typed by the schema taken from the first chunk"""
+        pa, pq = import_pyarrow()
+        if self.parquet_writer is None:
+            self.parquet_schema = build_parquet_schema(self.table, chunk)
+            self.parquet_writer = pq.ParquetWriter(self.paths['parquet'], self.parquet_schema, compression='snappy')
+        self.parquet_writer.write_table(chunk.select(self.parquet_schema.names).cast(self.parquet_schema))
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+        if self.jsonl_file is not None:
+            self.jsonl_file.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def iter_chunks(count: int, chunk_size: int) -> Iterator[range]:
+    """Split range(count) into consecutive ranges of at most chunk_size"""
+    for start in range(0, count, chunk_size):
+        yield range(start, min(start + chunk_size, count))
+
+def iter_bounded(executor: ProcessPoolExecutor, fn, arg_tuples: Iterable[tuple], max_in_flight: int) -> Iterator:
+    """Like executor.map, but submits lazily so at most max_in_flight results are held at once"""
+    pending = deque()
+    for args in arg_tuples:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
 class HospitalDataGenerator:
-    def __init__(self):
-        self.patients = []
+    def __init__(self, seed: Optional[int] = GENERATOR_SEED, workers: int = GENERATOR_WORKERS,
+                 chunk_size: int = GENERATOR_CHUNK_SIZE, formats: List[str] = None):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.formats = formats or OUTPUT_FORMATS
+        random.seed(self.seed)
+        fake.seed_instance(self.seed)
+        self.patient_count = 0
+        self.reference_index = ReferenceIndex(self.seed)
         self.doctors = []
         self.departments = []
-        self.appointments = []
-        self.lab_tests = []
         self.medications = []
         
     def generate_departments(self) -> List[Dict]:
@@ -86,135 +508,144 @@ class HospitalDataGenerator:
             doctors.append(doctor)
         
         self.doctors = doctors
+        self.reference_index.set_doctors(self.departments, doctors)
         logger.info(f"Generated {len(doctors)} doctors")
         return doctors
     
-    def generate_patients(self) -> List[Dict]:
-        """Generate patient data"""
+    def iter_patient_chunks(self, count: int = None, start_id: int = 0,
+                            admission_days: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Yield patient chunks in order as they are generated, with IDs starting at start_id"""
         logger.info("Generating patients...")
         
-        patients = []
-        for i in range(PATIENT_COUNT):
-            # Generate realistic Vietnamese names and addresses
-            name = fake.name()
-            dob = fake.date_of_birth(minimum_age=0, maximum_age=100)
-            gender = random.choice(['M', 'F'])
-            
-            # Generate Vietnamese address
-            address_parts = [
-                fake.street_address(),
-                fake.city(),
-                fake.state(),
-                'Vietnam'
-            ]
-            address = ', '.join(address_parts)
-            
-            patient = {
-                'id': f'P{i:06d}',
-                'name': name,
-                'dob': dob.strftime('%Y-%m-%d'),
-                'gender': gender,
-                'address': address,
-                'phone': fake.phone_number(),
-                'email': fake.email(),
-                'insurance_type': random.choice(['A', 'B', 'C', 'D']),
-                'insurance_number': fake.random_number(digits=10),
-                'emergency_contact': fake.name(),
-                'emergency_phone': fake.phone_number(),
-                'admission_date': fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d'),
-                'discharge_date': fake.date_between(start_date='-1y', end_date='today').strftime('%Y-%m-%d') if random.random() > 0.3 else None,
-                'status': random.choice(['Active', 'Discharged', 'Transferred']),
-                'primary_diagnosis': random.choice([
-                    'Hypertension', 'Diabetes', 'Pneumonia', 'Fracture', 'Heart Disease',
-                    'Stroke', 'Cancer', 'Infection', 'Trauma', 'Respiratory Disease'
-                ])
-            }
-            patients.append(patient)
+        count = PATIENT_COUNT if count is None else count
+        chunks = (
+            (self.seed, index, start_id + ids.start, start_id + ids.stop, admission_days, start_id)
+            for index, ids in enumerate(iter_chunks(count, self.chunk_size))
+        )
+        started = time.perf_counter()
+        self.patient_count = start_id
+        generated = 0
+        
+        def track(results: Iterable[List[Dict]]) -> Iterator[List[Dict]]:
+            nonlocal generated
+            for chunk_patients in results:
+                generated += len(chunk_patients)
+                self.patient_count += len(chunk_patients)
+                self.reference_index.add_patients(chunk_patients)
+                elapsed = time.perf_counter() - started
+                rate = generated / elapsed if elapsed > 0 else 0
+                logger.info(f"Generated {generated:,}/{count:,} patients ({rate:,.0f} records/s)")
+                yield chunk_patients
+        
+        if self.workers == 1 or count <= self.chunk_size:
+            yield from track(generate_patient_chunk(*chunk) for chunk in chunks)
+        else:
+            # Chunks are seeded independently and yielded in submission order,
+            # so the result is identical for any worker count
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                yield from track(iter_bounded(executor, generate_patient_chunk, chunks, self.workers * 2))
         
-        self.patients = patients
-        logger.info(f"Generated {len(patients)} patients")
-        return patients
+        logger.info(f"Generated {generated} patients")
+    
+    def generate_patients(self) -> List[Dict]:
+        """Generate patient data"""
+        return list(chain.from_iterable(self.iter_patient_chunks()))
     
-    def generate_appointments(self) -> List[Dict]:
-        """Generate appointment data"""
+    def iter_appointment_chunks(self, count: int = None, start_id: int = 0,
+                                days_back: int = 730) -> Iterator[Dict[str, np.ndarray]]:
+        """Generate appointment data column-wise, one chunk of columns at a time"""
         logger.info("Generating appointments...")
         
-        appointments = []
-        appointment_types = ['Consultation', 'Follow-up', 'Emergency', 'Surgery', 'Check-up']
-        
-        # Generate 2 years of appointment history
-        start_date = datetime.now() - timedelta(days=730)
-        end_date = datetime.now()
-        
-        for i in range(500):  # 500 appointments over 2 years
-            appointment = {
-                'id': f'APT{i:06d}',
-                'patient_id': random.choice(self.patients)['id'],
-                'doctor_id': random.choice(self.doctors)['id'],
-                'department_id': random.choice(self.departments)['id'],
-                'appointment_date': fake.date_between(start_date=start_date, end_date=end_date).strftime('%Y-%m-%d'),
-                'appointment_time': fake.time(),
-                'appointment_type': random.choice(appointment_types),
-                'status': random.choice(['Scheduled', 'Completed', 'Cancelled', 'No-show']),
-                'notes': fake.text(max_nb_chars=200),
-                'duration_minutes': random.choice([30, 45, 60, 90, 120]),
-                'room_number': f"R{random.randint(100, 999)}"
+        count = APPOINTMENT_COUNT if count is None else count
+        
+        appointment_types = np.array(['Consultation', 'Follow-up', 'Emergency', 'Surgery', 'Check-up'])
+        statuses = np.array(['Scheduled', 'Completed', 'Cancelled', 'No-show'])
+        durations = np.array([30, 45, 60, 90, 120])
+        index = self.reference_index
+        
+        # Generate 2 years of appointment history by default
+        seconds = np.arange(86400)
+        times = np.array([f'{h:02d}:{m:02d}:{s:02d}' for h, m, s in zip(seconds // 3600, seconds // 60 % 60, seconds % 60)])
+        rooms = np.array([f'R{n}' for n in range(100, 1000)])
+        notes = note_pool(chunk_seed(self.seed, 1), 200)
+        
+        generated = 0
+        for chunk_index, ids in enumerate(iter_chunks(count, self.chunk_size)):
+            rng = table_rng(self.seed, 1, chunk_index, start_id)
+            size = len(ids)
+            status = statuses[rng.integers(0, len(statuses), size)]
+            # Scheduled appointments belong to patients who are still admitted
+            patients = index.sample_patients(rng, size, days_back, active=status == 'Scheduled')
+            doctor_id, department_id = index.sample_department_doctors(rng, size)
+            appointments = {
+                'id': format_ids('APT', np.arange(start_id + ids.start, start_id + ids.stop)),
+                'patient_id': index.patient_ids(patients),
+                'doctor_id': doctor_id,
+                'department_id': department_id,
+                'appointment_date': index.sample_dates(rng, patients, days_back),
+                'appointment_time': times[rng.integers(0, len(times), size)],
+                'appointment_type': appointment_types[rng.integers(0, len(appointment_types), size)],
+                'status': status,
+                'notes': notes[rng.integers(0, len(notes), size)],
+                'duration_minutes': durations[rng.integers(0, len(durations), size)],
+                'room_number': rooms[rng.integers(0, len(rooms), size)]
             }
-            appointments.append(appointment)
+            generated += size
+            yield appointments
         
-        self.appointments = appointments
-        logger.info(f"Generated {len(appointments)} appointments")
-        return appointments
+        logger.info(f"Generated {generated} appointments")
     
-    def generate_lab_tests(self) -> List[Dict]:
-        """Generate laboratory test data"""
+    def iter_lab_test_chunks(self, count: int = None, start_id: int = 0,
+                             days_back: int = 365) -> Iterator[Dict[str, np.ndarray]]:
+        """Generate laboratory test data column-wise, one chunk of columns at a time"""
         logger.info("Generating lab tests...")
         
-        test_types = [
-            {'code': 'CBC', 'name': 'Complete Blood Count', 'normal_range': '4.5-11.0', 'units': 'K/uL'},
-            {'code': 'CHEM7', 'name': 'Basic Metabolic Panel', 'normal_range': '70-100', 'units': 'mg/dL'},
-            {'code': 'LIPID', 'name': 'Lipid Panel', 'normal_range': '<200', 'units': 'mg/dL'},
-            {'code': 'GLUCOSE', 'name': 'Blood Glucose', 'normal_range': '70-100', 'units': 'mg/dL'},
-            {'code': 'BUN', 'name': 'Blood Urea Nitrogen', 'normal_range': '7-20', 'units': 'mg/dL'},
-            {'code': 'CREATININE', 'name': 'Creatinine', 'normal_range': '0.6-1.2', 'units': 'mg/dL'},
-            {'code': 'TSH', 'name': 'Thyroid Stimulating Hormone', 'normal_range': '0.4-4.0', 'units': 'mIU/L'},
-            {'code': 'HBA1C', 'name': 'Hemoglobin A1C', 'normal_range': '<5.7', 'units': '%'}
-        ]
+        count = LAB_TEST_COUNT if count is None else count
+        
+        # Lookup arrays indexed by test type
+        codes = np.array([test['code'] for test in LAB_TEST_TYPES])
+        names = np.array([test['name'] for test in LAB_TEST_TYPES])
+        normal_ranges = np.array([test['normal_range'] for test in LAB_TEST_TYPES])
+        units = np.array([test['units'] for test in LAB_TEST_TYPES])
+        lows = np.array([test['result'][0] for test in LAB_TEST_TYPES], dtype=float)
+        highs = np.array([test['result'][1] for test in LAB_TEST_TYPES], dtype=float)
+        decimals = np.array([test['result'][2] for test in LAB_TEST_TYPES])
+        
+        statuses = np.array(['Completed', 'Pending', 'Cancelled'])
+        index = self.reference_index
+        notes = note_pool(chunk_seed(self.seed, 2), 100)
         
-        lab_tests = []
-        for i in range(2000):  # 2000 lab tests
-            test_type = random.choice(test_types)
-            patient = random.choice(self.patients)
-            doctor = random.choice(self.doctors)
+        generated = 0
+        for chunk_index, ids in enumerate(iter_chunks(count, self.chunk_size)):
+            rng = table_rng(self.seed, 2, chunk_index, start_id)
+            size = len(ids)
+            test_type = rng.integers(0, len(LAB_TEST_TYPES), size)
             
-            # Generate realistic test result
-            if test_type['code'] == 'CBC':
-                result_value = round(random.uniform(4.0, 12.0), 1)
-            elif test_type['code'] == 'GLUCOSE':
-                result_value = round(random.uniform(60, 150), 1)
-            elif test_type['code'] == 'LIPID':
-                result_value = round(random.uniform(120, 300), 1)
-            else:
-                result_value = round(random.uniform(0.1, 10.0), 2)
+            # Generate realistic test results from each test type's range
+            values = lows[test_type] + rng.random(size) * (highs[test_type] - lows[test_type])
+            values = np.where(decimals[test_type] == 1, np.round(values, 1), np.round(values, 2))
             
-            lab_test = {
-                'id': f'LAB{i:06d}',
-                'patient_id': patient['id'],
-                'doctor_id': doctor['id'],
-                'test_code': test_type['code'],
-                'test_name': test_type['name'],
-                'result_value': result_value,
-                'normal_range': test_type['normal_range'],
-                'units': test_type['units'],
-                'test_date': fake.date_between(start_date='-1y', end_date='today').strftime('%Y-%m-%d'),
-                'status': random.choice(['Completed', 'Pending', 'Cancelled']),
-                'notes': fake.text(max_nb_chars=100)
+            # Pending results belong to patients who are still admitted
+            status = statuses[rng.integers(0, len(statuses), size)]
+            patients = index.sample_patients(rng, size, days_back, active=status == 'Pending')
+            
+            lab_tests = {
+                'id': format_ids('LAB', np.arange(start_id + ids.start, start_id + ids.stop)),
+                'patient_id': index.patient_ids(patients),
+                'doctor_id': index.sample_doctors(rng, size),
+                'test_code': codes[test_type],
+                'test_name': names[test_type],
+                'result_value': values,
+                'normal_range': normal_ranges[test_type],
+                'units': units[test_type],
+                'test_date': index.sample_dates(rng, patients, days_back),
+                'status': status,
+                'notes': notes[rng.integers(0, len(notes), size)]
             }
-            lab_tests.append(lab_test)
+            generated += size
+            yield lab_tests
         
-        self.lab_tests = lab_tests
-        logger.info(f"Generated {len(lab_tests)} lab tests")
-        return lab_tests
+        logger.info(f"Generated {generated} lab tests")
     
     def generate_medications(self) -> List[Dict]:
         """Generate medication data"""
@@ -237,16 +668,16 @@ class HospitalDataGenerator:
         logger.info(f"Generated {len(medications)} medications")
         return medications
     
-    def save_to_csv(self, data: List[Dict], filename: str):
-        """Save data to CSV file"""
-        if not data:
-            logger.warning(f"No data to save for {filename}")
-            return
-        
-        filepath = f"/app/data/{filename}"
-        df = pd.DataFrame(data)
-        df.to_csv(filepath, index=False)
-        logger.info(f"Saved {len(data)} records to {filepath}")
+    def write_table(self, table: str, chunks: Iterable[List[Dict]], output_dir: str = OUTPUT_DIR) -> int:
+        """Stream record chunks for one table to a file per selected output format"""
+        with ChunkedTableWriter(table, output_dir=output_dir, formats=self.formats) as writer:
+            for chunk in chunks:
+                writer.write_chunk(chunk)
+        if writer.count:
+            logger.info(f"Saved {writer.count} records to {', '.join(writer.paths.values())}")
+        else:
+            logger.warning(f"No data to save for {table}")
+        return writer.count
     
     def save_to_json(self, data: List[Dict], filename: str):
         """Save data to JSON file"""
@@ -254,7 +685,7 @@ class HospitalDataGenerator:
             logger.warning(f"No data to save for {filename}")
             return
         
-        filepath = f"/app/data/{filename}"
+        filepath = os.path.join(OUTPUT_DIR, filename)
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False, default=str)
         logger.info(f"Saved {len(data)} records to {filepath}")
@@ -263,60 +694,114 @@ class HospitalDataGenerator:
         """Generate all hospital data"""
         logger.info("Starting hospital data generation...")
         
-        # Generate all data
+        # Reference tables are small and kept in memory for foreign keys
         self.generate_departments()
         self.generate_doctors()
-        self.generate_patients()
-        self.generate_appointments()
-        self.generate_lab_tests()
         self.generate_medications()
         
-        # Save to CSV files
-        self.save_to_csv(self.departments, 'departments.csv')
-        self.save_to_csv(self.doctors, 'doctors.csv')
-        self.save_to_csv(self.patients, 'patients.csv')
-        self.save_to_csv(self.appointments, 'appointments.csv')
-        self.save_to_csv(self.lab_tests, 'lab_tests.csv')
-        self.save_to_csv(self.medications, 'medications.csv')
-        
-        # Save to JSON files
-        self.save_to_json(self.departments, 'departments.json')
-        self.save_to_json(self.doctors, 'doctors.json')
-        self.save_to_json(self.patients, 'patients.json')
-        self.save_to_json(self.appointments, 'appointments.json')
-        self.save_to_json(self.lab_tests, 'lab_tests.json')
-        self.save_to_json(self.medications, 'medications.json')
+        # Large tables stream straight from the generators to the writers
+        total_records = {
+            'departments': self.write_table('departments', [self.departments]),
+            'doctors': self.write_table('doctors', [self.doctors]),
+            'patients': self.write_table('patients', self.iter_patient_chunks()),
+            'appointments': self.write_table('appointments', self.iter_appointment_chunks()),
+            'lab_tests': self.write_table('lab_tests', self.iter_lab_test_chunks()),
+            'medications': self.write_table('medications', [self.medications])
+        }
         
         # Generate summary
         summary = {
             'generation_date': datetime.now().isoformat(),
-            'total_records': {
-                'departments': len(self.departments),
-                'doctors': len(self.doctors),
-                'patients': len(self.patients),
-                'appointments': len(self.appointments),
-                'lab_tests': len(self.lab_tests),
-                'medications': len(self.medications)
+            'seed': self.seed,
+            'total_records': total_records,
+            'watermarks': {
+                'patients': total_records['patients'],
+                'appointments': total_records['appointments'],
+                'lab_tests': total_records['lab_tests']
             },
-            'total_size_mb': self.calculate_total_size()
+            'output_formats': self.formats
         }
+        size_by_format = self.calculate_total_size()
+        summary['total_size_mb'] = size_by_format.pop('total')
+        summary['size_mb_by_format'] = size_by_format
         
-        self.save_to_json([summary], 'generation_summary.json')
+        self.save_to_json([summary], SUMMARY_FILE)
         
         logger.info("Hospital data generation completed!")
         logger.info(f"Generated {sum(summary['total_records'].values())} total records")
         
         return summary
     
-    def calculate_total_size(self) -> float:
-        """Calculate total size of generated data in MB"""
-        total_size = 0
-        for filename in ['departments.csv', 'doctors.csv', 'patients.csv', 
-                        'appointments.csv', 'lab_tests.csv', 'medications.csv']:
-            filepath = f"/app/data/{filename}"
-            if os.path.exists(filepath):
-                total_size += os.path.getsize(filepath)
-        return round(total_size / (1024 * 1024), 2)
+    def load_summary(self) -> Optional[Dict]:
+        """Load the summary of the last generation run, if there is one"""
+        filepath = os.path.join(OUTPUT_DIR, SUMMARY_FILE)
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, encoding='utf-8') as f:
+            return json.load(f)[0]
+    
+    def generate_delta_data(self, summary: Dict) -> Dict:
+        """Append new admissions, appointments and lab tests on top of an existing population"""
+        logger.info("Starting incremental hospital data generation...")
+        
+        # Summaries written before watermarks existed: IDs were 0..count-1
+        watermarks = summary.get('watermarks') or {
+            table: summary['total_records'][table] for table in ('patients', 'appointments', 'lab_tests')
+        }
+        
+        # New records reference the existing departments, doctors and patients
+        self.generate_departments()
+        self.doctors = list(iter_source_rows(OUTPUT_DIR, 'doctors'))
+        self.reference_index.set_doctors(self.departments, self.doctors)
+        for directory in [OUTPUT_DIR] + [os.path.join(OUTPUT_DIR, delta['directory']) for delta in summary.get('deltas', [])]:
+            rows = iter_source_rows(directory, 'patients')
+            for batch in iter(lambda: list(islice(rows, self.chunk_size)), []):
+                self.reference_index.add_patients(batch)
+        self.patient_count = watermarks['patients']
+        
+        delta_date = datetime.now()
+        delta_dir = os.path.join(OUTPUT_DIR, 'deltas', delta_date.strftime('%Y%m%dT%H%M%S'))
+        os.makedirs(delta_dir, exist_ok=True)
+        
+        delta_records = {
+            'patients': self.write_table(
+                'patients', self.iter_patient_chunks(DELTA_ADMISSIONS, watermarks['patients'], DELTA_DAYS), delta_dir),
+            'appointments': self.write_table(
+                'appointments', self.iter_appointment_chunks(DELTA_APPOINTMENTS, watermarks['appointments'], DELTA_DAYS), delta_dir),
+            'lab_tests': self.write_table(
+                'lab_tests', self.iter_lab_test_chunks(DELTA_LAB_TESTS, watermarks['lab_tests'], DELTA_DAYS), delta_dir)
+        }
+        
+        # Advance the watermarks and record the delta in the summary
+        summary['watermarks'] = {table: watermarks[table] + delta_records[table] for table in watermarks}
+        for table, count in delta_records.items():
+            summary['total_records'][table] = summary['total_records'].get(table, 0) + count
+        summary.setdefault('deltas', []).append({
+            'generation_date': delta_date.isoformat(),
+            'seed': self.seed,
+            'directory': os.path.relpath(delta_dir, OUTPUT_DIR),
+            'records': delta_records
+        })
+        self.save_to_json([summary], SUMMARY_FILE)
+        
+        logger.info(f"Incremental generation completed: {sum(delta_records.values())} new records in {delta_dir}")
+        return {'directory': delta_dir, 'records': delta_records, 'watermarks': summary['watermarks']}
+    
+    def calculate_total_size(self) -> Dict[str, float]:
+        """Calculate size of generated data in MB per output format, plus the total"""
+        sizes = {}
+        for fmt in self.formats:
+            format_size = 0
+            for table in ['departments', 'doctors', 'patients',
+                          'appointments', 'lab_tests', 'medications']:
+                filepath = os.path.join(OUTPUT_DIR, f"{table}.{fmt}")
+                if os.path.exists(filepath):
+                    format_size += os.path.getsize(filepath)
+            sizes[fmt] = format_size
+        total_size = sum(sizes.values())
+        sizes = {fmt: round(size / (1024 * 1024), 2) for fmt, size in sizes.items()}
+        sizes['total'] = round(total_size / (1024 * 1024), 2)
+        return sizes
 
 def main():
     """Main function"""
@@ -324,6 +809,27 @@ def main():
     logger.info("=" * 50)
     
     generator = HospitalDataGenerator()
+    
+    if GENERATION_MODE == 'incremental':
+        previous = generator.load_summary()
+        if previous is not None:
+            delta = generator.generate_delta_data(previous)
+            
+            print("\n" + "=" * 50)
+            print("INCREMENTAL GENERATION SUMMARY")
+            print("=" * 50)
+            print(f"Delta Directory: {delta['directory']}")
+            print("\nNew Records:")
+            for table, count in delta['records'].items():
+                print(f"  {table}: {count:,} (next ID watermark {delta['watermarks'][table]:,})")
+            
+            # Optionally append the delta to the database
+            if LOAD_BACKEND in BACKENDS:
+                loader = BulkLoader(BACKENDS[LOAD_BACKEND](), data_dir=delta['directory'], append=True)
+                print_report(loader.load_all(list(delta['records'])))
+            return
+        logger.warning(f"No {SUMMARY_FILE} in {OUTPUT_DIR}, falling back to a full generation")
+    
     summary = generator.generate_all_data()
     
     print("\n" + "=" * 50)
@@ -332,18 +838,23 @@ def main():
     print(f"Generation Date: {summary['generation_date']}")
     print(f"Total Records: {sum(summary['total_records'].values())}")
     print(f"Total Size: {summary['total_size_mb']} MB")
+    for fmt, size in summary['size_mb_by_format'].items():
+        print(f"  {fmt}: {size} MB")
     print("\nRecord Counts:")
     for table, count in summary['total_records'].items():
         print(f"  {table}: {count:,}")
     
-    print("\nFiles generated in /app/data/:")
-    print("  - departments.csv/json")
-    print("  - doctors.csv/json")
-    print("  - patients.csv/json")
-    print("  - appointments.csv/json")
-    print("  - lab_tests.csv/json")
-    print("  - medications.csv/json")
+    extensions = '/'.join(summary['output_formats'])
+    print(f"\nFiles generated in {OUTPUT_DIR}/:")
+    for table in summary['total_records']:
+        print(f"  - {table}.{extensions}")
     print("  - generation_summary.json")
+    
+    # Optionally bulk load the generated files into the database; a restarted container picks up
+    # an interrupted load, and regenerated files fail the fingerprint check and load from scratch
+    if LOAD_BACKEND in BACKENDS:
+        loader = BulkLoader(BACKENDS[LOAD_BACKEND](), data_dir=OUTPUT_DIR, resume=True)
+        print_report(loader.load_all())
 
 if __name__ == "__main__":
     main()
@@ -5,45 +5,313 @@ Generates realistic HL7 messages for hospital operations demo
 """
 
 import asyncio
+import atexit
 import json
 import logging
 import os
 import random
+import select
+import socket
+import sys
+import threading
 import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
-import redis
-import requests
-from faker import Faker
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/hl7_simulator.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+# Shared modules live next to the service directories (services/shared, /app/shared in the images)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.logging_setup import configure_logging, stop_logging
+from shared.redis_layer import RedisUnavailableError, ResilientRedis
+from shared.profiling import PROFILING_ENABLED, create_profiling_router, memory_tracker
+from shared.tracing import TraceStats
+from shared.tenancy import (DEFAULT_FACILITY, FACILITIES, QUEUE_PARTITIONS, parse_facilities, partition_for,
+                            queue_key, validate_facility_id)
+
+# Logging configuration
+LOG_SAMPLE_RATE = max(1, int(os.getenv('LOG_SAMPLE_RATE', '100')))  # log 1 in N generated messages
 
-# Initialize Faker with Vietnamese locale
-fake = Faker('vi_VN')
+configure_logging('hl7_simulator.log')
+atexit.register(stop_logging)
+logger = logging.getLogger(__name__)
 
 # Configuration
 IRIS_HOST = os.getenv('IRIS_HOST', 'iris')
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 MESSAGE_RATE = int(os.getenv('MESSAGE_RATE', '50'))
 SIMULATION_DURATION = int(os.getenv('SIMULATION_DURATION', '3600'))
+IRIS_LATENCY = float(os.getenv('IRIS_LATENCY', '0.1'))  # simulated IRIS processing time in seconds
+IRIS_HL7_HOST = os.getenv('IRIS_HL7_HOST', IRIS_HOST)
+IRIS_HL7_PORT = int(os.getenv('IRIS_HL7_PORT', '0'))  # MLLP port of the IRIS HL7 TCP service; 0 simulates delivery
+IRIS_ACK_TIMEOUT = float(os.getenv('IRIS_ACK_TIMEOUT', '5'))
+MESSAGE_RETENTION = int(os.getenv('MESSAGE_RETENTION_SECONDS', '86400'))  # how long /messages can look back
+# Traffic mix as TYPE:weight pairs; weights are relative, ADT^A08 updates dominate real feeds
+MESSAGE_MIX = os.getenv('MESSAGE_MIX', 'ADT^A08:40,ORU^R01:20,ORM^O01:15,ADT^A01:10,ADT^A03:8,ADT^A02:7')
+CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', '/app/checkpoints/simulator.json')  # empty disables checkpoints
+CHECKPOINT_INTERVAL = float(os.getenv('CHECKPOINT_INTERVAL', '10'))  # seconds between checkpoints of a running simulation
+AUTO_RESUME = os.getenv('AUTO_RESUME', 'false').lower() == 'true'  # resume an interrupted simulation on startup
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '10'))  # seconds a stop waits for in-flight sends and the final flush
 
 # Initialize FastAPI
 app = FastAPI(title="HL7 Message Simulator", version="1.0.0")
 
-# Initialize Redis
-redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=0, decode_responses=True)
+# Heavy clients are created on first use so the app accepts requests immediately
+_fake = None
+_redis_client = None
+
+def get_fake():
+    """Get the shared Faker instance (Vietnamese locale), importing faker on first use"""
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker('vi_VN')
+    return _fake
+
+def get_redis_client() -> ResilientRedis:
+    """Get the shared pooled, retrying Redis client, creating it on first use"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = ResilientRedis(host=REDIS_HOST)
+    return _redis_client
+
+# MLLP framing (HL7 minimal lower layer protocol)
+MLLP_START = b'\x0b'
+MLLP_END = b'\x1c\r'
+
+class MLLPClient:
+    """Sends HL7 messages over one persistent MLLP connection and waits for each ACK"""
+
+    def __init__(self, host: str, port: int, timeout: float = IRIS_ACK_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b''
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = b''
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read_frame(self) -> bytes:
+        while MLLP_END not in self.buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("Connection closed while waiting for ACK")
+            self.buffer += data
+        frame, self.buffer = self.buffer.split(MLLP_END, 1)
+        return frame.lstrip(MLLP_START)
+
+    def is_stale(self) -> bool:
+        """True if the server closed the idle connection: readable with nothing to read means EOF"""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return bool(readable) and not self.sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def send(self, message: str) -> str:
+        """Send one message and return the acknowledgment code from its MSA segment"""
+        # HL7 segments are separated by carriage returns on the wire
+        payload = MLLP_START + message.replace('\r\n', '\r').replace('\n', '\r').encode('utf-8') + MLLP_END
+        if self.sock is not None and self.is_stale():
+            self.close()
+        for attempt in (1, 2):
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(payload)
+                break
+            except OSError:
+                # Reconnect once if the connection failed before the message was written
+                self.close()
+                if attempt == 2:
+                    raise
+        try:
+            ack = self.read_frame().decode('utf-8', errors='replace')
+        except OSError:
+            # IRIS may already have the message, so don't resend it; the next one reconnects
+            self.close()
+            raise
+        for segment in ack.split('\r'):
+            if segment.startswith('MSA|'):
+                return segment.split('|')[1]
+        raise ValueError(f"ACK without MSA segment: {ack[:100]}")
+
+# One connection per sending thread
+_mllp_clients = threading.local()
+
+def get_mllp_client() -> MLLPClient:
+    client = getattr(_mllp_clients, 'client', None)
+    if client is None:
+        client = _mllp_clients.client = MLLPClient(IRIS_HL7_HOST, IRIS_HL7_PORT)
+    return client
+
+# Message store: each envelope is kept under hl7:message:<id>, and its id is added to
+# sorted-set indexes (all, per type, and per facility with optional patient and type)
+# scored by enqueue time in ms * 1000 plus a sequence tie-breaker, newest last
+def message_key(message_id: str) -> str:
+    return f"hl7:message:{message_id}"
+
+def index_key(message_type: Optional[str] = None, patient_id: Optional[str] = None,
+              facility: Optional[str] = None) -> str:
+    """The most selective index for a filter combination; patient IDs are scoped to their facility"""
+    if facility:
+        key = f"hl7:index:facility:{facility}"
+        if patient_id:
+            key += f":patient:{patient_id}"
+        if message_type:
+            key += f":type:{message_type}"
+        return key
+    if message_type:
+        return f"hl7:index:type:{message_type}"
+    return "hl7:index:all"
+
+def time_score(moment: datetime) -> int:
+    return int(moment.timestamp() * 1000) * 1000
+
+def extract_patient_id(message: str) -> Optional[str]:
+    """Patient ID from PID-3 (first component), if the message has a PID segment"""
+    for segment in message.splitlines():
+        if segment.startswith('PID|'):
+            fields = segment.split('|')
+            if len(fields) > 3 and fields[3]:
+                return fields[3].split('^')[0]
+    return None
+
+def parse_message_mix(spec: str) -> Dict[str, float]:
+    """Parse 'TYPE:weight,TYPE:weight' into a relative weight per message type"""
+    mix = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        message_type, _, weight = item.rpartition(':')
+        if not message_type.strip():
+            raise ValueError(f"Expected TYPE:weight in message mix, got {item.strip()!r}")
+        mix[message_type.strip()] = float(weight)
+    return mix
+
+# Checkpoints: small run state (config, counters, RNG state, progress) rewritten every
+# CHECKPOINT_INTERVAL seconds, and the facility populations written once per run next to it
+CHECKPOINT_VERSION = 1
+RESUMABLE_STATUSES = ('running', 'interrupted', 'stopped')  # 'running' means the process died mid-run
+
+def population_path(path: str = CHECKPOINT_PATH) -> str:
+    return os.path.splitext(path)[0] + '.population.json'
+
+def write_json_atomic(path: str, data: Dict) -> int:
+    """Write JSON through a temporary file and rename, so a crash never leaves a torn file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload)
+
+def read_json(path: str) -> Optional[Dict]:
+    """Load a checkpoint file, or None if there is none or it cannot be read"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+# Lab panels for ORU/ORM messages: code -> (name, [(analyte, name, units, low, high, decimals)])
+LAB_PANELS = {
+    'CBC': ('Complete blood count with differential', [
+        ('WBC', 'Leukocytes', '10*3/uL', 4.0, 11.0, 1),
+        ('RBC', 'Erythrocytes', '10*6/uL', 4.2, 5.9, 2),
+        ('HGB', 'Hemoglobin', 'g/dL', 12.0, 17.5, 1),
+        ('HCT', 'Hematocrit', '%', 36.0, 52.0, 1),
+        ('MCV', 'Mean corpuscular volume', 'fL', 80.0, 100.0, 1),
+        ('MCH', 'Mean corpuscular hemoglobin', 'pg', 27.0, 33.0, 1),
+        ('MCHC', 'Mean corpuscular hemoglobin concentration', 'g/dL', 32.0, 36.0, 1),
+        ('RDW', 'Erythrocyte distribution width', '%', 11.5, 14.5, 1),
+        ('PLT', 'Platelets', '10*3/uL', 150.0, 400.0, 0),
+        ('MPV', 'Mean platelet volume', 'fL', 7.5, 11.5, 1),
+        ('NEUT%', 'Neutrophils/100 leukocytes', '%', 40.0, 75.0, 1),
+        ('LYMPH%', 'Lymphocytes/100 leukocytes', '%', 20.0, 45.0, 1),
+        ('MONO%', 'Monocytes/100 leukocytes', '%', 2.0, 10.0, 1),
+        ('EOS%', 'Eosinophils/100 leukocytes', '%', 1.0, 6.0, 1),
+        ('BASO%', 'Basophils/100 leukocytes', '%', 0.0, 2.0, 1),
+        ('NEUT#', 'Neutrophils', '10*3/uL', 1.8, 7.7, 2),
+        ('LYMPH#', 'Lymphocytes', '10*3/uL', 1.0, 4.8, 2),
+        ('MONO#', 'Monocytes', '10*3/uL', 0.2, 0.9, 2),
+        ('EOS#', 'Eosinophils', '10*3/uL', 0.0, 0.5, 2),
+        ('BASO#', 'Basophils', '10*3/uL', 0.0, 0.2, 2),
+        ('NRBC', 'Nucleated erythrocytes/100 leukocytes', '/100{WBCs}', 0.0, 0.2, 1),
+        ('IG%', 'Immature granulocytes/100 leukocytes', '%', 0.0, 0.6, 1)
+    ]),
+    'CMP': ('Comprehensive metabolic panel', [
+        ('GLU', 'Glucose', 'mg/dL', 70.0, 99.0, 0),
+        ('BUN', 'Urea nitrogen', 'mg/dL', 7.0, 20.0, 0),
+        ('CREA', 'Creatinine', 'mg/dL', 0.6, 1.3, 2),
+        ('NA', 'Sodium', 'mmol/L', 135.0, 145.0, 0),
+        ('K', 'Potassium', 'mmol/L', 3.5, 5.1, 1),
+        ('CL', 'Chloride', 'mmol/L', 98.0, 107.0, 0),
+        ('CO2', 'Carbon dioxide', 'mmol/L', 22.0, 29.0, 0),
+        ('CA', 'Calcium', 'mg/dL', 8.6, 10.3, 1),
+        ('TP', 'Protein', 'g/dL', 6.0, 8.3, 1),
+        ('ALB', 'Albumin', 'g/dL', 3.5, 5.0, 1),
+        ('TBIL', 'Bilirubin total', 'mg/dL', 0.1, 1.2, 1),
+        ('ALP', 'Alkaline phosphatase', 'U/L', 44.0, 147.0, 0),
+        ('ALT', 'Alanine aminotransferase', 'U/L', 7.0, 56.0, 0),
+        ('AST', 'Aspartate aminotransferase', 'U/L', 10.0, 40.0, 0)
+    ]),
+    'BMP': ('Basic metabolic panel', [
+        ('GLU', 'Glucose', 'mg/dL', 70.0, 99.0, 0),
+        ('BUN', 'Urea nitrogen', 'mg/dL', 7.0, 20.0, 0),
+        ('CREA', 'Creatinine', 'mg/dL', 0.6, 1.3, 2),
+        ('NA', 'Sodium', 'mmol/L', 135.0, 145.0, 0),
+        ('K', 'Potassium', 'mmol/L', 3.5, 5.1, 1),
+        ('CL', 'Chloride', 'mmol/L', 98.0, 107.0, 0),
+        ('CO2', 'Carbon dioxide', 'mmol/L', 22.0, 29.0, 0),
+        ('CA', 'Calcium', 'mg/dL', 8.6, 10.3, 1)
+    ]),
+    'LIPID': ('Lipid panel', [
+        ('CHOL', 'Cholesterol', 'mg/dL', 125.0, 200.0, 0),
+        ('TRIG', 'Triglyceride', 'mg/dL', 40.0, 150.0, 0),
+        ('HDL', 'HDL cholesterol', 'mg/dL', 40.0, 80.0, 0),
+        ('LDL', 'LDL cholesterol calculated', 'mg/dL', 50.0, 100.0, 0),
+        ('NHDL', 'Non-HDL cholesterol', 'mg/dL', 60.0, 130.0, 0)
+    ]),
+    'TROP': ('Troponin I cardiac', [
+        ('TNI', 'Troponin I', 'ng/L', 0.0, 34.0, 0)
+    ]),
+    'GLUCOSE': ('Glucose point of care', [
+        ('GLU', 'Glucose', 'mg/dL', 70.0, 99.0, 0)
+    ])
+}
+# Demographic detail carried by ADT^A08 updates
+ALLERGENS = [('PCN^Penicillin', 'Hives'), ('SULFA^Sulfonamides', 'Rash'), ('LATEX^Latex', 'Dermatitis'),
+             ('ASA^Aspirin', 'Bronchospasm'), ('IODINE^Iodinated contrast', 'Anaphylaxis'), ('NUT^Peanuts', 'Swelling')]
+INSURANCE_PLANS = {'A': ('BHYT', 'Bao hiem y te'), 'B': ('PVI', 'PVI Care'), 'C': ('SELF', 'Self pay')}
+
+# Relative ordering frequency: blood counts and chemistry panels make up most lab traffic
+LAB_PANEL_WEIGHTS = {'CBC': 35, 'CMP': 20, 'BMP': 20, 'LIPID': 10, 'TROP': 5, 'GLUCOSE': 10}
+
+def generate_observation(analyte: tuple) -> tuple:
+    """A result value around the analyte's reference range, mostly normal, and its abnormal flag"""
+    _, _, _, low, high, decimals = analyte
+    value = max(0.0, random.gauss((low + high) / 2, (high - low or high or 1.0) / 3))
+    value = round(value, decimals) if decimals else int(round(value))
+    flag = 'H' if value > high else 'L' if value < low else 'N'
+    return value, flag
 
 # Pydantic models
 class HL7Message(BaseModel):
@@ -53,12 +321,41 @@ class HL7Message(BaseModel):
     timestamp: str
     status: str = "PENDING"
 
+class FacilityConfig(BaseModel):
+    id: str
+    message_rate: Optional[int] = None  # messages/min; the run's message_rate when not set
+    patient_count: Optional[int] = None
+    doctor_count: Optional[int] = None
+
 class SimulationConfig(BaseModel):
     message_rate: int = 50
     duration: int = 3600
     patient_count: int = 100
     department_count: int = 5
     doctor_count: int = 10
+    message_mix: Optional[Dict[str, float]] = None  # overrides MESSAGE_MIX for this run
+    facilities: Optional[List[FacilityConfig]] = None  # overrides FACILITIES for this run
+
+class FacilityPopulation:
+    """One facility's demo population, configured rate and message counters"""
+
+    def __init__(self, facility_id: str, message_rate: Optional[int] = None):
+        self.id = facility_id
+        self.message_rate = message_rate
+        self.patients = []
+        self.doctors = []
+        self.departments = []
+        self.message_count = 0
+        self.error_count = 0
+
+    def get_stats(self) -> Dict:
+        return {
+            "message_rate": self.message_rate,
+            "patients": len(self.patients),
+            "doctors": len(self.doctors),
+            "message_count": self.message_count,
+            "error_count": self.error_count
+        }
 
 class HL7Simulator:
     def __init__(self):
@@ -66,17 +363,115 @@ class HL7Simulator:
         self.message_count = 0
         self.error_count = 0
         self.start_time = None
-        self.patients = []
-        self.doctors = []
-        self.departments = []
-        self.initialize_data()
+        self.facility_configs = parse_facilities(FACILITIES)
+        self.facilities: Dict[str, FacilityPopulation] = {}
+        self.active_facilities: List[str] = []
+        self.is_ready = False
+        self.warmup_progress = 0
+        self.warmup_total = 0
+        self.warmup_seconds = None
+        self.warmup_task = None
+        self.trace_stats = TraceStats()
+        self.index_sequence = 0
+        self.sequence_lock = threading.Lock()  # messages are sent from worker threads
+        self.message_generators = {
+            'ADT^A01': self.generate_adt_a01,
+            'ADT^A02': self.generate_adt_a02,
+            'ADT^A03': self.generate_adt_a03,
+            'ADT^A08': self.generate_adt_a08,
+            'ORM^O01': self.generate_orm_o01,
+            'ORU^R01': self.generate_oru_r01
+        }
+        self.message_mix = self.validate_message_mix(parse_message_mix(MESSAGE_MIX))
+        self.type_stats = {}  # message type -> [generated, total bytes, max bytes]
+        # Run lifecycle and checkpointing
+        self.run_id = None
+        self.run_config: Optional[SimulationConfig] = None
+        self.run_task = None
+        self.stop_event = None
+        self.stop_reason = 'stopped'
+        self.elapsed_offset = 0.0  # seconds already simulated before this (resumed) leg
+        self.leg_started = None
+        self.leg_stopped = None
+        self.checkpoint_stats = {"written": 0, "failed": 0, "last_status": None, "last_at": None,
+                                 "last_bytes": 0, "last_ms": None, "resumed_from": None}
+    
+    def validate_message_mix(self, mix: Dict[str, float]) -> Dict[str, float]:
+        """Check a traffic mix names known message types with usable weights, dropping zero weights"""
+        unknown = sorted(set(mix) - set(self.message_generators))
+        if unknown:
+            raise ValueError(f"Unknown message types in mix: {', '.join(unknown)}")
+        if any(weight < 0 for weight in mix.values()):
+            raise ValueError("Message mix weights must not be negative")
+        mix = {message_type: weight for message_type, weight in mix.items() if weight > 0}
+        if not mix:
+            raise ValueError("Message mix needs at least one positive weight")
+        return mix
+    
+    def choose_message_types(self, count: int = 1, mix: Optional[Dict[str, float]] = None) -> List[str]:
+        """Draw message types according to the weighted traffic mix"""
+        mix = mix or self.message_mix
+        return random.choices(list(mix), weights=list(mix.values()), k=count)
+    
+    def validate_facilities(self, facilities: List[FacilityConfig]):
+        """Check a run's facility list has unique, well-formed IDs and positive rates and counts"""
+        ids = [validate_facility_id(facility.id) for facility in facilities]
+        if not ids:
+            raise ValueError("At least one facility is required")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Facility IDs must be unique")
+        for facility in facilities:
+            if any(value is not None and value <= 0
+                   for value in (facility.message_rate, facility.patient_count, facility.doctor_count)):
+                raise ValueError(f"Facility {facility.id}: rates and counts must be positive")
+    
+    def default_facility(self) -> FacilityPopulation:
+        """The facility used when a caller does not name one (the first configured)"""
+        return self.facilities.get(DEFAULT_FACILITY) or next(iter(self.facilities.values()))
     
-    def initialize_data(self):
-        """Initialize demo data"""
+    async def warm_up(self):
+        """Build the demo population in a worker thread so the event loop stays responsive
+
+        A resumable checkpoint brings back the populations it ran with, and with AUTO_RESUME
+        an interrupted simulation continues once warm-up is done.
+        """
+        started = time.perf_counter()
+        checkpoint = await asyncio.to_thread(read_json, CHECKPOINT_PATH)
+        if checkpoint and checkpoint.get('status') in RESUMABLE_STATUSES:
+            populations = await asyncio.to_thread(read_json, population_path())
+            if populations:
+                self.restore_population(populations)
+        await asyncio.to_thread(self.initialize_data)
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+        self.is_ready = True
+        
+        if (AUTO_RESUME and checkpoint and checkpoint.get('status') in ('running', 'interrupted')
+                and checkpoint.get('version') == CHECKPOINT_VERSION and not self.is_busy()):
+            logger.info(f"Resuming interrupted simulation {checkpoint['run_id']}")
+            self.run_task = asyncio.create_task(self.resume(checkpoint))
+    
+    def initialize_data(self, doctor_count: int = 10, patient_count: int = 100,
+                        facilities: Optional[List[Dict]] = None):
+        """Build the demo population of each facility that does not have one yet
+
+        Facilities without their own counts get `doctor_count` doctors and `patient_count` patients.
+        """
         logger.info("Initializing demo data...")
+        pending = [config for config in (facilities or self.facility_configs) if config['id'] not in self.facilities]
+        self.warmup_total = sum((config['doctor_count'] or doctor_count) + (config['patient_count'] or patient_count)
+                                for config in pending)
+        self.warmup_progress = 0
+        for config in pending:
+            facility = FacilityPopulation(config['id'], config['message_rate'])
+            self.populate(facility, config['doctor_count'] or doctor_count, config['patient_count'] or patient_count)
+            self.facilities[facility.id] = facility
+    
+    def populate(self, facility: FacilityPopulation, doctor_count: int, patient_count: int):
+        """Generate one facility's departments, doctors and patients"""
+        fake = get_fake()
         
         # Generate departments
-        self.departments = [
+        facility.departments = [
             {'id': 'DEPT001', 'name': 'Emergency', 'beds': 20},
             {'id': 'DEPT002', 'name': 'Cardiology', 'beds': 15},
             {'id': 'DEPT003', 'name': 'Neurology', 'beds': 12},
@@ -86,18 +481,19 @@ class HL7Simulator:
         
         # Generate doctors
         specialties = ['Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Surgery']
-        for i in range(10):
+        for i in range(doctor_count):
             doctor = {
                 'id': f'D{i:03d}',
                 'name': fake.name(),
                 'specialty': random.choice(specialties),
-                'department': random.choice(self.departments)['id'],
+                'department': random.choice(facility.departments)['id'],
                 'license': fake.random_number(digits=8)
             }
-            self.doctors.append(doctor)
+            facility.doctors.append(doctor)
+            self.warmup_progress += 1
         
         # Generate patients
-        for i in range(100):
+        for i in range(patient_count):
             patient = {
                 'id': f'P{i:06d}',
                 'name': fake.name(),
@@ -108,158 +504,553 @@ class HL7Simulator:
                 'insurance': random.choice(['A', 'B', 'C']),
                 'admission_date': fake.date_between(start_date='-30d', end_date='today').strftime('%Y%m%d%H%M%S')
             }
-            self.patients.append(patient)
+            facility.patients.append(patient)
+            self.warmup_progress += 1
         
-        logger.info(f"Initialized {len(self.patients)} patients, {len(self.doctors)} doctors, {len(self.departments)} departments")
+        logger.info(f"Initialized {facility.id}: {len(facility.patients)} patients, {len(facility.doctors)} doctors, "
+                    f"{len(facility.departments)} departments")
     
-    def generate_adt_a01(self) -> str:
+    def generate_adt_a01(self, facility: Optional[FacilityPopulation] = None) -> str:
         """Generate ADT^A01 (Patient Admission) message"""
-        patient = random.choice(self.patients)
-        doctor = random.choice(self.doctors)
-        department = random.choice(self.departments)
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        department = random.choice(facility.departments)
         
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         msg_id = f"MSG{int(time.time())}"
         
-        message = f"""MSH|^~\\&|HIS|HOSPITAL_ABC|IRIS|INTEGRATION|{timestamp}||ADT^A01^ADT_A01|{msg_id}|P|2.5
+        message = f"""MSH|^~\\&|HIS|{facility.id}|IRIS|INTEGRATION|{timestamp}||ADT^A01^ADT_A01|{msg_id}|P|2.5
 PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}|||{patient['address']}||{patient['phone']}
 PV1|1|I|{department['id']}^{random.randint(1, 20)}^{random.randint(1, 4)}|||{doctor['id']}||||MED||||A|||{doctor['name']}"""
         
         return message.strip()
     
-    def generate_adt_a03(self) -> str:
+    def generate_adt_a03(self, facility: Optional[FacilityPopulation] = None) -> str:
         """Generate ADT^A03 (Patient Discharge) message"""
-        patient = random.choice(self.patients)
-        doctor = random.choice(self.doctors)
-        department = random.choice(self.departments)
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        department = random.choice(facility.departments)
         
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         msg_id = f"MSG{int(time.time())}"
         
-        message = f"""MSH|^~\\&|HIS|HOSPITAL_ABC|IRIS|INTEGRATION|{timestamp}||ADT^A03^ADT_A03|{msg_id}|P|2.5
+        message = f"""MSH|^~\\&|HIS|{facility.id}|IRIS|INTEGRATION|{timestamp}||ADT^A03^ADT_A03|{msg_id}|P|2.5
 PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}
 PV1|1|O|{department['id']}^{random.randint(1, 20)}^{random.randint(1, 4)}|||{doctor['id']}||||MED||||A|||{doctor['name']}"""
         
         return message.strip()
     
-    def generate_oru_r01(self) -> str:
-        """Generate ORU^R01 (Lab Results) message"""
-        patient = random.choice(self.patients)
-        doctor = random.choice(self.doctors)
-        
-        test_codes = ['CBC', 'CHEM7', 'LIPID', 'GLUCOSE', 'BUN', 'CREATININE']
-        test_code = random.choice(test_codes)
-        result_value = round(random.uniform(10, 200), 1)
-        units = random.choice(['mg/dL', 'g/dL', 'U/L', 'cells/uL'])
+    def generate_adt_a02(self, facility: Optional[FacilityPopulation] = None) -> str:
+        """Generate ADT^A02 (Patient Transfer) message"""
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        prior, department = random.sample(facility.departments, 2)
         
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         msg_id = f"MSG{int(time.time())}"
-        lab_order_id = f"LAB{int(time.time())}"
         
-        message = f"""MSH|^~\\&|LAB|HOSPITAL_ABC|IRIS|INTEGRATION|{timestamp}||ORU^R01^ORU_R01|{msg_id}|P|2.5
+        message = f"""MSH|^~\\&|HIS|{facility.id}|IRIS|INTEGRATION|{timestamp}||ADT^A02^ADT_A02|{msg_id}|P|2.5
+EVN|A02|{timestamp}
 PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}
-OBR|1||{lab_order_id}||{test_code}||{timestamp}||||||||{doctor['id']}
-OBX|1|NM|{test_code}||{result_value}||{units}||F|||{timestamp}"""
+PV1|1|I|{department['id']}^{random.randint(1, 20)}^{random.randint(1, 4)}|||{prior['id']}^{random.randint(1, 20)}^{random.randint(1, 4)}|{doctor['id']}||||MED||||A|||{doctor['name']}|||||||||||||||||||||||||{patient['admission_date']}"""
         
         return message.strip()
     
+    def generate_adt_a08(self, facility: Optional[FacilityPopulation] = None) -> str:
+        """Generate ADT^A08 (Update Patient Information) message with the full demographic payload"""
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        department = random.choice(facility.departments)
+        
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        msg_id = f"MSG{int(time.time())}"
+        
+        segments = [
+            f"MSH|^~\\&|HIS|{facility.id}|IRIS|INTEGRATION|{timestamp}||ADT^A08^ADT_A01|{msg_id}|P|2.5",
+            f"EVN|A08|{timestamp}",
+            f"PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}|||{patient['address']}||{patient['phone']}",
+            f"PV1|1|I|{department['id']}^{random.randint(1, 20)}^{random.randint(1, 4)}|||{doctor['id']}||||MED||||A|||{doctor['name']}|||||||||||||||||||||||||{patient['admission_date']}"
+        ]
+        allergies = random.sample(ALLERGENS, random.randint(0, 3))
+        for i, (allergen, reaction) in enumerate(allergies, 1):
+            segments.append(f"AL1|{i}|DA|{allergen}|{random.choice(['MI', 'MO', 'SV'])}|{reaction}")
+        plan = INSURANCE_PLANS[patient['insurance']]
+        segments.append(f"IN1|1|{patient['insurance']}|{plan[0]}|{plan[1]}|||||||||||||{patient['name']}|SEL")
+        
+        return '\n'.join(segments)
+    
+    def generate_orm_o01(self, facility: Optional[FacilityPopulation] = None) -> str:
+        """Generate ORM^O01 (Lab Order) message with one to three ordered panels"""
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        msg_id = f"MSG{int(time.time())}"
+        
+        segments = [
+            f"MSH|^~\\&|HIS|{facility.id}|IRIS|INTEGRATION|{timestamp}||ORM^O01^ORM_O01|{msg_id}|P|2.5",
+            f"PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}"
+        ]
+        panels = random.sample(list(LAB_PANELS), random.randint(1, 3))
+        for i, panel in enumerate(panels, 1):
+            order_id = f"ORD{int(time.time())}{i}"
+            priority = random.choice(['R', 'R', 'R', 'S'])
+            segments += [
+                f"ORC|NW|{order_id}|||||^^^{timestamp}^^{priority}||{timestamp}|||{doctor['id']}^{doctor['name']}",
+                f"OBR|{i}|{order_id}||{panel}^{LAB_PANELS[panel][0]}^L|{priority}|{timestamp}||||||||||{doctor['id']}^{doctor['name']}"
+            ]
+        
+        return '\n'.join(segments)
+    
+    def generate_oru_r01(self, facility: Optional[FacilityPopulation] = None) -> str:
+        """Generate ORU^R01 (Lab Results) message with one OBX per analyte of the resulted panel"""
+        facility = facility or self.default_facility()
+        patient = random.choice(facility.patients)
+        doctor = random.choice(facility.doctors)
+        
+        test_code = random.choices(list(LAB_PANEL_WEIGHTS), weights=list(LAB_PANEL_WEIGHTS.values()))[0]
+        panel_name, analytes = LAB_PANELS[test_code]
+        
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        msg_id = f"MSG{int(time.time())}"
+        lab_order_id = f"LAB{int(time.time())}"
+        
+        segments = [
+            f"MSH|^~\\&|LAB|{facility.id}|IRIS|INTEGRATION|{timestamp}||ORU^R01^ORU_R01|{msg_id}|P|2.5",
+            f"PID|1||{patient['id']}^^^HIS^MR||{patient['name']}||{patient['dob']}|{patient['gender']}",
+            f"OBR|1||{lab_order_id}|{test_code}^{panel_name}^L|||{timestamp}||||||||{doctor['id']}|||||||{timestamp}||LAB|F"
+        ]
+        for i, analyte in enumerate(analytes, 1):
+            code, name, units, low, high, _ = analyte
+            value, flag = generate_observation(analyte)
+            segments.append(f"OBX|{i}|NM|{code}^{name}^L||{value}|{units}|{low:g}-{high:g}|{flag}|||F|||{timestamp}")
+        
+        return '\n'.join(segments)
+    
     def send_to_iris(self, message: str) -> bool:
         """Send HL7 message to IRIS database"""
         try:
-            # In a real implementation, this would send to IRIS HL7 service
-            # For demo purposes, we'll simulate the call
-            logger.info(f"Sending HL7 message to IRIS: {message[:100]}...")
-            
-            # Simulate processing time
-            time.sleep(0.1)
+            logger.debug("Sending HL7 message to IRIS: %.100s...", message)
             
-            # Store in Redis for analytics
-            redis_client.lpush('hl7_messages', json.dumps({
-                'message': message,
-                'timestamp': datetime.now().isoformat(),
-                'status': 'PROCESSED'
-            }))
+            if IRIS_HL7_PORT:
+                # Deliver to the IRIS HL7 TCP service and require an accept ACK
+                ack_code = get_mllp_client().send(message)
+                if ack_code not in ('AA', 'CA'):
+                    logger.error(f"IRIS rejected message with ACK code {ack_code}")
+                    return False
+            elif IRIS_LATENCY:
+                # No IRIS endpoint configured: simulate its processing time
+                time.sleep(IRIS_LATENCY)
             
             return True
         except Exception as e:
             logger.error(f"Error sending to IRIS: {e}")
             return False
     
-    def send_to_redis(self, message: str, message_type: str) -> bool:
-        """Send message to Redis queue"""
+    def send_to_redis(self, message: str, message_type: str, trace: Optional[Dict] = None,
+                      facility_id: Optional[str] = None, processed: bool = False) -> bool:
+        """Send message to its facility's queue partition, storing it and updating the /messages indexes
+
+        With processed set (IRIS accepted the message), a PROCESSED receipt is queued ahead of the envelope.
+        """
         try:
+            facility_id = facility_id or self.default_facility().id
+            with self.sequence_lock:
+                now = datetime.now()
+                self.index_sequence = (self.index_sequence + 1) % 1000
+                score = time_score(now) + self.index_sequence
+            message_id = uuid.uuid4().hex[:16]
+            patient_id = extract_patient_id(message)
+            trace = dict(trace or {}, enqueued=time.monotonic())
             message_data = {
+                'id': message_id,
                 'message_type': message_type,
+                'facility': facility_id,
+                'patient_id': patient_id,
                 'content': message,
-                'timestamp': datetime.now().isoformat(),
-                'status': 'PENDING'
+                'timestamp': now.isoformat(),
+                'status': 'PENDING',
+                'trace': trace
             }
+            payload = json.dumps(message_data)
+            
+            keys = [index_key(), index_key(message_type),
+                    index_key(facility=facility_id), index_key(message_type, facility=facility_id)]
+            if patient_id:
+                keys += [index_key(patient_id=patient_id, facility=facility_id),
+                         index_key(message_type, patient_id, facility_id)]
+            cutoff = score - MESSAGE_RETENTION * 1000 * 1000
+            partition = partition_for(facility_id, patient_id or message_id)
+            commands = [
+                ('lpush', (queue_key(partition), payload), {}),
+                ('set', (message_key(message_id), payload), {'ex': MESSAGE_RETENTION})
+            ]
+            if processed:
+                receipt = json.dumps({
+                    'id': message_id,
+                    'facility': facility_id,
+                    'message': message,
+                    'timestamp': now.isoformat(),
+                    'status': 'PROCESSED'
+                })
+                commands.insert(0, ('lpush', (queue_key(partition), receipt), {}))
+            for key in keys:
+                commands += [
+                    ('zadd', (key, {message_id: score}), {}),
+                    # Trim entries past retention; their bodies have already expired
+                    ('zremrangebyscore', (key, '-inf', cutoff), {}),
+                    ('expire', (key, MESSAGE_RETENTION), {})
+                ]
             
-            redis_client.lpush('hl7_messages', json.dumps(message_data))
+            # One round trip; buffered locally and replayed later if Redis is unavailable
+            get_redis_client().write_many(commands)
+            self.trace_stats.record(trace)
             return True
         except Exception as e:
             logger.error(f"Error sending to Redis: {e}")
             return False
     
-    async def run_simulation(self, config: SimulationConfig):
-        """Run HL7 message simulation"""
+    def prepare_message(self, msg_type: str, facility: FacilityPopulation) -> tuple:
+        """Generate one message for a facility, recording its size and generation time"""
+        started = time.monotonic()
+        message = self.message_generators[msg_type](facility)
+        trace = {'generated': time.monotonic()}
+        size = len(message.encode('utf-8'))
+        stats = self.type_stats.setdefault(msg_type, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += size
+        stats[2] = max(stats[2], size)
+        self.trace_stats.observe('generate', trace['generated'] - started)
+        return message, trace
+    
+    def record_delivery(self, msg_type: str, facility: FacilityPopulation, delivered: bool) -> bool:
+        """Count a delivered or failed message, logging a sample of successes"""
+        if delivered:
+            self.message_count += 1
+            facility.message_count += 1
+            if self.message_count % LOG_SAMPLE_RATE == 0:
+                logger.info(
+                    f"Generated {msg_type} message #{self.message_count}",
+                    extra={'message_type': msg_type, 'facility': facility.id,
+                           'message_count': self.message_count, 'sample_rate': LOG_SAMPLE_RATE}
+                )
+            return True
+        
+        self.error_count += 1
+        facility.error_count += 1
+        logger.error(f"Failed to send {msg_type} message", extra={'message_type': msg_type, 'facility': facility.id})
+        return False
+    
+    def deliver(self, message: str, msg_type: str, trace: Dict, facility_id: str) -> bool:
+        """Send a generated message to IRIS, then queue and store it in Redis (blocking)"""
+        iris_success = self.send_to_iris(message)
+        redis_success = self.send_to_redis(message, msg_type, trace, facility_id, iris_success)
+        return iris_success and redis_success
+    
+    def emit_message(self, msg_type: str, facility: Optional[FacilityPopulation] = None) -> bool:
+        """Generate one message for a facility and send it to IRIS and Redis, blocking until both are done"""
+        facility = facility or self.default_facility()
+        message, trace = self.prepare_message(msg_type, facility)
+        return self.record_delivery(msg_type, facility, self.deliver(message, msg_type, trace, facility.id))
+    
+    async def emit_message_async(self, msg_type: str, facility: Optional[FacilityPopulation] = None) -> bool:
+        """emit_message for the event loop: the IRIS round trip and Redis writes run in a worker thread"""
+        facility = facility or self.default_facility()
+        message, trace = self.prepare_message(msg_type, facility)
+        delivered = await asyncio.to_thread(self.deliver, message, msg_type, trace, facility.id)
+        return self.record_delivery(msg_type, facility, delivered)
+    
+    async def run_simulation(self, config: SimulationConfig, checkpoint: Optional[Dict] = None):
+        """Run HL7 message simulation, or continue the one a checkpoint describes"""
         self.is_running = True
-        self.start_time = time.time()
-        self.message_count = 0
-        self.error_count = 0
+        self.stop_event = asyncio.Event()
+        self.stop_reason = 'stopped'
+        if not self.is_ready and self.warmup_task is not None:
+            await self.warmup_task
+        if config.facilities:
+            # Facilities new to this run get a population first
+            await asyncio.to_thread(self.initialize_data, config.doctor_count, config.patient_count,
+                                    [facility.dict() for facility in config.facilities])
+            rates = {facility.id: facility.message_rate or config.message_rate for facility in config.facilities}
+        else:
+            rates = {facility.id: facility.message_rate or config.message_rate for facility in self.facilities.values()}
+        self.active_facilities = list(rates)
+        self.run_config = config
+        if checkpoint:
+            self.restore_checkpoint(checkpoint)
+        else:
+            self.run_id = uuid.uuid4().hex[:12]
+            self.elapsed_offset = 0.0
+            self.message_count = 0
+            self.error_count = 0
+            for facility_id in rates:
+                self.facilities[facility_id].message_count = 0
+                self.facilities[facility_id].error_count = 0
+        self.leg_started = time.time()
+        self.leg_stopped = None
+        self.start_time = self.leg_started - self.elapsed_offset
         
-        logger.info(f"Starting HL7 simulation: {config.message_rate} msg/min for {config.duration}s")
+        mix = self.validate_message_mix(config.message_mix) if config.message_mix else self.message_mix
+        logger.info(f"{'Resuming' if checkpoint else 'Starting'} HL7 simulation {self.run_id} at "
+                    f"{self.elapsed_offset:.0f}/{config.duration}s: rates {rates} msg/min, mix {mix}")
         
-        message_types = ['ADT^A01', 'ADT^A03', 'ORU^R01']
-        message_generators = {
-            'ADT^A01': self.generate_adt_a01,
-            'ADT^A03': self.generate_adt_a03,
-            'ORU^R01': self.generate_oru_r01
-        }
+        await self.save_population()
+        await self.checkpoint('running')
+        checkpointer = asyncio.create_task(self.checkpoint_loop())
+        
+        end_time = time.time() + max(0.0, config.duration - self.elapsed_offset)
+        # Each facility paces its own stream
+        await asyncio.gather(*(
+            self.run_facility(self.facilities[facility_id], rate, mix, end_time)
+            for facility_id, rate in rates.items()
+        ))
         
-        end_time = time.time() + config.duration
-        interval = 60.0 / config.message_rate  # seconds between messages
+        checkpointer.cancel()
+        self.leg_stopped = time.time()
+        self.is_running = False
+        status = 'completed' if self.elapsed() >= config.duration else self.stop_reason
+        pending = await self.flush_pending()
+        await self.checkpoint(status)
+        logger.info(f"Simulation {status}: {self.message_count} messages sent, {self.error_count} errors, "
+                    f"{pending} writes still buffered")
+    
+    def is_busy(self) -> bool:
+        """A run is in progress or still draining after a stop"""
+        return self.is_running or (self.run_task is not None and not self.run_task.done())
+    
+    async def resume(self, checkpoint: Dict):
+        """Continue a checkpointed simulation where it left off"""
+        await self.run_simulation(SimulationConfig(**checkpoint['config']), checkpoint)
+    
+    async def pause(self, seconds: float):
+        """Sleep between messages, waking early when the run is stopped"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+    
+    def elapsed(self) -> float:
+        """Simulated seconds so far, across resumed legs"""
+        if self.leg_started is None:
+            return self.elapsed_offset
+        return self.elapsed_offset + ((self.leg_stopped or time.time()) - self.leg_started)
+    
+    async def stop(self, reason: str = 'stopped', timeout: float = DRAIN_TIMEOUT) -> Dict:
+        """Stop the run gracefully: let in-flight sends finish, flush buffered writes, write a final checkpoint"""
+        task = self.run_task
+        if task is None or task.done():
+            self.is_running = False
+            return {"stopped": False}
+        self.stop_reason = reason
+        self.is_running = False
+        if self.stop_event is not None:
+            self.stop_event.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Simulation {self.run_id} did not drain within {timeout}s")
+            return {"stopped": True, "drained": False, "run_id": self.run_id}
+        return {
+            "stopped": True,
+            "drained": True,
+            "run_id": self.run_id,
+            "message_count": self.message_count,
+            "elapsed": round(self.elapsed(), 1),
+            "pending_writes": len(get_redis_client().spill)
+        }
+    
+    async def flush_pending(self) -> int:
+        """Replay writes buffered during a Redis outage; returns how many are still buffered"""
+        client = get_redis_client()
+        if client.spill:
+            try:
+                await asyncio.to_thread(client.drain)
+            except Exception as e:
+                logger.error(f"Error flushing buffered Redis writes: {e}")
+        return len(client.spill)
+    
+    def snapshot(self, status: str) -> Dict:
+        """Capture the run state on the event loop, between message generations
+
+        A message whose send is still running in a worker thread counts as generated but not yet delivered.
+        """
+        version, internal, gauss = random.getstate()
+        return {
+            "version": CHECKPOINT_VERSION,
+            "run_id": self.run_id,
+            "status": status,
+            "saved_at": datetime.now().isoformat(),
+            "config": self.run_config.dict(),
+            "elapsed": round(self.elapsed(), 3),
+            "message_count": self.message_count,
+            "error_count": self.error_count,
+            "facilities": {
+                facility_id: {"message_count": self.facilities[facility_id].message_count,
+                              "error_count": self.facilities[facility_id].error_count}
+                for facility_id in self.active_facilities
+            },
+            "type_stats": self.type_stats,
+            "index_sequence": self.index_sequence,
+            "rng_state": [version, list(internal), gauss],
+            # Writes still waiting for Redis only matter once the run has stopped
+            "pending_writes": [] if status == 'running' else self.pending_writes()
+        }
+    
+    def pending_writes(self) -> List[list]:
+        """Copy of the Redis spill buffer; a send still finishing in a worker thread may append to it"""
+        client = get_redis_client()
+        with client.spill_lock:
+            return [list(command) for command in client.spill]
+    
+    def restore_checkpoint(self, checkpoint: Dict):
+        """Bring back counters, progress, RNG state and unflushed writes from a checkpoint"""
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')}")
+        self.run_id = checkpoint['run_id']
+        self.elapsed_offset = checkpoint['elapsed']
+        self.message_count = checkpoint['message_count']
+        self.error_count = checkpoint['error_count']
+        for facility_id, counts in checkpoint['facilities'].items():
+            if facility_id in self.facilities:
+                self.facilities[facility_id].message_count = counts['message_count']
+                self.facilities[facility_id].error_count = counts['error_count']
+        self.type_stats = checkpoint['type_stats']
+        self.index_sequence = checkpoint['index_sequence']
+        version, internal, gauss = checkpoint['rng_state']
+        random.setstate((version, tuple(internal), gauss))
+        client = get_redis_client()
+        if not client.spill:
+            # A fresh process: re-buffer the writes the previous one could not flush
+            for method, args, kwargs in checkpoint.get('pending_writes', []):
+                client.buffer(method, tuple(args), kwargs)
+        self.checkpoint_stats["resumed_from"] = {"run_id": self.run_id, "status": checkpoint['status'],
+                                                 "elapsed": self.elapsed_offset, "saved_at": checkpoint['saved_at']}
+    
+    async def checkpoint(self, status: str):
+        """Write a checkpoint in a worker thread; failures are logged and counted, never raised"""
+        if not CHECKPOINT_PATH or self.run_config is None:
+            return
+        data = self.snapshot(status)
+        started = time.perf_counter()
+        try:
+            size = await asyncio.to_thread(write_json_atomic, CHECKPOINT_PATH, data)
+        except Exception as e:
+            self.checkpoint_stats["failed"] += 1
+            logger.error(f"Error writing checkpoint: {e}")
+            return
+        self.checkpoint_stats.update(written=self.checkpoint_stats["written"] + 1, last_status=status,
+                                     last_at=data["saved_at"], last_bytes=size,
+                                     last_ms=round((time.perf_counter() - started) * 1000, 2))
+    
+    async def checkpoint_loop(self):
+        """Checkpoint the running simulation every CHECKPOINT_INTERVAL seconds"""
+        if CHECKPOINT_INTERVAL <= 0:
+            return
+        while self.is_running:
+            await self.pause(CHECKPOINT_INTERVAL)
+            if self.is_running:
+                await self.checkpoint('running')
+    
+    async def save_population(self):
+        """Write the active facilities' populations once per run, so a resume uses the same patients"""
+        if not CHECKPOINT_PATH:
+            return
+        populations = {
+            facility_id: {
+                "message_rate": self.facilities[facility_id].message_rate,
+                "departments": self.facilities[facility_id].departments,
+                "doctors": self.facilities[facility_id].doctors,
+                "patients": self.facilities[facility_id].patients
+            }
+            for facility_id in self.active_facilities
+        }
+        try:
+            await asyncio.to_thread(write_json_atomic, population_path(), populations)
+        except Exception as e:
+            logger.error(f"Error writing population checkpoint: {e}")
+    
+    def restore_population(self, populations: Dict):
+        for facility_id, data in populations.items():
+            facility = FacilityPopulation(facility_id, data.get('message_rate'))
+            facility.departments = data['departments']
+            facility.doctors = data['doctors']
+            facility.patients = data['patients']
+            self.facilities[facility_id] = facility
+        logger.info(f"Restored populations of {', '.join(populations)} from checkpoint")
+    
+    async def run_facility(self, facility: FacilityPopulation, message_rate: int, mix: Dict[str, float],
+                           end_time: float):
+        """Emit one facility's messages at its own rate until the run ends"""
+        interval = 60.0 / message_rate  # seconds between messages
         
         while self.is_running and time.time() < end_time:
             try:
-                # Choose random message type
-                msg_type = random.choice(message_types)
-                generator = message_generators[msg_type]
-                
-                # Generate message
-                message = generator()
-                
-                # Send to systems
-                iris_success = self.send_to_iris(message)
-                redis_success = self.send_to_redis(message, msg_type)
-                
-                if iris_success and redis_success:
-                    self.message_count += 1
-                    logger.info(f"Generated {msg_type} message #{self.message_count}")
-                else:
-                    self.error_count += 1
-                    logger.error(f"Failed to send {msg_type} message")
+                # Choose the message type by its weight in the traffic mix
+                msg_type = self.choose_message_types(1, mix)[0]
+                await self.emit_message_async(msg_type, facility)
                 
                 # Wait for next message
-                await asyncio.sleep(interval)
+                await self.pause(interval)
                 
             except Exception as e:
-                logger.error(f"Error in simulation: {e}")
+                logger.error(f"Error in simulation for {facility.id}: {e}")
                 self.error_count += 1
-                await asyncio.sleep(1)
-        
-        self.is_running = False
-        logger.info(f"Simulation completed: {self.message_count} messages sent, {self.error_count} errors")
+                facility.error_count += 1
+                await self.pause(1)
 
 # Initialize simulator
 simulator = HL7Simulator()
 
+@app.on_event("startup")
+async def start_warmup():
+    """Build the simulator population in the background after the server starts"""
+    simulator.warmup_task = asyncio.create_task(simulator.warm_up())
+
+@app.on_event("shutdown")
+async def drain_simulation():
+    """On SIGTERM, finish in-flight sends, flush buffered writes and checkpoint the run as interrupted"""
+    result = await simulator.stop('interrupted')
+    if result["stopped"]:
+        logger.info(f"Drained simulation on shutdown: {result}")
+
+def require_ready():
+    """Reject requests that need the population before warm-up has finished"""
+    if not simulator.is_ready:
+        raise HTTPException(status_code=503, detail="Simulator is warming up")
+
+# Opt-in profiling surface (sampling profiler, tracemalloc, event-loop lag) under /debug
+if PROFILING_ENABLED:
+    app.include_router(create_profiling_router())
+    memory_tracker.register_probe("simulator", lambda: {
+        "facilities": len(simulator.facilities),
+        "patients": sum(len(facility.patients) for facility in simulator.facilities.values()),
+        "doctors": sum(len(facility.doctors) for facility in simulator.facilities.values()),
+        "message_types": len(simulator.type_stats),
+        "redis_spill_buffer": len(get_redis_client().spill)
+    })
+
 # API Endpoints
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint reporting population warm-up progress"""
+    content = {
+        "ready": simulator.is_ready,
+        "progress": simulator.warmup_progress,
+        "total": simulator.warmup_total,
+        "warmup_seconds": simulator.warmup_seconds
+    }
+    return JSONResponse(content=content, status_code=200 if simulator.is_ready else 503)
+
 @app.get("/status")
 async def get_status():
     """Get simulation status"""
@@ -268,43 +1059,141 @@ async def get_status():
         "message_count": simulator.message_count,
         "error_count": simulator.error_count,
         "start_time": simulator.start_time,
-        "uptime": time.time() - simulator.start_time if simulator.start_time else 0
+        "uptime": time.time() - simulator.start_time if simulator.start_time else 0,
+        "run_id": simulator.run_id,
+        "elapsed": round(simulator.elapsed(), 1),
+        "duration": simulator.run_config.duration if simulator.run_config else None,
+        "checkpoint": simulator.checkpoint_stats,
+        "message_mix": simulator.message_mix,
+        "active_facilities": simulator.active_facilities,
+        "facilities": {facility_id: facility.get_stats() for facility_id, facility in simulator.facilities.items()},
+        "queue_partitions": QUEUE_PARTITIONS,
+        "message_types": {
+            msg_type: {"count": count, "avg_bytes": round(total / count, 1), "max_bytes": largest}
+            for msg_type, (count, total, largest) in simulator.type_stats.items()
+        },
+        "latency": simulator.trace_stats.to_dict(),
+        "redis": get_redis_client().get_stats()
     }
 
 @app.post("/start")
 async def start_simulation(config: SimulationConfig):
     """Start HL7 message simulation"""
-    if simulator.is_running:
+    if simulator.is_busy():
         raise HTTPException(status_code=400, detail="Simulation already running")
+    try:
+        if config.message_mix:
+            simulator.validate_message_mix(config.message_mix)
+        if config.facilities is not None:
+            simulator.validate_facilities(config.facilities)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Start simulation in background
-    asyncio.create_task(simulator.run_simulation(config))
+    simulator.run_task = asyncio.create_task(simulator.run_simulation(config))
     
     return {"message": "Simulation started", "config": config.dict()}
 
 @app.post("/stop")
 async def stop_simulation():
-    """Stop HL7 message simulation"""
-    simulator.is_running = False
-    return {"message": "Simulation stopped"}
+    """Stop HL7 message simulation, draining in-flight work and writing a resumable checkpoint"""
+    result = await simulator.stop('stopped')
+    return {"message": "Simulation stopped", **result}
+
+@app.post("/resume")
+async def resume_simulation():
+    """Continue the last checkpointed simulation where it left off"""
+    if simulator.is_busy():
+        raise HTTPException(status_code=400, detail="Simulation already running")
+    checkpoint = await asyncio.to_thread(read_json, CHECKPOINT_PATH)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="No checkpoint to resume from")
+    if checkpoint.get('status') not in RESUMABLE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Simulation {checkpoint.get('run_id')} is {checkpoint.get('status')}")
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise HTTPException(status_code=409, detail=f"Unsupported checkpoint version {checkpoint.get('version')}")
+    
+    simulator.run_task = asyncio.create_task(simulator.resume(checkpoint))
+    return {
+        "message": "Simulation resumed",
+        "run_id": checkpoint['run_id'],
+        "elapsed": checkpoint['elapsed'],
+        "remaining": max(0, checkpoint['config']['duration'] - checkpoint['elapsed']),
+        "message_count": checkpoint['message_count']
+    }
+
+@app.get("/checkpoint")
+async def get_checkpoint():
+    """Summary of the last written checkpoint"""
+    checkpoint = await asyncio.to_thread(read_json, CHECKPOINT_PATH)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="No checkpoint written")
+    summary = {
+        key: checkpoint.get(key)
+        for key in ('run_id', 'status', 'saved_at', 'elapsed', 'message_count', 'error_count', 'facilities', 'config')
+    }
+    summary["pending_writes"] = len(checkpoint.get('pending_writes', []))
+    return summary
 
 @app.get("/messages")
-async def get_recent_messages(limit: int = 10):
-    """Get recent HL7 messages"""
+async def get_recent_messages(
+    limit: int = Query(10, ge=1, le=1000),
+    message_type: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    facility: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None
+):
+    """Get recent HL7 messages, newest first, filtered and paged through the secondary indexes
+    
+    The body is the list of messages, as before paging was added. When more pages follow,
+    the X-Next-Cursor header carries the value to pass as `cursor` for the next one. Patient
+    IDs are per facility, so a patient filter without `facility` searches every facility.
+    """
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor is not None:
+        max_score = f"({cursor}"
+    elif until is not None:
+        max_score = time_score(until) + 999
+    else:
+        max_score = '+inf'
+    min_score = time_score(since) if since is not None else '-inf'
+    if patient_id and not facility:
+        keys = [index_key(message_type, patient_id, facility_id) for facility_id in simulator.facilities]
+    else:
+        keys = [index_key(message_type, patient_id, facility)]
+    
+    def read_page() -> tuple:
+        client = get_redis_client()
+        entries = []
+        for key in keys:
+            entries += client.zrevrangebyscore(key, max_score, min_score, start=0, num=limit, withscores=True)
+        # Scores are unique across facilities (enqueue time plus a shared sequence), so the merge pages cleanly
+        entries = sorted(entries, key=lambda entry: entry[1], reverse=True)[:limit]
+        bodies = client.mget([message_key(message_id) for message_id, _ in entries]) if entries else []
+        return entries, bodies
+    
     try:
-        messages = redis_client.lrange('hl7_messages', 0, limit - 1)
-        return [json.loads(msg) for msg in messages]
+        # Retries and backoff block, so the Redis reads run in a worker thread
+        entries, bodies = await asyncio.to_thread(read_page)
+        messages = [json.loads(body) for body in bodies if body]
+        headers = {"X-Next-Cursor": str(int(entries[-1][1]))} if len(entries) == limit else {}
+        return JSONResponse(messages, headers=headers)
+    except RedisUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/test")
-async def test_message_generation():
+async def test_message_generation(facility: Optional[str] = None):
     """Generate test HL7 messages"""
-    messages = {
-        "ADT^A01": simulator.generate_adt_a01(),
-        "ADT^A03": simulator.generate_adt_a03(),
-        "ORU^R01": simulator.generate_oru_r01()
-    }
+    require_ready()
+    if facility is not None and facility not in simulator.facilities:
+        raise HTTPException(status_code=404, detail=f"Unknown facility: {facility}")
+    population = simulator.facilities[facility] if facility else None
+    messages = {msg_type: generate(population) for msg_type, generate in simulator.message_generators.items()}
     return messages
 
 if __name__ == "__main__":
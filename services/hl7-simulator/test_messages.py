@@ -4,7 +4,6 @@ Test script for HL7 Message Simulator
 """
 
 import asyncio
-import json
 import requests
 import time
 
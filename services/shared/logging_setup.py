@@ -0,0 +1,132 @@
+"""
+Logging setup shared by the hospital demo services
+Single-line JSON records, a per-call-site rate limit, and a queue listener so
+file and console I/O happen off the event loop
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Configuration
+LOG_DIR = os.getenv('LOG_DIR', '/app/logs')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' or 'text'
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON, including any `extra` fields"""
+
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Formatted before the record was queued (see RecordQueueHandler)
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site: at most `rate` records/s (bursts of `burst`), counting the rest"""
+
+    def __init__(self, rate: float = 10.0, burst: int = 20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # (pathname, lineno) -> [tokens, last_refill, suppressed]
+        self.lock = threading.Lock()  # records arrive from the event loop and worker threads
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class RecordQueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback apart from the message
+
+    The stock prepare() folds exc_info into the message text and clears it, so the
+    listener's formatter could no longer write the exception on its own; this formats
+    it into exc_text instead, which both the JSON and text formatters pick up.
+    """
+
+    exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_log_listener = None
+
+def configure_logging(log_file: str, use_queue: bool = True) -> Optional[QueueListener]:
+    """Route logging through a queue so file and console I/O happen off the event loop"""
+    global _log_listener
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.FileHandler(os.path.join(LOG_DIR, log_file)), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+    if not use_queue:
+        for handler in handlers:
+            handler.addFilter(RateLimitFilter())
+            root.addHandler(handler)
+        return None
+
+    queue_handler = RecordQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RateLimitFilter())
+    root.addHandler(queue_handler)
+    _log_listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    return _log_listener
+
+def stop_logging():
+    """Flush queued log records and stop the listener thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
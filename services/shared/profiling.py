@@ -0,0 +1,387 @@
+"""
+Opt-in profiling endpoints for the hospital demo services
+A low-rate sampling profiler that produces flamegraph-compatible collapsed stacks,
+tracemalloc snapshots and diffs, and an event-loop lag monitor with a watchdog that
+captures what the loop was running while it was blocked
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '10'))  # sampling period (100 Hz)
+PROFILE_MAX_DURATION = float(os.getenv('PROFILE_MAX_DURATION', '600'))  # seconds before a run stops itself
+PROFILE_MAX_STACKS = int(os.getenv('PROFILE_MAX_STACKS', '20000'))  # distinct stacks kept per run
+PROFILE_MAX_DEPTH = int(os.getenv('PROFILE_MAX_DEPTH', '64'))
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.5'))  # seconds between loop heartbeats
+LOOP_LAG_THRESHOLD_MS = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '100'))  # lag that counts as blocked
+LOOP_LAG_WINDOW = int(os.getenv('LOOP_LAG_WINDOW', '600'))  # recent lag samples kept for percentiles
+
+# Leaf frames (file, function) that only mean "waiting for work"; dropped unless idle stacks are
+# requested. Matched on the file too, so application functions named get or wait still show up.
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),  # event loop and socketserver waiting for I/O
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('handlers.py', 'dequeue'),  # logging QueueListener
+    ('thread.py', '_worker'),  # idle executor thread blocked in its work queue's C get()
+    ('socket.py', 'accept')
+}
+# Helper threads started here, never sampled
+PROFILER_THREADS = {'sampling-profiler', 'loop-lag-watchdog'}
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse_stack(frame, thread_name: str, max_depth: int = PROFILE_MAX_DEPTH) -> str:
+    """Root-first 'thread;frame;frame' string for one thread's current stack"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ';'.join(reversed(labels))
+
+def is_idle(stack: str) -> bool:
+    name, _, location = stack.rsplit(';', 1)[-1].partition(' (')
+    return (location.split(':', 1)[0], name) in IDLE_FRAMES
+
+def format_collapsed(stacks: Counter, include_idle: bool = False, thread: Optional[str] = None) -> str:
+    """Collapsed stack lines ('frame;frame count'), the input format of flamegraph.pl and speedscope"""
+    lines = []
+    for stack, count in stacks.most_common():
+        if not include_idle and is_idle(stack):
+            continue
+        if thread is not None and not stack.startswith(f"{thread};"):
+            continue
+        lines.append(f"{stack} {count}")
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+class SamplingProfiler:
+    """Samples every thread's Python stack from a background thread at a fixed interval
+
+    Cost is one sys._current_frames() walk per sample and nothing between runs,
+    so a 10 ms interval stays around a percent of one core.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.running = False
+        self.thread = None
+        self.interval = PROFILE_INTERVAL_MS / 1000
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.sample_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def start(self, interval_ms: float = PROFILE_INTERVAL_MS, duration: Optional[float] = None):
+        with self.lock:
+            if self.running:
+                raise RuntimeError("Profiler already running")
+            self.stacks = Counter()
+            self.samples = self.dropped = 0
+            self.sample_seconds = 0.0
+            self.interval = max(1.0, interval_ms) / 1000
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.running = True
+        deadline = time.monotonic() + min(duration or PROFILE_MAX_DURATION, PROFILE_MAX_DURATION)
+        self.thread = threading.Thread(target=self.run, args=(deadline,), name="sampling-profiler", daemon=True)
+        self.thread.start()
+        logger.info(f"Sampling profiler started at {1 / self.interval:.0f} Hz")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def run(self, deadline: float):
+        own_id = threading.get_ident()
+        next_sample = time.monotonic()
+        while self.running and time.monotonic() < deadline:
+            started = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, f"thread-{thread_id}")
+                if thread_id == own_id or name in PROFILER_THREADS:
+                    continue
+                stack = collapse_stack(frame, name)
+                if stack in self.stacks or len(self.stacks) < PROFILE_MAX_STACKS:
+                    self.stacks[stack] += 1
+                else:
+                    self.dropped += 1
+            self.samples += 1
+            self.sample_seconds += time.perf_counter() - started
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+        self.running = False
+        self.stopped_at = time.time()
+        logger.info(f"Sampling profiler stopped after {self.samples} samples")
+
+    def get_stats(self) -> Dict:
+        elapsed = (self.stopped_at or time.time()) - self.started_at if self.started_at else 0
+        return {
+            "running": self.running,
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "dropped_samples": self.dropped,
+            "started_at": self.started_at,
+            "elapsed_seconds": round(elapsed, 1),
+            # Share of wall time spent taking samples: the profiler's own overhead
+            "overhead_pct": round(self.sample_seconds / elapsed * 100, 3) if elapsed else None
+        }
+
+class MemoryTracker:
+    """tracemalloc snapshots: top allocation sites now, and growth against a baseline"""
+
+    FILTERS = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>')
+    ]
+
+    def __init__(self):
+        self.baseline = None
+        self.baseline_time = None
+        self.probes: Dict[str, Callable[[], Dict]] = {}
+
+    def register_probe(self, name: str, probe: Callable[[], Dict]):
+        """Add a cheap service-level size report (e.g. cache entries) to every snapshot"""
+        self.probes[name] = probe
+
+    def run_probes(self) -> Dict:
+        results = {}
+        for name, probe in self.probes.items():
+            try:
+                results[name] = probe()
+            except Exception as e:
+                results[name] = {"error": str(e)}
+        return results
+
+    def start(self, frames: int = 1):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(max(1, frames))
+        self.baseline = None
+        logger.info(f"tracemalloc started with {frames} frame(s) per allocation")
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is not running; POST /debug/memory/start first")
+        return tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+
+    def set_baseline(self) -> tracemalloc.Snapshot:
+        self.baseline = self.snapshot()
+        self.baseline_time = time.time()
+        return self.baseline
+
+    def top(self, limit: int, group_by: str) -> List[Dict]:
+        stats = self.snapshot().statistics(group_by)
+        return [{"site": format_trace(stat.traceback), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in stats[:limit]]
+
+    def diff(self, limit: int, group_by: str) -> List[Dict]:
+        if self.baseline is None:
+            raise RuntimeError("No baseline snapshot; POST /debug/memory/snapshot first")
+        stats = self.snapshot().compare_to(self.baseline, group_by)
+        return [{"site": format_trace(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                 "size_diff_kb": round(stat.size_diff / 1024, 1), "count": stat.count, "count_diff": stat.count_diff}
+                for stat in stats[:limit]]
+
+    def get_stats(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "tracemalloc_overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "baseline_time": self.baseline_time if self.baseline is not None else None,
+            "probes": self.run_probes()
+        }
+
+def format_trace(traceback: tracemalloc.Traceback) -> str:
+    return ' <- '.join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in traceback)
+
+class LoopLagMonitor:
+    """Measures event-loop lag from a heartbeat coroutine, with a watchdog thread for blocked loops
+
+    The coroutine sleeps for `interval` and records how late it woke up. The watchdog
+    samples the loop thread's stack whenever the heartbeat is older than the threshold,
+    so a blocking call shows up by name in `blocked_stacks` even while it is still running.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.lags = deque(maxlen=LOOP_LAG_WINDOW)
+        self.max_lag = 0.0
+        self.blocked_count = 0
+        self.blocked_stacks = Counter()
+        self.heartbeat = None
+        self.loop_thread_id = None
+        self.running = False
+
+    async def run(self):
+        self.running = True
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        threading.Thread(target=self.watchdog, name="loop-lag-watchdog", daemon=True).start()
+        while self.running:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.blocked_count += 1
+            self.heartbeat = now
+
+    def watchdog(self):
+        while self.running:
+            time.sleep(self.threshold / 2)
+            if time.monotonic() - self.heartbeat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None and len(self.blocked_stacks) < PROFILE_MAX_STACKS:
+                    self.blocked_stacks[collapse_stack(frame, "event-loop")] += 1
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self) -> Dict:
+        lags = sorted(self.lags)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(pct / 100 * len(lags)))] * 1000, 2)
+
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": len(lags),
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "blocked_count": self.blocked_count,
+            "blocked_stacks": [{"stack": stack, "samples": count} for stack, count in self.blocked_stacks.most_common(10)]
+        }
+
+# One of each per process
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
+loop_monitor = LoopLagMonitor()
+
+def create_profiling_router() -> APIRouter:
+    """Routes under /debug: sampling profiler, tracemalloc snapshots and event-loop lag"""
+    router = APIRouter(prefix="/debug", tags=["profiling"])
+
+    @router.on_event("startup")
+    async def start_loop_monitor():
+        asyncio.create_task(loop_monitor.run())
+
+    @router.on_event("shutdown")
+    async def stop_monitors():
+        loop_monitor.stop()
+        profiler.stop()
+
+    @router.get("/profile")
+    async def profile_status():
+        """Sampling profiler state"""
+        return profiler.get_stats()
+
+    @router.post("/profile/start")
+    async def start_profile(interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1, le=1000),
+                            duration: Optional[float] = Query(None, gt=0)):
+        """Start sampling every thread's stack; stops by itself after `duration` seconds"""
+        try:
+            profiler.start(interval_ms, duration)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return profiler.get_stats()
+
+    @router.post("/profile/stop", response_class=PlainTextResponse)
+    async def stop_profile(idle: bool = False, thread: Optional[str] = None):
+        """Stop sampling and return the collapsed stacks"""
+        await asyncio.to_thread(profiler.stop)
+        return format_collapsed(profiler.stacks, idle, thread)
+
+    @router.get("/profile/collapsed", response_class=PlainTextResponse)
+    async def collapsed_stacks(idle: bool = False, thread: Optional[str] = None):
+        """Collapsed stacks of the current or last run (pipe into flamegraph.pl or open in speedscope)"""
+        return format_collapsed(profiler.stacks.copy(), idle, thread)
+
+    @router.get("/memory")
+    async def memory_status():
+        """tracemalloc state and the service's own size probes"""
+        return memory_tracker.get_stats()
+
+    @router.post("/memory/start")
+    async def start_memory(frames: int = Query(1, ge=1, le=32)):
+        """Start tracing allocations (costs memory and CPU while on; stop when done)"""
+        memory_tracker.start(frames)
+        return memory_tracker.get_stats()
+
+    @router.post("/memory/stop")
+    async def stop_memory():
+        memory_tracker.stop()
+        return memory_tracker.get_stats()
+
+    @router.post("/memory/snapshot")
+    async def memory_snapshot(limit: int = Query(20, ge=1, le=500), group_by: str = Query('lineno', pattern='^(lineno|filename|traceback)$')):
+        """Take a baseline snapshot for later diffs and return its top allocation sites"""
+        try:
+            await asyncio.to_thread(memory_tracker.set_baseline)
+            top = await asyncio.to_thread(memory_tracker.top, limit, group_by)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"top": top, **memory_tracker.get_stats()}
+
+    @router.get("/memory/top")
+    async def memory_top(limit: int = Query(20, ge=1, le=500), group_by: str = Query('lineno', pattern='^(lineno|filename|traceback)$')):
+        """Largest allocation sites right now"""
+        try:
+            return {"top": await asyncio.to_thread(memory_tracker.top, limit, group_by)}
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @router.get("/memory/diff")
+    async def memory_diff(limit: int = Query(20, ge=1, le=500), group_by: str = Query('lineno', pattern='^(lineno|filename|traceback)$')):
+        """Allocation sites that grew most since the baseline snapshot"""
+        try:
+            return {"diff": await asyncio.to_thread(memory_tracker.diff, limit, group_by),
+                    "probes": memory_tracker.run_probes()}
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @router.get("/loop")
+    async def loop_lag():
+        """Event-loop lag percentiles and the stacks that blocked the loop"""
+        return loop_monitor.get_stats()
+
+    return router
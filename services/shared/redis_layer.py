@@ -0,0 +1,297 @@
+"""
+Shared Redis access layer for the hospital demo services
+Blocking connection pool with timeouts, jittered exponential retries,
+a circuit breaker and a local spill buffer for writes during outages.
+Writes are only retried or buffered when they failed before reaching Redis,
+so a write the server may already have applied is never sent twice
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
+REDIS_DB = int(os.getenv('REDIS_DB', '0'))
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', '20'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '2'))  # wait for a free pooled connection
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '5'))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', '2'))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+REDIS_RETRY_ATTEMPTS = int(os.getenv('REDIS_RETRY_ATTEMPTS', '3'))
+REDIS_RETRY_BASE_DELAY = float(os.getenv('REDIS_RETRY_BASE_DELAY', '0.05'))
+REDIS_RETRY_MAX_DELAY = float(os.getenv('REDIS_RETRY_MAX_DELAY', '1.0'))
+REDIS_BREAKER_THRESHOLD = int(os.getenv('REDIS_BREAKER_THRESHOLD', '5'))  # consecutive failed calls
+REDIS_BREAKER_RESET = float(os.getenv('REDIS_BREAKER_RESET', '10'))  # seconds open before a trial call
+REDIS_SPILL_LIMIT = int(os.getenv('REDIS_SPILL_LIMIT', '10000'))
+REDIS_DRAIN_BATCH = int(os.getenv('REDIS_DRAIN_BATCH', '500'))
+
+class RedisUnavailableError(Exception):
+    """Raised when a Redis call fails after all retries"""
+
+class CircuitOpenError(RedisUnavailableError):
+    """Raised instead of calling Redis while the circuit breaker is open"""
+
+class WriteNotSentError(Exception):
+    """A write failed before any of its commands reached Redis, so it is safe to retry or buffer"""
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open trial after `reset_timeout`"""
+
+    def __init__(self, threshold: int = REDIS_BREAKER_THRESHOLD, reset_timeout: float = REDIS_BREAKER_RESET):
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.open_count = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return self.state == 'closed'
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info("Redis circuit breaker closed")
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state == 'closed':
+                    logger.warning(f"Redis circuit breaker opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.open_count += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "open_count": self.open_count,
+            "retry_in": round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            if self.state == 'open' else None
+        }
+
+def backoff_delay(attempt: int, base: float = REDIS_RETRY_BASE_DELAY, cap: float = REDIS_RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def run_pipeline(client, commands: List[tuple], connection=None) -> list:
+    """Send (method, args, kwargs) commands in one non-transactional pipeline
+
+    With `connection` (already checked out of the pool), the pipeline runs on it and releases it.
+    """
+    if len(commands) == 1 and connection is None:
+        method, args, kwargs = commands[0]
+        return [getattr(client, method)(*args, **kwargs)]
+    pipe = client.pipeline(transaction=False)
+    pipe.connection = connection
+    for method, args, kwargs in commands:
+        getattr(pipe, method)(*args, **kwargs)
+    return pipe.execute()
+
+class ResilientRedis:
+    """Redis client wrapper with pooling, retries, a circuit breaker and a spill buffer
+
+    Any redis.Redis method can be called on the wrapper (e.g. `client.lrange(...)`)
+    and runs with retries behind the breaker. Use `write()` for writes that should be
+    buffered locally and replayed once Redis is reachable again instead of failing.
+    """
+
+    def __init__(self, client=None, host: str = REDIS_HOST, port: int = REDIS_PORT, db: int = REDIS_DB,
+                 pool_size: int = REDIS_POOL_SIZE, retry_attempts: int = REDIS_RETRY_ATTEMPTS,
+                 spill_limit: int = REDIS_SPILL_LIMIT):
+        import redis
+        self.errors = (redis.ConnectionError, redis.TimeoutError)
+        self.pool = None
+        if client is None:
+            self.pool = redis.BlockingConnectionPool(
+                host=host, port=port, db=db,
+                max_connections=pool_size,
+                timeout=REDIS_POOL_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                decode_responses=True
+            )
+            client = redis.Redis(connection_pool=self.pool)
+        self.client = client
+        self.retry_attempts = max(1, retry_attempts)
+        self.breaker = CircuitBreaker()
+        self.spill = deque()
+        self.spill_limit = spill_limit
+        self.spill_lock = threading.Lock()
+        self.drain_lock = threading.Lock()  # one drain at a time, so replayed writes keep their order
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0,
+                      "spilled": 0, "drained": 0, "dropped": 0, "unconfirmed": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1):
+        with self.stats_lock:
+            self.stats[name] += amount
+
+    def execute(self, fn: Callable[[Any], Any], retry_errors: Optional[tuple] = None) -> Any:
+        """Run fn(client) with jittered retries on connection errors, behind the circuit breaker
+
+        `retry_errors` narrows which errors are retried; writes pass (WriteNotSentError,) so a
+        call that may already have been applied is not sent again.
+        Raises RedisUnavailableError (CircuitOpenError while the breaker is open) once retries are exhausted.
+        """
+        if not self.breaker.allow():
+            self.count("rejected")
+            raise CircuitOpenError("Redis circuit breaker is open")
+        self.count("calls")
+        errors = self.errors + (WriteNotSentError,)
+        for attempt in range(self.retry_attempts):
+            try:
+                result = fn(self.client)
+            except errors as e:
+                if (not isinstance(e, retry_errors or errors) or attempt + 1 == self.retry_attempts
+                        or self.breaker.state == 'half_open'):
+                    self.count("failures")
+                    self.breaker.record_failure()
+                    raise RedisUnavailableError(f"Redis unavailable: {e}") from e
+                self.count("retries")
+                time.sleep(backoff_delay(attempt))
+                continue
+            self.breaker.record_success()
+            if self.spill and not self.drain_lock.locked():
+                self.drain()
+            return result
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        return self.execute(lambda client: getattr(client, method)(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def write(self, method: str, *args, **kwargs) -> bool:
+        """Run a write, spilling it to the local buffer if Redis is unavailable
+
+        Returns True when written, False when buffered for later replay.
+        """
+        return self.write_many([(method, args, kwargs)])
+
+    def write_many(self, commands: List[tuple]) -> bool:
+        """Run (method, args, kwargs) writes in one pipelined round trip, spilling them all on failure
+
+        Only failures before the writes were sent are retried and spilled. When Redis may already
+        have applied them (e.g. a timeout waiting for the reply), they are counted as unconfirmed
+        and not replayed, so the queue never gets the same message twice.
+        """
+        if self.spill:
+            # Queue behind the writes already buffered to keep their order, then try to replay them all
+            for command in commands:
+                self.buffer(*command)
+            try:
+                self.execute(lambda client: client.ping())
+            except RedisUnavailableError:
+                pass
+            return not self.spill
+        try:
+            self.execute(lambda client: self.send_writes(client, commands), retry_errors=(WriteNotSentError,))
+            return True
+        except RedisUnavailableError as e:
+            if not isinstance(e, CircuitOpenError) and not isinstance(e.__cause__, WriteNotSentError):
+                self.count("unconfirmed", len(commands))
+                logger.warning(f"Redis writes not confirmed, not replaying them: {e}")
+                return False
+            for command in commands:
+                self.buffer(*command)
+            return False
+
+    def send_writes(self, client, commands: List[tuple]) -> list:
+        """Pipeline writes on a connection checked out first; failing to get one raises WriteNotSentError
+
+        Without a pool (an injected client) there is no separate checkout, so every failure is unconfirmed.
+        """
+        if self.pool is None:
+            return run_pipeline(client, commands)
+        try:
+            connection = self.pool.get_connection('MULTI')
+        except self.errors as e:
+            raise WriteNotSentError(str(e)) from e
+        return run_pipeline(client, commands, connection)
+
+    def buffer(self, method: str, args: tuple, kwargs: Dict):
+        """Keep a write for later replay, dropping the oldest once the buffer is full"""
+        with self.spill_lock:
+            if len(self.spill) >= self.spill_limit:
+                self.spill.popleft()
+                self.count("dropped")
+            self.spill.append((method, args, kwargs))
+            self.count("spilled")
+
+    def drain(self, max_items: Optional[int] = None) -> int:
+        """Replay buffered writes in order, in pipelined batches; stops at the first error
+
+        Returns 0 straight away if another thread is already draining.
+        """
+        if not self.drain_lock.acquire(blocking=False):
+            return 0
+        drained = 0
+        try:
+            while self.spill and (max_items is None or drained < max_items):
+                with self.spill_lock:
+                    batch = [self.spill.popleft() for _ in range(min(REDIS_DRAIN_BATCH, len(self.spill)))]
+                try:
+                    self.send_writes(self.client, batch)
+                except WriteNotSentError:
+                    with self.spill_lock:
+                        self.spill.extendleft(reversed(batch))
+                    self.breaker.record_failure()
+                    break
+                except self.errors as e:
+                    # The batch may have been applied; replaying it again could duplicate it
+                    self.count("unconfirmed", len(batch))
+                    logger.warning(f"Replayed Redis writes not confirmed, dropping {len(batch)}: {e}")
+                    self.breaker.record_failure()
+                    break
+                drained += len(batch)
+                self.count("drained", len(batch))
+        finally:
+            self.drain_lock.release()
+        if drained:
+            logger.info(f"Drained {drained} buffered Redis writes")
+        return drained
+
+    def pool_stats(self) -> Optional[Dict]:
+        if self.pool is None:
+            return None
+        created = len(getattr(self.pool, '_connections', []))
+        idle = sum(1 for connection in list(self.pool.pool.queue) if connection is not None)
+        return {
+            "max_connections": self.pool.max_connections,
+            "created": created,
+            "in_use": created - idle,
+            "idle": idle,
+            "timeout": self.pool.timeout
+        }
+
+    def get_stats(self) -> Dict:
+        with self.stats_lock:
+            calls = dict(self.stats)
+        return {
+            "pool": self.pool_stats(),
+            "breaker": self.breaker.get_stats(),
+            "calls": calls,
+            "spill_buffer": len(self.spill)
+        }
@@ -0,0 +1,78 @@
+"""
+Facility (tenant) configuration shared by the simulator and analytics services
+Parses the FACILITIES list and maps messages onto hash-partitioned queue keys
+"""
+
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+
+# Configuration
+# Comma-separated ID[:rate[:patients[:doctors]]]; rate is messages/min, empty parts use the defaults
+FACILITIES = os.getenv('FACILITIES', 'HOSPITAL_ABC')
+HL7_QUEUE = os.getenv('HL7_QUEUE', 'hl7_messages')
+QUEUE_PARTITIONS = max(1, int(os.getenv('QUEUE_PARTITIONS', '1')))
+
+FACILITY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_]{1,32}$')  # safe in HL7 fields and Redis keys
+
+def validate_facility_id(facility_id: str) -> str:
+    if not FACILITY_ID_PATTERN.match(facility_id):
+        raise ValueError(f"Invalid facility ID {facility_id!r}: use up to 32 letters, digits or underscores")
+    return facility_id
+
+def parse_facilities(spec: str) -> List[Dict]:
+    """Parse 'ID[:rate[:patients[:doctors]]],...' into facility dicts (None where not given)"""
+    facilities = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        parts = [part.strip() for part in item.split(':')]
+        if len(parts) > 4:
+            raise ValueError(f"Expected ID[:rate[:patients[:doctors]]] in facilities, got {item.strip()!r}")
+        parts += [''] * (4 - len(parts))
+        try:
+            rate, patients, doctors = (int(part) if part else None for part in parts[1:])
+        except ValueError:
+            raise ValueError(f"Facility rates and counts must be integers, got {item.strip()!r}")
+        if any(value is not None and value <= 0 for value in (rate, patients, doctors)):
+            raise ValueError(f"Facility rates and counts must be positive, got {item.strip()!r}")
+        facilities.append({
+            'id': validate_facility_id(parts[0]),
+            'message_rate': rate,
+            'patient_count': patients,
+            'doctor_count': doctors
+        })
+    ids = [facility['id'] for facility in facilities]
+    if not ids:
+        raise ValueError("At least one facility is required")
+    if len(set(ids)) != len(ids):
+        raise ValueError("Facility IDs must be unique")
+    return facilities
+
+FACILITY_IDS = [facility['id'] for facility in parse_facilities(FACILITIES)]
+DEFAULT_FACILITY = FACILITY_IDS[0]
+
+def tenant_key(facility_id: str, name: str) -> str:
+    """Namespace a key or panel name by facility"""
+    return f"{facility_id}:{name}"
+
+def partition_for(facility_id: str, routing_key: str, partitions: int = QUEUE_PARTITIONS) -> int:
+    """Stable partition for a facility's message stream
+
+    Routing on facility and patient keeps each patient's messages in order on one
+    partition while a single busy facility still spreads across all of them.
+    """
+    if partitions == 1:
+        return 0
+    return zlib.crc32(f"{facility_id}|{routing_key}".encode('utf-8')) % partitions
+
+def queue_key(partition: int, base: str = HL7_QUEUE, partitions: int = QUEUE_PARTITIONS) -> str:
+    """Queue key for a partition; a single partition keeps the plain key"""
+    return base if partitions == 1 else f"{base}:{partition}"
+
+def queue_keys(base: str = HL7_QUEUE, partitions: int = QUEUE_PARTITIONS,
+               owned: Optional[List[int]] = None) -> List[str]:
+    """Keys of all partitions, or of the given subset when consumers split the partitions"""
+    indexes = range(partitions) if owned is None else owned
+    return [queue_key(index, base, partitions) for index in indexes]
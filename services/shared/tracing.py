@@ -0,0 +1,80 @@
+"""
+Message tracing shared by the HL7 simulator and analytics services
+Queue envelopes carry time.monotonic() stamps per stage; CLOCK_MONOTONIC is
+system-wide, so stamps compare across processes on one host
+"""
+
+import threading
+from typing import Dict, Optional
+
+TRACE_STAGES = ('generated', 'enqueued', 'dequeued', 'processed')
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds) with approximate percentiles"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = max(0.0, seconds * 1000)
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given percentile"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)},
+                "le_inf": self.counts[-1]
+            }
+        }
+
+class TraceStats:
+    """Per-stage latency histograms built from the stamps in message traces
+
+    Safe to update from worker threads that send messages while the event loop reads it.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            self.stages.setdefault(stage, LatencyHistogram()).observe(seconds)
+
+    def record(self, trace: Dict):
+        """Record the interval between each pair of consecutive stamps, and end to end"""
+        stamped = [(stage, trace[stage]) for stage in TRACE_STAGES if trace.get(stage) is not None]
+        for (previous, started), (stage, finished) in zip(stamped, stamped[1:]):
+            self.observe(f"{previous}_to_{stage}", finished - started)
+        if len(stamped) > 2:
+            self.observe("end_to_end", stamped[-1][1] - stamped[0][1])
+
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {stage: histogram.to_dict() for stage, histogram in self.stages.items()}